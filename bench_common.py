@@ -0,0 +1,122 @@
+"""
+Shared Benchmark Helpers
+Pieces the load, latency and benchmark scripts have in common: a mergeable
+latency histogram and proxy authentication that restores a cached session
+before falling back to a password login.
+"""
+
+from matrix_client import forget_session, save_session
+from test_complete_implementation import test_api_endpoint
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram with ~1.5% relative precision.
+
+    Values are recorded in microseconds. Bucket counts are plain ints, so
+    histograms from several users (or processes) merge exactly by adding
+    counts instead of averaging percentiles.
+    """
+
+    SUB_BUCKETS = 64
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max_us = 0
+        self.sum_us = 0
+
+    @classmethod
+    def _bucket(cls, value):
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - 7
+        return cls.SUB_BUCKETS * (shift + 1) + (value >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def _bucket_upper(cls, bucket):
+        if bucket < cls.SUB_BUCKETS:
+            return bucket
+        shift, offset = divmod(bucket, cls.SUB_BUCKETS)
+        shift -= 1
+        return ((cls.SUB_BUCKETS + offset + 1) << shift) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1_000_000))
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        self.sum_us += value
+        if value > self.max_us:
+            self.max_us = value
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        return self
+
+    def percentile(self, pct):
+        """Return the ``pct`` percentile in seconds (upper bucket bound)"""
+        if not self.total:
+            return 0.0
+        rank = max(1, int(round(pct / 100.0 * self.total)))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._bucket_upper(bucket), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    @property
+    def mean(self):
+        return self.sum_us / self.total / 1_000_000 if self.total else 0.0
+
+    def to_dict(self):
+        return {'counts': self.counts, 'total': self.total,
+                'max_us': self.max_us, 'sum_us': self.sum_us}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(bucket): count for bucket, count in data['counts'].items()}
+        histogram.total = data['total']
+        histogram.max_us = data['max_us']
+        histogram.sum_us = data['sum_us']
+        return histogram
+
+
+async def authenticate(session, creds):
+    """Restore the configured or cached session, else log in with password; returns True on success.
+
+    A password login is saved to the session cache so the next run can restore
+    it instead.
+    """
+    if creds.get('user_id') and creds.get('access_token'):
+        status, result = await test_api_endpoint(session, '/restore_session', 'POST', {
+            'homeserver_url': creds['homeserver'],
+            'user_id': creds['user_id'],
+            'access_token': creds['access_token'],
+            'device_id': creds['device_id']
+        })
+        if status == 200 and result.get('success', False):
+            return True
+        if creds.pop('from_cache', False):
+            forget_session(creds)
+    if not (creds.get('username') and creds.get('password')):
+        return False
+    status, result = await test_api_endpoint(session, '/login', 'POST', {
+        'homeserver': creds['homeserver'],
+        'username': creds['username'],
+        'password': creds['password']
+    })
+    if status != 200 or not result.get('success', False):
+        return False
+    creds.update({
+        'user_id': result.get('user_id') or creds.get('user_id'),
+        'access_token': result.get('access_token'),
+        'device_id': result.get('device_id')
+    })
+    save_session(creds)
+    return True
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Matrix Proxy Benchmark Suite
+Runs named scenarios (login, room list, history page, member list, send,
+typing, logout) for several independent repeats, writes machine-readable
+JSON results with environment metadata, and compares them with a stored
+baseline. A scenario regresses when the 95% confidence interval of its
+slowdown lies entirely above the threshold; any regression exits non-zero.
+
+Usage:
+    python bench_suite.py --output results.json
+    python bench_suite.py --baseline baseline.json --threshold 0.10
+    python bench_suite.py --scenario room_list --scenario history_page --repeats 10
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from bench_common import LatencyHistogram, authenticate
+from matrix_client import BASE_URL
+from test_complete_implementation import load_test_credentials, test_api_endpoint
+
+SCHEMA_VERSION = 1
+
+# Two-sided 95% critical values of Student's t by degrees of freedom
+_T95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+        9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042,
+        40: 2.021, 60: 2.000, 120: 1.980}
+
+
+def t_critical(df):
+    """95% two-sided t value, rounding ``df`` down to the nearest tabulated entry"""
+    if df < 1:
+        return float('inf')
+    if df >= 1000:
+        return 1.960
+    return _T95[max(key for key in _T95 if key <= df)]
+
+
+def summarize(samples):
+    """Mean and 95% confidence interval of per-repeat medians"""
+    mean = statistics.fmean(samples)
+    stdev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+    half = t_critical(len(samples) - 1) * stdev / math.sqrt(len(samples)) if len(samples) > 1 else 0.0
+    return {'mean': mean, 'stdev': stdev, 'ci_low': mean - half, 'ci_high': mean + half}
+
+
+def welch_interval(current, baseline):
+    """95% CI of mean(current) - mean(baseline) (Welch's unequal-variance t)"""
+    n1, n2 = len(current), len(baseline)
+    m1, m2 = statistics.fmean(current), statistics.fmean(baseline)
+    v1 = statistics.variance(current) if n1 > 1 else 0.0
+    v2 = statistics.variance(baseline) if n2 > 1 else 0.0
+    se2 = v1 / n1 + v2 / n2
+    if se2 == 0:
+        return m1 - m2, m1 - m2, m1 - m2
+    df_denominator = ((v1 / n1) ** 2 / (n1 - 1) if n1 > 1 else 0) + ((v2 / n2) ** 2 / (n2 - 1) if n2 > 1 else 0)
+    df = se2 ** 2 / df_denominator if df_denominator else 1
+    half = t_critical(int(df)) * math.sqrt(se2)
+    diff = m1 - m2
+    return diff, diff - half, diff + half
+
+
+# === Scenarios ===
+
+class Scenarios:
+    """Named scenarios; each ``run_<name>`` returns the seconds spent in the measured call"""
+
+    NAMES = ('login', 'room_list', 'history_page', 'member_list', 'send', 'typing', 'logout')
+
+    def __init__(self, session, creds):
+        self.session = session
+        self.creds = creds
+        self.room_id = None
+
+    async def timed(self, endpoint, method='GET', data=None):
+        started = time.perf_counter()
+        status, result = await test_api_endpoint(self.session, endpoint, method, data)
+        elapsed = time.perf_counter() - started
+        if status != 200 or (isinstance(result, dict) and result.get('success') is False):
+            error = result.get('error', 'Unknown error') if isinstance(result, dict) else result
+            raise RuntimeError(f"{method} {endpoint}: HTTP {status}: {error}")
+        return elapsed, result
+
+    async def setup(self):
+        if not await authenticate(self.session, self.creds):
+            raise RuntimeError("authentication failed")
+        _, result = await self.timed('/rooms')
+        rooms = result.get('data', []) if result.get('success') else result.get('rooms', [])
+        if rooms:
+            self.room_id = rooms[0]['room_id'] if isinstance(rooms[0], dict) else rooms[0]
+
+    def needs_room(self, name):
+        return name in ('history_page', 'member_list', 'send', 'typing')
+
+    async def run_login(self):
+        elapsed, _ = await self.timed('/login', 'POST', {
+            'homeserver': self.creds['homeserver'],
+            'username': self.creds['username'],
+            'password': self.creds['password']
+        })
+        return elapsed
+
+    async def run_room_list(self):
+        return (await self.timed('/rooms'))[0]
+
+    async def run_history_page(self):
+        return (await self.timed(f'/rooms/{self.room_id}/messages?limit=50'))[0]
+
+    async def run_member_list(self):
+        return (await self.timed(f'/rooms/{self.room_id}/members'))[0]
+
+    async def run_send(self):
+        elapsed, _ = await self.timed(f'/rooms/{self.room_id}/send', 'POST', {
+            'message': "benchmark suite message",
+            'msg_type': 'm.text'
+        })
+        return elapsed
+
+    async def run_typing(self):
+        elapsed, _ = await self.timed(f'/rooms/{self.room_id}/typing', 'PUT', {
+            'typing': True,
+            'timeout': 5000
+        })
+        return elapsed
+
+    async def run_logout(self):
+        # Log in (untimed) to a throwaway session and end only that one, so the cached session survives
+        _, result = await self.timed('/login', 'POST', {
+            'homeserver': self.creds['homeserver'],
+            'username': self.creds['username'],
+            'password': self.creds['password']
+        })
+        return (await self.timed('/logout', 'POST', {'access_token': result.get('access_token')}))[0]
+
+
+async def run_suite(creds, names, repeats, iterations, warmup):
+    """Run each scenario ``repeats`` times; returns {name: result dict}"""
+    results = {}
+    async with aiohttp.ClientSession() as session:
+        scenarios = Scenarios(session, creds)
+        await scenarios.setup()
+        for name in names:
+            if name in ('login', 'logout') and not creds.get('password'):
+                print(f"   ⚠️  Skipping {name} (needs username/password)")
+                continue
+            if scenarios.needs_room(name) and not scenarios.room_id:
+                print(f"   ⚠️  Skipping {name} (no rooms)")
+                continue
+            run = getattr(scenarios, f'run_{name}')
+            for _ in range(warmup):
+                await run()
+            medians = []
+            histogram = LatencyHistogram()
+            for _ in range(repeats):
+                samples = []
+                for _ in range(iterations):
+                    samples.append(await run())
+                    histogram.record(samples[-1])
+                medians.append(statistics.median(samples))
+            if name in ('login', 'logout'):
+                # Make the cached session the proxy's current one again
+                await authenticate(session, creds)
+
+            results[name] = {
+                'samples': medians,
+                'iterations': iterations,
+                **summarize(medians),
+                'p50': histogram.percentile(50),
+                'p95': histogram.percentile(95),
+                'p99': histogram.percentile(99),
+            }
+            summary = results[name]
+            print(f"   ⏱️  {name:<14} {summary['mean'] * 1000:>8.2f}ms "
+                  f"[{summary['ci_low'] * 1000:.2f}, {summary['ci_high'] * 1000:.2f}]  "
+                  f"p95 {summary['p95'] * 1000:.2f}ms")
+        # No final logout: the session stays cached for the next run
+    return results
+
+
+# === Environment and baseline ===
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def environment():
+    env = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'hostname': platform.node(),
+        'cpu_count': os.cpu_count(),
+        'aiohttp': aiohttp.__version__,
+        'git_revision': git_revision(),
+        'proxy_url': BASE_URL,
+    }
+    async with aiohttp.ClientSession() as session:
+        status, result = await test_api_endpoint(session, '/health')
+        env['proxy_health'] = result if status == 200 else {'status': status, **result}
+    return env
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison table; returns the names of regressed scenarios"""
+    regressions = []
+    print(f"\n   {'scenario':<14} {'baseline':>10} {'current':>10} {'change':>8} {'95% CI':>18}  verdict")
+    for name, current in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            print(f"   {name:<14} {'-':>10} {current['mean'] * 1000:>8.2f}ms {'':>8} {'':>18}  new")
+            continue
+        diff, low, high = welch_interval(current['samples'], previous['samples'])
+        base = previous['mean']
+        change, low, high = diff / base, low / base, high / base
+        if low > threshold:
+            verdict = '❌ regression'
+            regressions.append(name)
+        elif high < -threshold:
+            verdict = '✅ faster'
+        elif low > 0:
+            verdict = '⚠️  slower (within threshold)'
+        else:
+            verdict = 'no significant change'
+        print(f"   {name:<14} {base * 1000:>8.2f}ms {current['mean'] * 1000:>8.2f}ms {change:>+7.1%} "
+              f"[{low:>+6.1%}, {high:>+6.1%}]  {verdict}")
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark suite with baseline regression gate")
+    parser.add_argument('--scenario', action='append', choices=Scenarios.NAMES,
+                        help="scenario to run, may be repeated (default: all)")
+    parser.add_argument('--repeats', type=int, default=5, help="independent repeats per scenario")
+    parser.add_argument('--iterations', type=int, default=20, help="calls per repeat")
+    parser.add_argument('--warmup', type=int, default=3, help="untimed calls before measuring")
+    parser.add_argument('--output', default='bench_results.json', help="where to write JSON results")
+    parser.add_argument('--baseline', help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', help="also write these results as a baseline file")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative slowdown that counts as a regression (0.10 = 10%%)")
+    return parser
+
+
+async def main():
+    args = build_arg_parser().parse_args()
+    if args.repeats < 2:
+        raise SystemExit("--repeats must be at least 2 to compute confidence intervals")
+    creds = await load_test_credentials()
+
+    print("🧪 Matrix Proxy Benchmark Suite")
+    print("=" * 60)
+    print(f"   {args.repeats} repeats x {args.iterations} iterations, warmup {args.warmup}\n")
+    env = await environment()
+    try:
+        results = await run_suite(creds, args.scenario or Scenarios.NAMES,
+                                  args.repeats, args.iterations, args.warmup)
+    except RuntimeError as e:
+        print(f"❌ Benchmark failed: {e}")
+        return 2
+
+    report = {
+        'schema': SCHEMA_VERSION,
+        'environment': env,
+        'config': {'repeats': args.repeats, 'iterations': args.iterations, 'warmup': args.warmup},
+        'scenarios': results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {path}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    base_env = baseline.get('environment', {})
+    print(f"\n📊 Compared with baseline from {base_env.get('timestamp', '?')} "
+          f"(revision {base_env.get('git_revision') or '?'}, threshold {args.threshold:.0%})")
+    for key in ('python', 'machine', 'hostname', 'proxy_url'):
+        if base_env.get(key) != env.get(key):
+            print(f"   ⚠️  Environment differs: {key} {base_env.get(key)!r} -> {env.get(key)!r}")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
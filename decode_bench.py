@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Matrix Response Decoding Benchmark
+Compares the current path (json.loads into nested dicts, as in
+test_complete_implementation.py) with matrix_client's fast decoder and
+compact records, on synthetic /rooms and /messages payloads. Reports decode
+time and retained memory. No proxy is needed.
+
+Usage:
+    python decode_bench.py --rooms 5000 --events 50000
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import matrix_client
+from matrix_client import EventColumns, decode_messages, decode_rooms
+from proxy_standin import SyntheticAccount
+
+
+def build_payloads(rooms, events, page_size):
+    account = SyntheticAccount(rooms=rooms, members=200, messages=events)
+    rooms_body = json.dumps({'success': True, 'data': account.rooms()}).encode()
+    pages = []
+    token = None
+    while True:
+        page = account.messages(0, page_size, token)
+        pages.append(json.dumps({'success': True, 'data': page}).encode())
+        token = page['end']
+        if not token:
+            break
+    return rooms_body, pages
+
+
+def dict_path(rooms_body, pages):
+    result = json.loads(rooms_body)
+    rooms = result.get('data', []) if result.get('success') else result.get('rooms', [])
+    events = []
+    for body in pages:
+        events.extend(json.loads(body).get('data', {}).get('chunk', []))
+    return rooms, events
+
+
+def records_path(rooms_body, pages):
+    rooms = decode_rooms(matrix_client.loads(rooms_body))
+    events = []
+    for body in pages:
+        page_events, _ = decode_messages(matrix_client.loads(body))
+        events.extend(page_events)
+    return rooms, events
+
+
+def columns_path(rooms_body, pages):
+    rooms = decode_rooms(matrix_client.loads(rooms_body))
+    events = EventColumns()
+    for body in pages:
+        result = matrix_client.loads(body)
+        events.extend(result['data']['chunk'])
+    return rooms, events
+
+
+def measure(fn, rooms_body, pages, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        fn(rooms_body, pages)
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    retained = fn(rooms_body, pages)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained
+    return best, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response decoding benchmark")
+    parser.add_argument('--rooms', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print("🧪 Matrix Response Decoding Benchmark")
+    print("=" * 60)
+    print(f"   Decoder: {matrix_client.loads.__module__}")
+    rooms_body, pages = build_payloads(args.rooms, args.events, args.page_size)
+    total_bytes = len(rooms_body) + sum(len(page) for page in pages)
+    print(f"   Payload: {args.rooms} rooms, {args.events} events in {len(pages)} pages, "
+          f"{total_bytes / 1e6:.1f} MB\n")
+
+    baseline = None
+    for name, fn in (('dict', dict_path), ('records', records_path), ('columns', columns_path)):
+        elapsed, retained, peak = measure(fn, rooms_body, pages, args.repeats)
+        baseline = baseline or (elapsed, retained)
+        print(f"   📦 {name:<8} decode {elapsed * 1000:>8.1f}ms ({baseline[0] / elapsed:>4.1f}x faster)  "
+              f"retained {retained / 1e6:>7.1f} MB ({baseline[1] / max(retained, 1):>4.1f}x smaller)  "
+              f"peak {peak / 1e6:>7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Matrix Room List Delta-Sync Benchmark
+Compares refreshing the room list by refetching all of /rooms with a delta
+refresh (/rooms?since=<next_batch>) applied to a local RoomSnapshot, as the
+account grows. Each refresh follows a few new messages plus a leave and a
+rejoin; reports bytes transferred and refresh latency for both modes and
+checks that the delta snapshot matches the full list, also against a proxy
+that ignores ?since=. Runs in-process stand-ins, so no proxy is needed.
+
+Usage:
+    python delta_sync_bench.py --room-counts 100,1000,5000,20000 --changes 5
+    python delta_sync_bench.py --room-counts 5000 --rtt 0.02
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import aiohttp
+
+import matrix_client
+from matrix_client import RoomSnapshot, decode_rooms, room_delta
+from proxy_standin import API_PREFIX, LatencyProfile, SyntheticAccount, make_app, start_standin
+
+
+async def fetch(session, url, params=None):
+    """GET ``url``; returns (body bytes, decoded result)"""
+    async with session.get(url, params=params) as response:
+        body = await response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status} from {url}")
+    return len(body), matrix_client.loads(body)
+
+
+def churn(account, rng, changes, left):
+    """New messages in ``changes`` rooms, then leave one room and rejoin an earlier one"""
+    for index in rng.sample(range(account.room_count), min(changes, account.room_count)):
+        account.send(index, "delta sync bench message")
+    index = rng.randrange(account.room_count)
+    account.leave(index)
+    left.append(index)
+    if len(left) > 3:
+        account.join(left.pop(0))
+
+
+async def bench_room_count(room_count, refreshes, changes, rtt, seed):
+    account = SyntheticAccount(rooms=room_count, members=50, messages=10)
+    runner, base_url = await start_standin(make_app(account, LatencyProfile(default=rtt)))
+    url = f"{base_url}{API_PREFIX}/rooms"
+    rng = random.Random(seed)
+    stats = {'full': ([], []), 'delta': ([], [])}  # mode -> (seconds, bytes)
+    left = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            snapshot = RoomSnapshot()
+            _, result = await fetch(session, url)
+            snapshot.replace(decode_rooms(result), result.get('next_batch'))
+
+            for _ in range(refreshes):
+                churn(account, rng, changes, left)
+
+                started = time.perf_counter()
+                size, result = await fetch(session, url)
+                full_rooms = decode_rooms(result)
+                stats['full'][0].append(time.perf_counter() - started)
+                stats['full'][1].append(size)
+
+                started = time.perf_counter()
+                size, result = await fetch(session, url, {'since': snapshot.token})
+                snapshot.apply(room_delta(result))
+                stats['delta'][0].append(time.perf_counter() - started)
+                stats['delta'][1].append(size)
+
+            expected = {room.room_id: room.last_activity for room in full_rooms}
+            actual = {room_id: room.last_activity for room_id, room in snapshot.rooms.items()}
+            consistent = expected == actual
+    finally:
+        await runner.cleanup()
+    return stats, consistent
+
+
+async def check_without_delta_support(room_count, seed):
+    """Delta refresh against a proxy that ignores ?since=; True when the snapshot still tracks the full list"""
+    account = SyntheticAccount(rooms=room_count, members=50, messages=10)
+    runner, base_url = await start_standin(make_app(account, delta_sync=False))
+    url = f"{base_url}{API_PREFIX}/rooms"
+    rng = random.Random(seed)
+    left = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            snapshot = RoomSnapshot()
+            _, result = await fetch(session, url)
+            snapshot.replace(decode_rooms(result), result.get('next_batch'))
+            for _ in range(3):
+                churn(account, rng, 5, left)
+                _, result = await fetch(session, url, {'since': snapshot.token})
+                snapshot.apply(room_delta(result))
+            _, result = await fetch(session, url)
+            expected = {room.room_id: room.last_activity for room in decode_rooms(result)}
+    finally:
+        await runner.cleanup()
+    actual = {room_id: room.last_activity for room_id, room in snapshot.rooms.items()}
+    return expected == actual and snapshot.token is not None
+
+
+async def run(room_counts, refreshes, changes, rtt, seed):
+    print(f"   {'rooms':>7} {'full KB':>9} {'delta KB':>9} {'bytes':>8} "
+          f"{'full p50':>9} {'delta p50':>10} {'speed-up':>9}  snapshot")
+    for room_count in room_counts:
+        stats, consistent = await bench_room_count(room_count, refreshes, changes, rtt, seed)
+        full_seconds, full_bytes = stats['full']
+        delta_seconds, delta_bytes = stats['delta']
+        full_kb = statistics.fmean(full_bytes) / 1024
+        delta_kb = statistics.fmean(delta_bytes) / 1024
+        full_p50 = statistics.median(full_seconds)
+        delta_p50 = statistics.median(delta_seconds)
+        print(f"   {room_count:>7} {full_kb:>9.1f} {delta_kb:>9.2f} {full_kb / delta_kb:>7.0f}x "
+              f"{full_p50 * 1000:>7.2f}ms {delta_p50 * 1000:>8.2f}ms {full_p50 / delta_p50:>8.1f}x  "
+              f"{'✅ matches' if consistent else '❌ differs from full list'}")
+
+    fallback = await check_without_delta_support(min(room_counts), seed)
+    print(f"\n   Proxy ignoring ?since=: {'✅ snapshot replaced from the plain list' if fallback else '❌ snapshot went stale'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs delta room list refresh benchmark")
+    parser.add_argument('--room-counts', default='100,1000,5000,20000',
+                        help="comma-separated account sizes")
+    parser.add_argument('--refreshes', type=int, default=20, help="refreshes per account size")
+    parser.add_argument('--changes', type=int, default=5, help="rooms with new messages per refresh")
+    parser.add_argument('--rtt', type=float, default=0.0, help="seconds of latency added per request")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print("🧪 Room List Delta-Sync Benchmark")
+    print("=" * 60)
+    print(f"   {args.refreshes} refreshes, {args.changes} changed rooms + 1 leave/rejoin each\n")
+    room_counts = [int(count) for count in args.room_counts.split(',')]
+    asyncio.run(run(room_counts, args.refreshes, args.changes, args.rtt, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -227,60 +227,33 @@ async function connectToMatrix() {
             device_id: matrixClientState.deviceId
         };
 
-        // Configure Element adapter
-        const configResponse = await fetch('http://localhost:8000/api/message-proxy/adapters/element/configure', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(adapterConfig)
-        });
-
-        if (!configResponse.ok) {
-            const errorText = await configResponse.text();
-            throw new Error(`Failed to configure Element adapter: ${errorText}`);
-        }
-
-        console.log('Element adapter configured successfully');
-
-        // Connect the adapter
-        const connectResponse = await fetch('http://localhost:8000/api/message-proxy/adapters/element/connect', {
-            method: 'POST'
-        });
-
-        if (!connectResponse.ok) {
-            const errorText = await connectResponse.text();
-            throw new Error(`Failed to connect Element adapter: ${errorText}`);
+        // The adapter must be configured before it connects, but the message
+        // subscription doesn't depend on either, so both chains run at once
+        const [adapterResult, subscribeResult] = await Promise.allSettled([
+            configureAndConnectAdapter(adapterConfig),
+            subscribeToMessages()
+        ]);
+
+        if (adapterResult.status === 'rejected') {
+            if (subscribeResult.status === 'fulfilled') {
+                // Don't leave a subscription behind for an adapter that failed
+                fetch('http://localhost:8000/api/message-proxy/subscribe/ai-ide-matrix-client-plugin', {
+                    method: 'DELETE'
+                }).catch(() => {});
+            }
+            throw adapterResult.reason;
         }
-
-        console.log('Element adapter connected successfully');
-
-        // Subscribe to Matrix messages through message proxy
-        const subscribeResponse = await fetch('http://localhost:8000/api/message-proxy/subscribe', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                plugin_id: 'ai-ide-matrix-client-plugin',
-                sources: ['element'],
-                keywords: [], // Subscribe to all messages
-                room_ids: [] // Subscribe to all rooms
-            })
-        });
-
-        if (!subscribeResponse.ok) {
-            throw new Error(`Failed to subscribe to messages: ${subscribeResponse.statusText}`);
+        if (subscribeResult.status === 'rejected') {
+            throw subscribeResult.reason;
         }
 
-        const subscribeResult = await subscribeResponse.json();
-        console.log('Subscribed to Matrix messages:', subscribeResult);
+        console.log('Subscribed to Matrix messages:', subscribeResult.value);
 
         // Update connection state
         matrixClientState.connected = true;
         matrixClientState.subscriptionActive = true;
 
-        // Start listening for messages via WebSocket
+        // Start listening for messages via WebSocket; it opens while the rooms load
         setupMessageListener();
 
         // Load initial rooms
@@ -294,6 +267,57 @@ async function connectToMatrix() {
     }
 }
 
+// Configure the Element adapter, then connect it
+async function configureAndConnectAdapter(adapterConfig) {
+    const configResponse = await fetch('http://localhost:8000/api/message-proxy/adapters/element/configure', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(adapterConfig)
+    });
+
+    if (!configResponse.ok) {
+        const errorText = await configResponse.text();
+        throw new Error(`Failed to configure Element adapter: ${errorText}`);
+    }
+
+    console.log('Element adapter configured successfully');
+
+    const connectResponse = await fetch('http://localhost:8000/api/message-proxy/adapters/element/connect', {
+        method: 'POST'
+    });
+
+    if (!connectResponse.ok) {
+        const errorText = await connectResponse.text();
+        throw new Error(`Failed to connect Element adapter: ${errorText}`);
+    }
+
+    console.log('Element adapter connected successfully');
+}
+
+// Subscribe to Matrix messages through message proxy
+async function subscribeToMessages() {
+    const subscribeResponse = await fetch('http://localhost:8000/api/message-proxy/subscribe', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            plugin_id: 'ai-ide-matrix-client-plugin',
+            sources: ['element'],
+            keywords: [], // Subscribe to all messages
+            room_ids: [] // Subscribe to all rooms
+        })
+    });
+
+    if (!subscribeResponse.ok) {
+        throw new Error(`Failed to subscribe to messages: ${subscribeResponse.statusText}`);
+    }
+
+    return subscribeResponse.json();
+}
+
 // Disconnect from Matrix
 async function disconnectFromMatrix() {
     if (!matrixClientState.connected) {
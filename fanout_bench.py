@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Matrix Cold-Open Fan-out Benchmark
+Opening the client on a large account fetches members, info and the latest
+messages for every joined room. This runs that fan-out for the whole account
+with a concurrency cap, most recently active rooms first, and reports total
+cold-open time against room count and concurrency level.
+
+Usage:
+    python fanout_bench.py --room-counts 100,500,2000 --concurrency 1,8,32,128
+"""
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from bench_common import LatencyHistogram, authenticate
+from test_complete_implementation import load_test_credentials, test_api_endpoint
+
+# Per-room calls made when the client opens, in the order they are issued
+ROOM_CALLS = (
+    ('members', '/rooms/{room_id}/members'),
+    ('info', '/rooms/{room_id}/info'),
+    ('messages', '/rooms/{room_id}/messages?limit=20'),
+)
+
+
+def order_rooms(rooms, order='recent'):
+    """Order rooms for fan-out: 'recent' (last activity first) or 'listed'"""
+    if order == 'recent':
+        return sorted(rooms, key=lambda room: room.get('last_activity') or 0, reverse=True)
+    return list(rooms)
+
+
+async def fan_out(session, rooms, concurrency=16, calls=ROOM_CALLS, cancel_event=None):
+    """Fetch ``calls`` for every room with at most ``concurrency`` rooms in flight.
+
+    Rooms are started in list order by a fixed pool of workers, so the order
+    passed in is the order they complete in (roughly). Setting ``cancel_event``
+    stops the workers and cancels in-flight requests. Returns a result dict.
+    """
+    queue = asyncio.Queue()
+    for room in rooms:
+        queue.put_nowait(room['room_id'])
+
+    latency = LatencyHistogram()
+    result = {'rooms_done': 0, 'errors': 0, 'cancelled': False, 'first_room': None}
+    started = time.perf_counter()
+
+    async def worker():
+        while True:
+            try:
+                room_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            room_started = time.perf_counter()
+            statuses = await asyncio.gather(*(
+                test_api_endpoint(session, endpoint.format(room_id=room_id))
+                for _, endpoint in calls
+            ))
+            latency.record(time.perf_counter() - room_started)
+            result['errors'] += sum(1 for status, _ in statuses if status != 200)
+            result['rooms_done'] += 1
+            if result['first_room'] is None:
+                result['first_room'] = time.perf_counter() - started
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    waiter = asyncio.ensure_future(asyncio.gather(*workers))
+    cancel_waiter = asyncio.ensure_future(cancel_event.wait()) if cancel_event else None
+    try:
+        if cancel_waiter:
+            await asyncio.wait({waiter, cancel_waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if not waiter.done():
+                result['cancelled'] = True
+                waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+    finally:
+        if cancel_waiter:
+            cancel_waiter.cancel()
+
+    result['elapsed'] = time.perf_counter() - started
+    result['room_latency'] = latency
+    return result
+
+
+async def run_matrix(room_counts, concurrency_levels, order, creds, budget=None):
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        if not await authenticate(session, creds):
+            print("❌ Authentication failed")
+            return []
+        status, result = await test_api_endpoint(session, '/rooms')
+        rooms = order_rooms(result.get('data', []) if status == 200 else [], order)
+        print(f"   Account has {len(rooms)} rooms\n")
+
+        rows = []
+        for count in room_counts:
+            subset = rooms[:count]
+            for concurrency in concurrency_levels:
+                cancel_event = asyncio.Event() if budget else None
+                timer = asyncio.get_running_loop().call_later(budget, cancel_event.set) if budget else None
+                outcome = await fan_out(session, subset, concurrency, cancel_event=cancel_event)
+                if timer:
+                    timer.cancel()
+                rows.append((len(subset), concurrency, outcome))
+                print(f"   🏠 {len(subset):>6} rooms  c={concurrency:<4} "
+                      f"cold open {outcome['elapsed']:>7.2f}s  "
+                      f"{outcome['rooms_done'] / outcome['elapsed']:>8.1f} rooms/s  "
+                      f"room p95 {outcome['room_latency'].percentile(95) * 1000:>7.1f}ms  "
+                      f"errors {outcome['errors']}"
+                      f"{'  (cancelled)' if outcome['cancelled'] else ''}")
+        return rows
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Whole-account cold-open fan-out benchmark")
+    parser.add_argument('--room-counts', default='100,500,1000', help="comma-separated room counts")
+    parser.add_argument('--concurrency', default='1,4,16,64', help="comma-separated concurrency caps")
+    parser.add_argument('--order', choices=('recent', 'listed'), default='recent')
+    parser.add_argument('--budget', type=float, help="cancel each fan-out after this many seconds")
+    args = parser.parse_args()
+
+    creds = await load_test_credentials()
+    room_counts = [int(value) for value in args.room_counts.split(',')]
+    concurrency_levels = [int(value) for value in args.concurrency.split(',')]
+
+    print("🧪 Matrix Cold-Open Fan-out Benchmark")
+    print("=" * 60)
+    rows = await run_matrix(room_counts, concurrency_levels, args.order, creds, args.budget)
+
+    if rows:
+        print("\n🏁 Fastest concurrency per room count:")
+        for count in sorted({row[0] for row in rows}):
+            best = min((row for row in rows if row[0] == count), key=lambda row: row[2]['elapsed'])
+            print(f"   {count:>6} rooms: c={best[1]} ({best[2]['elapsed']:.2f}s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
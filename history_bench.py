@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Matrix History Pagination Benchmark
+Walks a room's entire history through /rooms/{room_id}/messages with
+from_token pagination and reports events/sec, bytes/sec and peak RSS for
+each page size, to pick the limit with the fastest catch-up.
+
+Usage:
+    python history_bench.py --limits 50,100,250,500,1000
+    python history_bench.py --room '!abc:matrix.org' --max-events 20000
+"""
+
+import argparse
+import asyncio
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+from bench_common import authenticate
+from matrix_client import MatrixProxyClient
+from test_complete_implementation import load_test_credentials
+
+
+def byte_counter(counters):
+    """TraceConfig adding the response body bytes of every request to counters['bytes']"""
+    async def on_chunk(session, context, params):
+        counters['bytes'] = counters.get('bytes', 0) + len(params.chunk)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_response_chunk_received.append(on_chunk)
+    return trace_config
+
+
+async def walk_history(room_id, limit, max_events, creds):
+    counters = {}
+    async with aiohttp.ClientSession(trace_configs=[byte_counter(counters)]) as session:
+        if not await authenticate(session, creds):
+            raise RuntimeError("Authentication failed")
+        client = MatrixProxyClient(session=session)
+        if room_id is None:
+            rooms = await client.rooms()
+            if not rooms:
+                raise RuntimeError("Account has no rooms")
+            room_id = rooms[0].room_id
+
+        counters.clear()
+        started = time.perf_counter()
+        async for _ in client.iter_history(room_id, limit, counters=counters):
+            if max_events and counters['events'] >= max_events:
+                break
+        elapsed = time.perf_counter() - started
+
+    return {
+        'room_id': room_id,
+        'limit': limit,
+        'elapsed': elapsed,
+        **counters,
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    }
+
+
+def _walk_in_child(room_id, limit, max_events, creds):
+    return asyncio.run(walk_history(room_id, limit, max_events, creds))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Full-history pagination throughput benchmark")
+    parser.add_argument('--room', help="room ID to walk (default: first joined room)")
+    parser.add_argument('--limits', default='50,100,250,500,1000', help="comma-separated page sizes")
+    parser.add_argument('--max-events', type=int, default=0, help="stop after this many events (0 = all)")
+    args = parser.parse_args()
+
+    creds = await load_test_credentials()
+    limits = [int(value) for value in args.limits.split(',')]
+
+    print("🧪 Matrix History Pagination Benchmark")
+    print("=" * 60)
+    results = []
+    loop = asyncio.get_running_loop()
+    for limit in limits:
+        # Fresh process per page size so peak RSS is not inherited from earlier runs
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                result = await loop.run_in_executor(pool, _walk_in_child, args.room, limit,
+                                                    args.max_events, creds)
+            except Exception as e:
+                print(f"   ❌ limit={limit}: {e}")
+                continue
+        results.append(result)
+        print(f"   📄 limit={limit:<5} {result['events']:>8} events in {result['pages']:>5} pages, "
+              f"{result['elapsed']:.2f}s, {result['events'] / result['elapsed']:>9.0f} ev/s, "
+              f"{result['bytes'] / result['elapsed'] / 1e6:>6.2f} MB/s, peak RSS {result['peak_rss_mb']:.1f} MB")
+
+    if results:
+        best = min(results, key=lambda r: r['elapsed'] / max(r['events'], 1))
+        print(f"\n🏁 Fastest catch-up: limit={best['limit']} "
+              f"({best['events'] / best['elapsed']:.0f} events/sec on {best['room_id']})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Matrix End-to-End Latency Probe
+Subscribes through /api/message-proxy/subscribe and /ws/extensions the way
+connectToMatrix() in extension.js does, sends tagged messages through
+/api/message-proxy/send at a controlled rate, and matches each messageEvent
+echo by its tag to report delivery latency, loss and reordering.
+
+Usage:
+    python latency_probe.py --rate 20 --count 500
+    python latency_probe.py --room '!abc:matrix.org' --rate 2 --count 60
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import aiohttp
+
+from bench_common import LatencyHistogram, authenticate
+from matrix_client import BASE_URL
+from test_complete_implementation import load_test_credentials, test_api_endpoint
+
+PROXY_BASE = f"{BASE_URL}/api/message-proxy"
+WS_URL = BASE_URL.replace('http', 'ws', 1) + "/ws/extensions"
+PLUGIN_ID = 'ai-ide-matrix-client-plugin-probe'
+TAG_PREFIX = 'latency-probe'
+
+
+class DeliveryTracker:
+    """Matches echoed messages to sends by tag"""
+
+    def __init__(self, run_id):
+        self.prefix = f"{TAG_PREFIX}:{run_id}:"
+        self.sent = {}       # seq -> perf_counter at send
+        self.failed = set()  # seqs whose send returned an error (the message may still arrive)
+        self.received = set()
+        self.latency = LatencyHistogram()
+        self.duplicates = 0
+        self.reordered = 0
+        self.highest_seq = -1
+        self.all_received = asyncio.Event()
+        self.expected = None
+
+    def tag(self, seq):
+        return f"{self.prefix}{seq}"
+
+    def on_sent(self, seq, started):
+        self.sent[seq] = started
+
+    def on_failed(self, seq):
+        self.failed.add(seq)
+        self._check_done()
+
+    @property
+    def succeeded(self):
+        return len(self.sent) - len(self.failed)
+
+    @property
+    def delivered(self):
+        """Echoes of sends that succeeded"""
+        return len(self.received - self.failed)
+
+    def _check_done(self):
+        if self.expected is not None and self.delivered >= self.expected:
+            self.all_received.set()
+
+    def on_frame(self, frame, received_at):
+        if frame.get('type') != 'messageEvent':
+            return
+        text = (frame.get('data') or {}).get('content', {}).get('text') or ''
+        if not text.startswith(self.prefix):
+            return
+        try:
+            seq = int(text[len(self.prefix):].split()[0])
+        except (ValueError, IndexError):
+            return
+        if seq in self.received:
+            self.duplicates += 1
+            return
+        if seq not in self.sent:
+            return
+        self.received.add(seq)
+        self.latency.record(received_at - self.sent[seq])
+        if seq < self.highest_seq:
+            self.reordered += 1
+        self.highest_seq = max(self.highest_seq, seq)
+        self._check_done()
+
+
+async def listen(ws, tracker):
+    async for msg in ws:
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            try:
+                frame = msg.json()
+            except ValueError:
+                continue
+            tracker.on_frame(frame, time.perf_counter())
+        elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+            break
+
+
+async def send_tagged(session, tracker, room_id, count, rate, padding=0):
+    """Send ``count`` tagged messages at ``rate`` msgs/sec on a fixed schedule.
+
+    Each send runs as its own task so a slow response does not hold back the
+    schedule; returns the number of failed sends.
+    """
+    interval = 1.0 / rate if rate > 0 else 0.0
+
+    async def send_one(seq):
+        text = tracker.tag(seq) + (' ' + 'x' * padding if padding else '')
+        tracker.on_sent(seq, time.perf_counter())
+        try:
+            async with session.post(f"{PROXY_BASE}/send", json={
+                'plugin_id': PLUGIN_ID,
+                'source': 'element',
+                'target_type': 'room',
+                'target_id': room_id,
+                'text': text,
+                'attachments': []
+            }) as response:
+                await response.read()
+                ok = response.status == 200
+        except aiohttp.ClientError:
+            ok = False
+        if not ok:
+            # Keep the send time: the echo may already have been matched against it
+            tracker.on_failed(seq)
+        return ok
+
+    started = time.perf_counter()
+    tasks = []
+    for seq in range(count):
+        if interval:
+            delay = started + seq * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send_one(seq)))
+    results = await asyncio.gather(*tasks)
+    return results.count(False)
+
+
+async def run_probe(creds, room_id=None, count=200, rate=10.0, drain=5.0, padding=0):
+    tracker = DeliveryTracker(uuid.uuid4().hex[:8])
+    async with aiohttp.ClientSession() as session:
+        if not await authenticate(session, creds):
+            raise RuntimeError("Authentication failed")
+        if room_id is None:
+            status, result = await test_api_endpoint(session, '/rooms')
+            rooms = result.get('data', []) if status == 200 else []
+            if not rooms:
+                raise RuntimeError("Account has no rooms to probe")
+            room_id = rooms[0]['room_id']
+
+        async with session.post(f"{PROXY_BASE}/subscribe", json={
+            'plugin_id': PLUGIN_ID,
+            'sources': ['element'],
+            'keywords': [],
+            'room_ids': [room_id]
+        }) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Subscribe failed: HTTP {response.status}")
+
+        async with session.ws_connect(WS_URL) as ws:
+            await ws.send_json({'type': 'identify', 'plugin_id': PLUGIN_ID})
+            listener = asyncio.create_task(listen(ws, tracker))
+            try:
+                errors = await send_tagged(session, tracker, room_id, count, rate, padding)
+                tracker.expected = tracker.succeeded
+                if tracker.delivered < tracker.expected:
+                    try:
+                        await asyncio.wait_for(tracker.all_received.wait(), drain)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                listener.cancel()
+                async with session.delete(f"{PROXY_BASE}/subscribe/{PLUGIN_ID}") as response:
+                    await response.read()
+
+    return room_id, tracker, errors
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="End-to-end send→receive latency probe")
+    parser.add_argument('--room', help="room ID to probe (default: first joined room)")
+    parser.add_argument('--count', type=int, default=200, help="tagged messages to send")
+    parser.add_argument('--rate', type=float, default=10.0, help="messages per second (0 = as fast as possible)")
+    parser.add_argument('--drain', type=float, default=5.0, help="seconds to wait for late echoes")
+    parser.add_argument('--padding', type=int, default=0, help="extra body bytes per message")
+    args = parser.parse_args()
+
+    creds = await load_test_credentials()
+    print("🧪 Matrix End-to-End Latency Probe")
+    print("=" * 60)
+    try:
+        room_id, tracker, errors = await run_probe(creds, args.room, args.count, args.rate,
+                                                   args.drain, args.padding)
+    except (RuntimeError, aiohttp.ClientError) as e:
+        print(f"   ❌ {e}")
+        return
+
+    # Loss only counts sends the proxy accepted; a failed send may or may not arrive
+    sent = tracker.succeeded
+    received = tracker.delivered
+    histogram = tracker.latency
+    print(f"   Room: {room_id}")
+    print(f"   📤 Sent: {sent} ({errors} send errors)")
+    print(f"   📥 Received: {received}  lost: {sent - received} ({(sent - received) / max(sent, 1):.1%})")
+    if len(tracker.received) > received:
+        print(f"   ⚠️  {len(tracker.received) - received} echo(es) arrived for sends that reported an error")
+    print(f"   🔀 Reordered: {tracker.reordered}  duplicates: {tracker.duplicates}")
+    if received:
+        print(f"   ⏱️  Delivery latency p50 {histogram.percentile(50) * 1000:.1f}ms  "
+              f"p95 {histogram.percentile(95) * 1000:.1f}ms  p99 {histogram.percentile(99) * 1000:.1f}ms  "
+              f"max {histogram.max_us / 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Matrix Client Load Test
+Runs N concurrent virtual users against the message proxy, each with its own
+login, over one pooled aiohttp connector. Every user follows a weighted mix of
+scenarios and the run reports per-endpoint throughput and latency percentiles.
+With --workers the users are sharded across processes, one event loop each,
+so the driver is not limited to one core; --scale reports how aggregate
+throughput grows with the worker count.
+
+Usage:
+    python load_bench.py --users 200 --concurrency 100 --duration 60
+    python load_bench.py --users 50 --mix open_room=5 --mix send=1
+    python load_bench.py --users 400 --workers 8 --username-template 'loadtest{n}'
+    python load_bench.py --users 400 --scale 1,2,4,8 --duration 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+from bench_common import LatencyHistogram
+from test_complete_implementation import load_test_credentials, test_api_endpoint
+
+# Scenario name -> default weight
+DEFAULT_MIX = {
+    'list_rooms': 1,
+    'open_room': 3,
+    'page_history': 3,
+    'send': 1,
+    'typing': 4,
+}
+
+
+class LoadStats:
+    """Per-endpoint latency histograms and error counts"""
+
+    def __init__(self):
+        self.latency = {}  # endpoint template -> LatencyHistogram
+        self.errors = {}   # endpoint template -> count
+
+    def record(self, endpoint, seconds, ok):
+        self.latency.setdefault(endpoint, LatencyHistogram()).record(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def merge(self, other):
+        for endpoint, histogram in other.latency.items():
+            self.latency.setdefault(endpoint, LatencyHistogram()).merge(histogram)
+        for endpoint, count in other.errors.items():
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + count
+        return self
+
+    def to_dict(self):
+        return {'latency': {endpoint: histogram.to_dict() for endpoint, histogram in self.latency.items()},
+                'errors': self.errors}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.latency = {endpoint: LatencyHistogram.from_dict(histogram)
+                         for endpoint, histogram in data['latency'].items()}
+        stats.errors = dict(data['errors'])
+        return stats
+
+
+class VirtualUser:
+    """One simulated IDE instance with its own login"""
+
+    def __init__(self, index, session, stats, creds, mix, rng, think_time=0.0):
+        self.index = index
+        self.session = session
+        self.stats = stats
+        self.creds = creds
+        self.mix = mix
+        self.rng = rng
+        self.think_time = think_time
+        self.rooms = []
+        self.history_tokens = {}  # room_id -> next from_token
+
+    async def call(self, template, endpoint, method='GET', data=None):
+        started = time.perf_counter()
+        status, result = await test_api_endpoint(self.session, endpoint, method, data)
+        ok = status == 200 and not (isinstance(result, dict) and result.get('success') is False)
+        self.stats.record(template, time.perf_counter() - started, ok)
+        return ok, result
+
+    async def login(self):
+        ok, result = await self.call('POST /login', '/login', 'POST', {
+            'homeserver': self.creds['homeserver'],
+            'username': self.creds['username'],
+            'password': self.creds['password']
+        })
+        return ok
+
+    async def list_rooms(self):
+        ok, result = await self.call('GET /rooms', '/rooms')
+        if ok and isinstance(result, dict):
+            self.rooms = [room['room_id'] for room in result.get('data', []) if isinstance(room, dict)]
+
+    async def open_room(self):
+        room_id = self.rng.choice(self.rooms)
+        ok, result = await self.call('GET /rooms/{room_id}/messages', f'/rooms/{room_id}/messages?limit=50')
+        if ok:
+            self.history_tokens[room_id] = result.get('data', {}).get('end')
+        await self.call('GET /rooms/{room_id}/members', f'/rooms/{room_id}/members')
+
+    async def page_history(self):
+        if not self.history_tokens:
+            return await self.open_room()
+        room_id = self.rng.choice(list(self.history_tokens))
+        token = self.history_tokens[room_id]
+        if not token:
+            del self.history_tokens[room_id]
+            return
+        ok, result = await self.call('GET /rooms/{room_id}/messages',
+                                     f'/rooms/{room_id}/messages?limit=50&from_token={token}')
+        if ok:
+            self.history_tokens[room_id] = result.get('data', {}).get('end')
+
+    async def send(self):
+        room_id = self.rng.choice(self.rooms)
+        await self.call('POST /rooms/{room_id}/send', f'/rooms/{room_id}/send', 'POST', {
+            'message': f"load test message from user {self.index}",
+            'msg_type': 'm.text'
+        })
+
+    async def typing(self):
+        room_id = self.rng.choice(self.rooms)
+        await self.call('PUT /rooms/{room_id}/typing', f'/rooms/{room_id}/typing', 'PUT', {
+            'typing': True,
+            'timeout': 5000
+        })
+
+    async def run(self, deadline):
+        if not await self.login():
+            return
+        await self.list_rooms()
+        if not self.rooms:
+            return
+
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            await getattr(self, scenario)()
+            if self.think_time:
+                await asyncio.sleep(self.rng.expovariate(1.0 / self.think_time))
+
+
+async def run_load(creds, users=10, concurrency=50, duration=30.0, mix=None,
+                   think_time=0.0, user_offset=0, seed=0, start_at=None):
+    """Run ``users`` virtual users for ``duration`` seconds; returns (stats, elapsed).
+
+    ``start_at`` (a time.time() value) delays the start so that worker
+    processes launched one after another begin generating load together.
+    """
+    if start_at is not None:
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+    stats = LoadStats()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    sessions = []
+    try:
+        virtual_users = []
+        for i in range(users):
+            index = user_offset + i
+            session = aiohttp.ClientSession(connector=connector, connector_owner=False)
+            sessions.append(session)
+            user_creds = dict(creds)
+            if creds.get('username_template'):
+                user_creds['username'] = creds['username_template'].format(n=index)
+            virtual_users.append(VirtualUser(index, session, stats, user_creds, mix or DEFAULT_MIX,
+                                             random.Random(seed + index), think_time))
+
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(user.run(deadline) for user in virtual_users))
+        elapsed = time.perf_counter() - started
+    finally:
+        for session in sessions:
+            await session.close()
+        await connector.close()
+    return stats, elapsed
+
+
+def _run_shard(creds, users, concurrency, duration, mix, think_time, user_offset, seed, start_at):
+    """Worker process entry point; returns (stats dict, elapsed, CPU seconds)"""
+    cpu_started = time.process_time()
+    stats, elapsed = asyncio.run(run_load(creds, users, concurrency, duration, mix,
+                                          think_time, user_offset, seed, start_at))
+    return stats.to_dict(), elapsed, time.process_time() - cpu_started
+
+
+def shard_users(users, workers):
+    """[(user_offset, users)] per worker; empty shards are dropped"""
+    base, extra = divmod(users, workers)
+    shards, offset = [], 0
+    for worker in range(workers):
+        count = base + (1 if worker < extra else 0)
+        if count:
+            shards.append((offset, count))
+        offset += count
+    return shards
+
+
+async def run_workers(creds, workers, users=10, concurrency=50, duration=30.0, mix=None,
+                      think_time=0.0, seed=0):
+    """run_load sharded over ``workers`` processes; returns (stats, elapsed, cpu_seconds).
+
+    Each worker gets a contiguous slice of user indices, so with a
+    ``username_template`` every process logs in its own accounts, and a
+    share of the connection pool limit. Latency histograms come back as
+    bucket counts and are merged exactly.
+    """
+    shards = shard_users(users, workers)
+    pool_limit = max(1, -(-concurrency // len(shards)))
+    # Leave time for the processes to start and import before the common start
+    start_at = time.time() + 0.5 + 0.05 * len(shards)
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, _run_shard, creds, count, pool_limit, duration, mix,
+                                 think_time, offset, seed, start_at)
+            for offset, count in shards))
+
+    stats = LoadStats()
+    for stats_dict, _, _ in results:
+        stats.merge(LoadStats.from_dict(stats_dict))
+    elapsed = max(worker_elapsed for _, worker_elapsed, _ in results)
+    cpu_seconds = [cpu for _, _, cpu in results]
+    return stats, elapsed, cpu_seconds
+
+
+def print_report(stats, elapsed):
+    print(f"\n📊 Results over {elapsed:.1f}s")
+    header = f"   {'endpoint':<32} {'reqs':>8} {'err':>6} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print("   " + "-" * (len(header) - 3))
+    for endpoint in sorted(stats.latency):
+        histogram = stats.latency[endpoint]
+        print(f"   {endpoint:<32} {histogram.total:>8} {stats.errors.get(endpoint, 0):>6} "
+              f"{histogram.total / elapsed:>9.1f} "
+              f"{histogram.percentile(50) * 1000:>6.1f}ms {histogram.percentile(95) * 1000:>6.1f}ms "
+              f"{histogram.percentile(99) * 1000:>6.1f}ms {histogram.max_us / 1000:>6.1f}ms")
+
+
+def print_scaling(rows):
+    """rows: [(workers, stats, elapsed, cpu_seconds)]"""
+    print("\n📈 Throughput scaling")
+    header = (f"   {'workers':>7} {'reqs':>8} {'req/s':>9} {'speed-up':>9} {'per worker':>11} "
+              f"{'client CPU':>11} {'p50':>8} {'p99':>8} {'err':>6}")
+    print(header)
+    print("   " + "-" * (len(header) - 3))
+    baseline = None
+    for workers, stats, elapsed, cpu_seconds in rows:
+        combined = LatencyHistogram()
+        for histogram in stats.latency.values():
+            combined.merge(histogram)
+        rate = combined.total / elapsed if elapsed else 0.0
+        if baseline is None:
+            baseline = rate
+        speed_up = f"{rate / baseline:>8.2f}x" if baseline else f"{'-':>9}"
+        # Mean busy share of one core per worker; near 100% means the driver is CPU bound
+        cpu_share = sum(cpu_seconds) / len(cpu_seconds) / elapsed if elapsed else 0.0
+        # Users < workers leaves some workers without a shard, so divide by the processes that ran
+        processes = len(cpu_seconds)
+        print(f"   {processes:>7} {combined.total:>8} {rate:>9.1f} {speed_up} {rate / processes:>11.1f} "
+              f"{cpu_share:>10.0%} {combined.percentile(50) * 1000:>6.1f}ms "
+              f"{combined.percentile(99) * 1000:>6.1f}ms {sum(stats.errors.values()):>6}")
+
+
+def parse_mix(values):
+    mix = dict(DEFAULT_MIX)
+    for value in values or []:
+        name, _, weight = value.partition('=')
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown scenario '{name}' (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def count_at_least(minimum):
+    """argparse type for integer counts no smaller than ``minimum``"""
+    def parse(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"'{value}' is not an integer")
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f"{number} is less than {minimum}")
+        return number
+    return parse
+
+
+def worker_counts(value):
+    """argparse type for --scale: comma-separated worker counts, each at least 1"""
+    return [count_at_least(1)(count) for count in value.split(',')]
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Concurrent virtual-user load test for the message proxy")
+    parser.add_argument('--users', type=count_at_least(1), default=10, help="number of virtual users")
+    parser.add_argument('--concurrency', type=int, default=50, help="connection pool limit")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds to run")
+    parser.add_argument('--think-time', type=float, default=0.0, help="mean pause between actions")
+    parser.add_argument('--mix', action='append', metavar='SCENARIO=WEIGHT',
+                        help=f"scenario weight, may be repeated ({', '.join(DEFAULT_MIX)})")
+    parser.add_argument('--username-template', help="per-user login name, e.g. 'loadtest{n}'")
+    parser.add_argument('--workers', type=count_at_least(0), default=0,
+                        help="shard users across this many processes (0: one in-process event loop)")
+    parser.add_argument('--scale', type=worker_counts, metavar='N,N,...',
+                        help="repeat the run for each worker count and report throughput scaling")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+async def main():
+    args = build_arg_parser().parse_args()
+    creds = await load_test_credentials()
+    if not creds.get('username') or not creds.get('password'):
+        print("❌ Load test needs username/password (userdata file or MATRIX_USERNAME/MATRIX_PASSWORD)")
+        return
+    creds['username_template'] = args.username_template
+
+    mix = parse_mix(args.mix)
+
+    print("🧪 Matrix Client Load Test")
+    print("=" * 60)
+    print(f"   Users: {args.users}, pool limit: {args.concurrency}, duration: {args.duration}s")
+    if args.scale:
+        print(f"   Worker counts: {', '.join(map(str, args.scale))} ({os.cpu_count()} CPUs)")
+        rows = []
+        for workers in args.scale:
+            print(f"\n▶️  {workers} worker(s)...")
+            stats, elapsed, cpu_seconds = await run_workers(creds, workers, args.users, args.concurrency,
+                                                            args.duration, mix, args.think_time, args.seed)
+            rows.append((workers, stats, elapsed, cpu_seconds))
+            print_report(stats, elapsed)
+        print_scaling(rows)
+    elif args.workers:
+        print(f"   Workers: {args.workers} processes")
+        stats, elapsed, cpu_seconds = await run_workers(creds, args.workers, args.users, args.concurrency,
+                                                        args.duration, mix, args.think_time, args.seed)
+        print_report(stats, elapsed)
+        print_scaling([(args.workers, stats, elapsed, cpu_seconds)])
+    else:
+        stats, elapsed = await run_load(creds, args.users, args.concurrency, args.duration,
+                                        mix, args.think_time, seed=args.seed)
+        print_report(stats, elapsed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
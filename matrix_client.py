@@ -0,0 +1,734 @@
+"""
+Compact Matrix Proxy Client
+Small reusable client for the /api/message-proxy/element routes. Response
+shapes (success/data, rooms, joined_rooms, chunk, messages, bare lists) are
+normalised in one place and decoded into compact __slots__ records instead of
+nested dicts. Uses orjson for decoding when it is installed.
+"""
+
+import asyncio
+import codecs
+import json
+import os
+import re
+import sys
+import time
+from array import array
+from urllib.parse import quote
+
+import aiohttp
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - optional speed-up
+    loads = json.loads
+
+# Proxy location; the test and benchmark scripts take theirs from here
+BASE_URL = os.getenv('MATRIX_PROXY_URL', "http://localhost:8000")
+API_BASE = f"{BASE_URL}/api/message-proxy/element"
+# Access tokens from earlier logins, reused via /restore_session (MATRIX_SESSION_CACHE= disables it)
+SESSION_CACHE_FILE = os.getenv('MATRIX_SESSION_CACHE',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'ai-ide-matrix-client', 'sessions.json'))
+
+_intern = sys.intern
+
+
+def unwrap(result, *keys):
+    """Return the payload of a proxy response.
+
+    Accepts ``{'success': True, 'data': ...}``, a dict carrying one of
+    ``keys`` (e.g. 'rooms', 'joined_rooms', 'chunk'), or a bare value.
+    """
+    if isinstance(result, dict) and result.get('success') and 'data' in result:
+        result = result['data']
+    if isinstance(result, dict):
+        for key in keys:
+            if key in result:
+                return result[key]
+    return result
+
+
+def unwrap_list(result, *keys):
+    """Like ``unwrap`` but always returns a list"""
+    value = unwrap(result, *keys)
+    return value if isinstance(value, list) else []
+
+
+class Room:
+    """Joined room summary"""
+
+    __slots__ = ('room_id', 'name', 'canonical_alias', 'topic', 'member_count', 'unread_count',
+                 'last_activity', 'is_direct', 'is_space', 'is_encrypted')
+
+    def __init__(self, room_id, name=None, canonical_alias=None, topic=None, member_count=0,
+                 unread_count=0, last_activity=0, is_direct=False, is_space=False, is_encrypted=False):
+        self.room_id = room_id
+        self.name = name
+        self.canonical_alias = canonical_alias
+        self.topic = topic
+        self.member_count = member_count
+        self.unread_count = unread_count
+        self.last_activity = last_activity
+        self.is_direct = is_direct
+        self.is_space = is_space
+        self.is_encrypted = is_encrypted
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['room_id'],
+            data.get('name'),
+            data.get('canonical_alias'),
+            data.get('topic'),
+            data.get('member_count') or 0,
+            data.get('unread_count') or 0,
+            data.get('last_activity') or 0,
+            bool(data.get('is_direct')),
+            bool(data.get('is_space')) or data.get('room_type') == 'm.space',
+            bool(data.get('is_encrypted')),
+        )
+
+    @property
+    def display_name(self):
+        return self.name or self.canonical_alias or self.room_id
+
+    def __repr__(self):
+        return f"Room({self.room_id!r}, {self.display_name!r})"
+
+
+class Event:
+    """Room message event"""
+
+    __slots__ = ('event_id', 'sender', 'ts', 'body', 'msgtype')
+
+    def __init__(self, event_id, sender, ts, body, msgtype='m.text'):
+        self.event_id = event_id
+        self.sender = sender
+        self.ts = ts
+        self.body = body
+        self.msgtype = msgtype
+
+    @classmethod
+    def from_dict(cls, data):
+        content = data.get('content') or {}
+        return cls(
+            data.get('event_id'),
+            _intern(data.get('sender') or ''),
+            data.get('origin_server_ts') or data.get('timestamp') or 0,
+            data.get('body', content.get('body', '')),
+            _intern(content.get('msgtype') or data.get('msgtype') or 'm.text'),
+        )
+
+    def __repr__(self):
+        return f"Event({self.event_id!r}, {self.sender!r})"
+
+
+class Member:
+    """Room member"""
+
+    __slots__ = ('user_id', 'display_name', 'power_level', 'membership', 'presence')
+
+    def __init__(self, user_id, display_name=None, power_level=0, membership='join', presence='offline'):
+        self.user_id = user_id
+        self.display_name = display_name
+        self.power_level = power_level
+        self.membership = membership
+        self.presence = presence
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, str):
+            return cls(data)
+        return cls(
+            data['user_id'],
+            data.get('display_name'),
+            data.get('power_level') or 0,
+            _intern(data.get('membership') or 'join'),
+            _intern(data.get('presence') or 'offline'),
+        )
+
+    def __repr__(self):
+        return f"Member({self.user_id!r}, power_level={self.power_level})"
+
+
+class EventColumns:
+    """Column store for long histories.
+
+    Timestamps live in an ``array('q')`` and senders/msgtypes are interned, so
+    a 50k-event history costs a fraction of 50k dicts. Rows are materialised
+    as ``Event`` records on access.
+    """
+
+    __slots__ = ('event_ids', 'senders', 'ts', 'bodies', 'msgtypes')
+
+    def __init__(self):
+        self.event_ids = []
+        self.senders = []
+        self.ts = array('q')
+        self.bodies = []
+        self.msgtypes = []
+
+    def extend(self, chunk):
+        for data in chunk:
+            content = data.get('content') or {}
+            self.event_ids.append(data.get('event_id'))
+            self.senders.append(_intern(data.get('sender') or ''))
+            self.ts.append(data.get('origin_server_ts') or data.get('timestamp') or 0)
+            self.bodies.append(data.get('body', content.get('body', '')))
+            self.msgtypes.append(_intern(content.get('msgtype') or data.get('msgtype') or 'm.text'))
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, index):
+        return Event(self.event_ids[index], self.senders[index], self.ts[index],
+                     self.bodies[index], self.msgtypes[index])
+
+
+_ARRAY_START = re.compile(r'"(?:data|members|rooms|joined_rooms|chunk)"\s*:\s*\[')
+_SEPARATORS = ' \t\r\n,'
+
+
+async def iter_json_array(content, chunk_size=64 * 1024):
+    """Yield the items of the list payload of a streamed JSON response.
+
+    ``content`` is an aiohttp ``StreamReader`` (``response.content``). The
+    first array found under data/members/rooms/joined_rooms/chunk, or a bare
+    top-level array, is decoded item by item as bytes arrive, so the full
+    body is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = None  # index just past '[' once the array has been found
+    async for chunk in content.iter_chunked(chunk_size):
+        buffer += text.decode(chunk)
+        if pos is None:
+            stripped = buffer.lstrip()
+            if stripped.startswith('['):
+                pos = len(buffer) - len(stripped) + 1
+            else:
+                match = _ARRAY_START.search(buffer)
+                if not match:
+                    continue
+                pos = match.end()
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # item continues in the next chunk
+            yield item
+        buffer = buffer[pos:]
+        pos = 0
+
+
+def decode_rooms(result):
+    return [Room.from_dict(room) for room in unwrap_list(result, 'rooms', 'joined_rooms')
+            if isinstance(room, dict)]
+
+
+def room_delta(result):
+    """The ``{'rooms', 'left', 'full', 'next_batch'}`` delta of a ``/rooms?since=`` response.
+
+    A proxy without delta support ignores ``since`` and returns its plain room
+    list; that comes back as a full delta, so the snapshot is replaced instead
+    of silently going stale.
+    """
+    delta = unwrap(result)
+    if isinstance(delta, dict) and isinstance(delta.get('rooms'), list) and 'full' in delta:
+        return delta
+    rooms = unwrap(result, 'rooms', 'joined_rooms')
+    if not isinstance(rooms, list):
+        raise ProxyError(200, {'error': "no room list in /rooms response"})
+    token = result.get('next_batch') if isinstance(result, dict) else None
+    if token is None and isinstance(delta, dict):
+        token = delta.get('next_batch')
+    return {'rooms': rooms, 'left': [], 'full': True, 'next_batch': token}
+
+
+def decode_messages(result):
+    """Return (events, end_token) from a /messages response"""
+    page = unwrap(result)
+    if isinstance(page, dict):
+        chunk = page.get('chunk', page.get('messages', []))
+        return [Event.from_dict(event) for event in chunk], page.get('end')
+    if isinstance(page, list):
+        return [Event.from_dict(event) for event in page], None
+    return [], None
+
+
+def decode_members(result):
+    return [Member.from_dict(member) for member in unwrap_list(result, 'members')]
+
+
+class RoomSnapshot:
+    """Local room list kept current from delta refreshes (``/rooms?since=``)"""
+
+    def __init__(self):
+        self.rooms = {}  # room_id -> Room
+        self.token = None
+
+    def replace(self, rooms, token=None):
+        self.rooms = {room.room_id: room for room in rooms}
+        self.token = token
+
+    def apply(self, delta):
+        """Apply ``{'rooms', 'left', 'full', 'next_batch'}``; returns rooms touched"""
+        rooms = decode_rooms(delta.get('rooms', []))
+        if delta.get('full'):
+            self.replace(rooms, delta.get('next_batch'))
+            return len(rooms)
+        for room in rooms:
+            self.rooms[room.room_id] = room
+        for room_id in delta.get('left', []):
+            self.rooms.pop(room_id, None)
+        self.token = delta.get('next_batch') or self.token
+        return len(rooms) + len(delta.get('left', []))
+
+
+class ProxyError(Exception):
+    """Non-2xx or unsuccessful response from the message proxy"""
+
+    def __init__(self, status, result):
+        self.status = status
+        self.result = result
+        message = result.get('error', 'Unknown error') if isinstance(result, dict) else result
+        super().__init__(f"HTTP {status}: {message}")
+
+
+class MatrixProxyClient:
+    """Async client for the message proxy returning compact records.
+
+    Usage:
+        async with MatrixProxyClient() as client:
+            await client.login(homeserver, username, password)
+            rooms = await client.rooms()
+    """
+
+    def __init__(self, api_base=API_BASE, session=None):
+        self.api_base = api_base
+        self.session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+
+    async def request(self, method, endpoint, data=None, params=None):
+        async with self.session.request(method, f"{self.api_base}{endpoint}", json=data,
+                                        params=params) as response:
+            body = await response.read()
+            status = response.status
+        try:
+            result = loads(body) if body else {}
+        except ValueError:
+            result = {'error': body.decode('utf-8', 'replace')}
+        if status != 200 or (isinstance(result, dict) and result.get('success') is False):
+            raise ProxyError(status, result)
+        return result
+
+    @staticmethod
+    def room_path(room_id):
+        return f"/rooms/{quote(room_id, safe='')}"
+
+    # === Session ===
+
+    async def login(self, homeserver, username, password):
+        return await self.request('POST', '/login', {
+            'homeserver': homeserver, 'username': username, 'password': password
+        })
+
+    async def restore_session(self, homeserver, user_id, access_token, device_id=None):
+        return await self.request('POST', '/restore_session', {
+            'homeserver_url': homeserver, 'user_id': user_id,
+            'access_token': access_token, 'device_id': device_id
+        })
+
+    async def logout(self):
+        return await self.request('POST', '/logout')
+
+    # === Rooms ===
+
+    async def rooms(self):
+        return decode_rooms(await self.request('GET', '/rooms'))
+
+    async def sync_rooms(self, snapshot):
+        """Bring a RoomSnapshot up to date: only changed rooms once it has a token"""
+        if snapshot.token:
+            snapshot.apply(room_delta(await self.request('GET', '/rooms', params={'since': snapshot.token})))
+        else:
+            result = await self.request('GET', '/rooms')
+            snapshot.replace(decode_rooms(result), result.get('next_batch') if isinstance(result, dict) else None)
+        return snapshot
+
+    async def messages(self, room_id, limit=50, from_token=None):
+        params = {'limit': str(limit)}
+        if from_token:
+            params['from_token'] = from_token
+        return decode_messages(await self.request('GET', f"{self.room_path(room_id)}/messages",
+                                                  params=params))
+
+    async def iter_history(self, room_id, limit=100, from_token=None, counters=None):
+        """Yield pages of ``Event`` records back to the start of the room.
+
+        Only the current page is held in memory; callers that need totals pass
+        a ``counters`` dict which receives running 'pages' and 'events', and
+        'end_token', the from_token of the page after the one just yielded.
+        """
+        token = from_token
+        while True:
+            events, token = await self.messages(room_id, limit, token)
+            if counters is not None:
+                counters['pages'] = counters.get('pages', 0) + 1
+                counters['events'] = counters.get('events', 0) + len(events)
+                counters['end_token'] = token
+            if events:
+                yield events
+            if not events or not token:
+                return
+
+    async def members(self, room_id):
+        return decode_members(await self.request('GET', f"{self.room_path(room_id)}/members"))
+
+    async def send(self, room_id, message, msg_type='m.text'):
+        result = await self.request('POST', f"{self.room_path(room_id)}/send",
+                                    {'message': message, 'msg_type': msg_type})
+        return result.get('event_id')
+
+    async def typing(self, room_id, typing=True, timeout=30000):
+        await self.request('PUT', f"{self.room_path(room_id)}/typing",
+                           {'typing': typing, 'timeout': timeout if typing else 0})
+
+    # === Spaces ===
+
+    async def space_hierarchy(self, space_id, max_depth=3, limit=None, from_token=None):
+        """One page of a space hierarchy; returns (room summary dicts, next_batch)"""
+        params = {'max_depth': str(max_depth)}
+        if limit:
+            params['limit'] = str(limit)
+        if from_token:
+            params['from'] = from_token
+        page = unwrap(await self.request('GET', f"/spaces/{quote(space_id, safe='')}/hierarchy", params=params))
+        if isinstance(page, dict):
+            return page.get('rooms', []), page.get('next_batch')
+        return (page if isinstance(page, list) else []), None
+
+
+def space_child_ids(summary):
+    """Child room IDs listed in a hierarchy summary's m.space.child state"""
+    return [state['state_key'] for state in summary.get('children_state', [])
+            if state.get('type') == 'm.space.child' and state.get('state_key')]
+
+
+class SummaryCache:
+    """Hierarchy room summaries by room ID, each fresh for ``ttl`` seconds after it was fetched.
+
+    Also remembers when each space was last expanded (its own summary and
+    those of all its children fetched together), so a space only needs a
+    new request once that expansion is older than the TTL.
+    """
+
+    def __init__(self, ttl=300.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = {}   # room_id -> (fetched_at, summary)
+        self.expanded = {}  # space_id -> fetched_at of its last expansion
+
+    def get(self, room_id):
+        entry = self.entries.get(room_id)
+        if entry is None or self.clock() - entry[0] >= self.ttl:
+            return None
+        return entry[1]
+
+    def is_expanded(self, space_id):
+        fetched_at = self.expanded.get(space_id)
+        return fetched_at is not None and self.clock() - fetched_at < self.ttl
+
+    def put_expansion(self, space_id, summaries):
+        now = self.clock()
+        for summary in summaries:
+            self.entries[summary['room_id']] = (now, summary)
+        self.expanded[space_id] = now
+
+    def expire(self, space_id):
+        """Forget a space's expansion so the next crawl fetches it again"""
+        self.expanded.pop(space_id, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SpaceTree:
+    """Result of a crawl: every room found once, with all of its parents"""
+
+    def __init__(self):
+        self.rooms = {}    # room_id -> summary
+        self.parents = {}  # room_id -> set of parent space IDs
+        self.depth = {}    # room_id -> shallowest level it was found at (roots are 0)
+        self.failed = {}   # space_id -> error for spaces that could not be fetched
+
+    @property
+    def spaces(self):
+        return [room_id for room_id, summary in self.rooms.items() if summary.get('room_type') == 'm.space']
+
+
+class SpaceCrawler:
+    """Breadth-first walk of space hierarchies with bounded concurrency.
+
+    Each space is expanded at most once per crawl, one level at a time, so a
+    space listed under several parents is fetched once and every room is
+    reported once. A space expanded within the ``SummaryCache`` TTL costs no
+    request, which makes repeat crawls incremental: only expired spaces are
+    fetched again.
+    """
+
+    def __init__(self, client, cache=None, concurrency=8, page_limit=50):
+        self.client = client
+        self.cache = cache if cache is not None else SummaryCache()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.page_limit = page_limit
+        self.requests = 0
+
+    async def _fetch(self, space_id):
+        """Summaries of a space and its direct children, all pages"""
+        summaries, token = [], None
+        while True:
+            async with self.semaphore:
+                self.requests += 1
+                page, token = await self.client.space_hierarchy(space_id, 1, self.page_limit, token)
+            summaries.extend(summary for summary in page if isinstance(summary, dict) and summary.get('room_id'))
+            if not token:
+                return summaries
+
+    async def _expand(self, space_id):
+        if not self.cache.is_expanded(space_id):
+            self.cache.put_expansion(space_id, await self._fetch(space_id))
+        return self.cache.get(space_id)
+
+    async def crawl(self, space_ids, max_depth=None):
+        """Walk everything below ``space_ids``; returns a SpaceTree"""
+        tree = SpaceTree()
+        frontier = list(dict.fromkeys(space_ids))
+        expanded = set(frontier)
+        for space_id in frontier:
+            tree.depth[space_id] = 0
+        level = 0
+        while frontier and (max_depth is None or level < max_depth):
+            results = await asyncio.gather(*(self._expand(space_id) for space_id in frontier),
+                                           return_exceptions=True)
+            next_frontier = []
+            for space_id, summary in zip(frontier, results):
+                if isinstance(summary, BaseException):
+                    if not isinstance(summary, (ProxyError, aiohttp.ClientError, asyncio.TimeoutError)):
+                        raise summary
+                    tree.failed[space_id] = summary
+                    continue
+                if summary is None:
+                    continue
+                tree.rooms[space_id] = summary
+                for child in space_child_ids(summary):
+                    tree.parents.setdefault(child, set()).add(space_id)
+                    tree.depth.setdefault(child, level + 1)
+                    child_summary = self.cache.get(child)
+                    if child_summary is None:
+                        continue  # not visible to us (e.g. a private room)
+                    tree.rooms[child] = child_summary
+                    if child_summary.get('room_type') == 'm.space' and child not in expanded:
+                        expanded.add(child)
+                        next_frontier.append(child)
+            frontier = next_frontier
+            level += 1
+        return tree
+
+
+class TypingCoalescer:
+    """Keystrokes in, a few typing notifications out (mirrors ui-new/utils/TypingCoalescer.js).
+
+    A burst of keystrokes sends "typing" once, then a refresh every
+    ``refresh_interval`` seconds so the server-side timeout never lapses, and
+    "stopped" ``stop_delay`` seconds after the last keystroke; resuming before
+    then sends nothing. One request per room is in flight at a time and
+    changes made meanwhile collapse into the latest state. ``send`` is
+    ``async send(room_id, typing, timeout_ms)``, e.g. MatrixProxyClient.typing.
+    """
+
+    def __init__(self, send, refresh_interval=20.0, stop_delay=3.0, server_timeout=30.0):
+        self.send = send
+        self.refresh_interval = refresh_interval
+        self.stop_delay = stop_delay
+        self.server_timeout = server_timeout
+        self.rooms = {}  # room_id -> {'announced', 'wanted', 'sent_at', 'stop_timer', 'in_flight'}
+        self.requests = 0
+
+    def _room(self, room_id):
+        state = self.rooms.get(room_id)
+        if state is None:
+            state = self.rooms[room_id] = {'announced': False, 'wanted': False, 'sent_at': 0.0,
+                                           'stop_timer': None, 'in_flight': None}
+        return state
+
+    def keystroke(self, room_id):
+        state = self._room(room_id)
+        state['wanted'] = True
+        if state['stop_timer']:
+            state['stop_timer'].cancel()
+        state['stop_timer'] = asyncio.get_running_loop().call_later(self.stop_delay, self._idle, room_id)
+        if not state['announced'] or time.monotonic() - state['sent_at'] >= self.refresh_interval:
+            self.flush(room_id)
+
+    def stop(self, room_id):
+        """Stop typing now (message sent, composer cleared or room closed)"""
+        state = self.rooms.get(room_id)
+        if state is None:
+            return
+        if state['stop_timer']:
+            state['stop_timer'].cancel()
+            state['stop_timer'] = None
+        state['wanted'] = False
+        self.flush(room_id)
+
+    def _idle(self, room_id):
+        state = self.rooms.get(room_id)
+        if state is not None:
+            state['stop_timer'] = None
+            state['wanted'] = False
+            self.flush(room_id)
+
+    def flush(self, room_id):
+        state = self._room(room_id)
+        if state['in_flight'] is None:
+            # Mark the state as announced before the task runs so that keystrokes in between don't resend it
+            typing = state['wanted']
+            if typing == state['announced'] and not self._refresh_due(state):
+                if not typing and state['stop_timer'] is None:
+                    # Idle with nothing to send: forget the room, as _send_loop does after a send
+                    self.rooms.pop(room_id, None)
+                return None
+            state['announced'], state['sent_at'] = typing, time.monotonic()
+            state['in_flight'] = asyncio.ensure_future(self._send_loop(room_id, state, typing))
+        return state['in_flight']
+
+    def _refresh_due(self, state):
+        return state['wanted'] and time.monotonic() - state['sent_at'] >= self.refresh_interval
+
+    async def _send_loop(self, room_id, state, typing):
+        try:
+            while True:
+                self.requests += 1
+                try:
+                    await self.send(room_id, typing, int(self.server_timeout * 1000))
+                except (aiohttp.ClientError, ProxyError, asyncio.TimeoutError):
+                    pass  # typing notifications are not critical
+                typing = state['wanted']
+                if typing == state['announced'] and not self._refresh_due(state):
+                    break
+                state['announced'], state['sent_at'] = typing, time.monotonic()
+        finally:
+            state['in_flight'] = None
+            if not state['wanted'] and state['stop_timer'] is None:
+                self.rooms.pop(room_id, None)
+
+    async def close(self):
+        """Send "stopped" for every room still typing and wait for it"""
+        for room_id in list(self.rooms):
+            self.stop(room_id)
+        pending = [state['in_flight'] for state in self.rooms.values() if state['in_flight']]
+        await asyncio.gather(*pending)
+
+
+# === Session cache ===
+
+def _session_key(creds):
+    return f"{BASE_URL} {creds.get('homeserver')} {creds.get('username') or creds.get('user_id')}"
+
+
+def read_session_cache():
+    """Cached sessions by proxy, homeserver and user; ignored unless private to this user"""
+    if not SESSION_CACHE_FILE:
+        return {}
+    try:
+        info = os.stat(SESSION_CACHE_FILE)
+    except FileNotFoundError:
+        return {}
+    if info.st_mode & 0o077 or info.st_uid != os.getuid():
+        print(f"⚠️  Ignoring session cache {SESSION_CACHE_FILE}: it must be owned by you with mode 600")
+        return {}
+    try:
+        with open(SESSION_CACHE_FILE, 'r') as f:
+            sessions = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return sessions if isinstance(sessions, dict) else {}
+
+
+def _write_session_cache(sessions):
+    directory = os.path.dirname(SESSION_CACHE_FILE)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    temp_path = f"{SESSION_CACHE_FILE}.{os.getpid()}.tmp"
+    # Created 0600 so the token is never readable by others, not even briefly
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(sessions, f, indent=2)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    os.replace(temp_path, SESSION_CACHE_FILE)
+
+
+def save_session(creds):
+    """Remember the access token in creds for later runs"""
+    if not SESSION_CACHE_FILE or not creds.get('access_token'):
+        return
+    sessions = read_session_cache()
+    sessions[_session_key(creds)] = {
+        'user_id': creds.get('user_id'),
+        'access_token': creds['access_token'],
+        'device_id': creds.get('device_id'),
+        'saved_at': int(time.time())
+    }
+    try:
+        _write_session_cache(sessions)
+    except OSError as e:
+        print(f"⚠️  Could not write session cache {SESSION_CACHE_FILE}: {e}")
+
+
+def forget_session(creds):
+    """Drop the cached session for creds (e.g. after its token was rejected)"""
+    sessions = read_session_cache()
+    if sessions.pop(_session_key(creds), None) is not None:
+        try:
+            _write_session_cache(sessions)
+        except OSError as e:
+            print(f"⚠️  Could not write session cache {SESSION_CACHE_FILE}: {e}")
+
+
+def with_cached_session(creds):
+    """Fill in the cached access token for creds that carry none, marking them 'from_cache'"""
+    if creds.get('access_token'):
+        return creds
+    cached = read_session_cache().get(_session_key(creds))
+    if cached and cached.get('access_token'):
+        creds.update({
+            'user_id': cached.get('user_id') or creds.get('user_id'),
+            'access_token': cached['access_token'],
+            'device_id': cached.get('device_id'),
+            'from_cache': True
+        })
+    return creds
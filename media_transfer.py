@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Streaming Media Transfer
+Upload and download files through the message proxy's media routes without
+holding them in memory: uploads send memory-mapped chunks of the file, and
+downloads are written to disk as they arrive, optionally as several parallel
+range requests. Interrupted downloads resume from a progress file next to
+the partial download.
+
+Downloads use the proxy's /media/download route, as ApiClient.downloadMedia()
+does. Streamed uploads go to /media/upload, which only proxy_standin.py
+serves: the real proxy's /upload (ApiClient.uploadFile()) takes a file_path
+for the proxy to read itself, so there is no request body to stream. The
+benchmark therefore refuses to run against anything but the stand-in.
+
+Usage (benchmark; stand-in only, start proxy_standin.py first):
+    python media_transfer.py --sizes 1M,64M,512M,2G --parallel 1,4
+    python media_transfer.py --sizes 256M --verify
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+import aiohttp
+
+from bench_common import authenticate
+from matrix_client import API_BASE
+from test_complete_implementation import load_test_credentials
+
+CHUNK_SIZE = 1 << 20
+# Progress of a partial download is saved after this many bytes per range
+SAVE_EVERY = 16 << 20
+# The /health 'service' of proxy_standin.py, the only proxy with /media/upload
+STANDIN_SERVICE = 'message-proxy-standin'
+
+
+class TransferInterrupted(Exception):
+    """Raised by download_file when ``stop_after`` bytes have been fetched"""
+
+
+def iter_file_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield zero-copy memoryview chunks of a memory-mapped file.
+
+    Pages of a chunk are dropped from the process once the consumer asks for
+    the next one, so resident memory stays at about one chunk whatever the
+    file size (the mapping is read-only, so dropped pages just refault).
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    can_drop = hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_DONTNEED')
+    if can_drop and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    view = memoryview(mapped)
+    try:
+        for offset in range(0, size, chunk_size):
+            yield view[offset:offset + chunk_size]
+            if can_drop:
+                mapped.madvise(mmap.MADV_DONTNEED, offset, min(chunk_size, size - offset))
+    finally:
+        view.release()
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # a chunk is still referenced by the transport; unmapped when collected
+
+
+async def _chunk_stream(path, chunk_size):
+    for chunk in iter_file_chunks(path, chunk_size):
+        yield chunk
+
+
+def parse_mxc(content_uri):
+    """'mxc://server/media_id' -> (server, media_id)"""
+    if not content_uri.startswith('mxc://'):
+        raise ValueError(f"not an mxc:// URI: {content_uri}")
+    server, _, media_id = content_uri[len('mxc://'):].partition('/')
+    return server, media_id
+
+
+async def is_standin(session):
+    """True when the proxy at API_BASE is proxy_standin.py"""
+    try:
+        async with session.get(f"{API_BASE}/health") as response:
+            result = await response.json()
+    except (aiohttp.ClientError, ValueError):
+        return False
+    return isinstance(result, dict) and result.get('service') == STANDIN_SERVICE
+
+
+async def upload_file(session, path, filename=None, content_type='application/octet-stream',
+                      chunk_size=CHUNK_SIZE):
+    """Stream ``path`` to the stand-in's /media/upload; returns the mxc:// content URI"""
+    filename = filename or os.path.basename(path)
+    headers = {'Content-Type': content_type, 'Content-Length': str(os.path.getsize(path))}
+    async with session.post(f"{API_BASE}/media/upload?filename={quote(filename)}",
+                            data=_chunk_stream(path, chunk_size), headers=headers) as response:
+        result = await response.json()
+        if response.status != 200 or not result.get('success'):
+            raise RuntimeError(f"HTTP {response.status} uploading {path}: {result.get('error', result)}")
+    return result['content_uri']
+
+
+def _split_ranges(size, parts):
+    step = -(-size // parts)
+    return [{'start': start, 'end': min(start + step, size) - 1, 'done': 0}
+            for start in range(0, size, step)]
+
+
+async def _probe(session, url):
+    """(size, accepts_ranges) from a one-byte range request; size is None when the server does not say"""
+    async with session.get(url, headers={'Range': 'bytes=0-0'}) as response:
+        if response.status == 206:
+            total = response.headers['Content-Range'].rsplit('/', 1)[1]
+            return (int(total) if total != '*' else None), True
+        if response.status == 200:
+            return response.content_length, False
+        raise RuntimeError(f"HTTP {response.status} from {url}")
+
+
+async def download_file(session, content_uri, dest, parallel=1, chunk_size=CHUNK_SIZE, resume=True,
+                        stop_after=None):
+    """Stream media to ``dest``; returns the number of bytes fetched by this call.
+
+    The file is written to ``dest + '.part'`` with progress in
+    ``dest + '.part.json'`` and renamed when complete, so a later call with
+    ``resume`` continues an interrupted download. ``stop_after`` aborts after
+    that many bytes (used to exercise resuming).
+    """
+    server, media_id = parse_mxc(content_uri)
+    url = f"{API_BASE}/media/download/{quote(server, safe='')}/{quote(media_id, safe='')}"
+    part, state_path = dest + '.part', dest + '.part.json'
+    size, ranges_ok = await _probe(session, url)
+
+    state = None
+    if resume and ranges_ok and os.path.exists(part) and os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get('content_uri') != content_uri or state.get('size') != size:
+            state = None
+    if state is None:
+        if size is None:
+            # Unknown length: one open-ended range streamed to EOF
+            ranges = [{'start': 0, 'end': None, 'done': 0}]
+        else:
+            ranges = _split_ranges(size, max(1, parallel) if ranges_ok else 1) if size else []
+        state = {'content_uri': content_uri, 'size': size, 'ranges': ranges}
+
+    def save_state():
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(state_path + '.tmp', state_path)
+
+    fetched = 0
+    fd = os.open(part, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, size or 0)
+
+        async def fetch_range(byte_range):
+            nonlocal fetched
+            position = byte_range['start'] + byte_range['done']
+            end = byte_range['end']
+            if end is not None and position > end:
+                return
+            headers = {'Range': f"bytes={position}-{'' if end is None else end}"} if ranges_ok else {}
+            unsaved = 0
+            async with session.get(url, headers=headers) as response:
+                if response.status not in (200, 206):
+                    raise RuntimeError(f"HTTP {response.status} downloading {content_uri}")
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    os.pwrite(fd, chunk, position)
+                    position += len(chunk)
+                    byte_range['done'] += len(chunk)
+                    fetched += len(chunk)
+                    unsaved += len(chunk)
+                    if unsaved >= SAVE_EVERY:
+                        save_state()
+                        unsaved = 0
+                    if stop_after is not None and fetched >= stop_after:
+                        raise TransferInterrupted(f"stopped after {fetched} bytes")
+
+        tasks = [asyncio.ensure_future(fetch_range(byte_range)) for byte_range in state['ranges']]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Stop the other ranges before the file is closed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    except BaseException:
+        if ranges_ok:
+            save_state()
+        raise
+    finally:
+        os.close(fd)
+
+    os.replace(part, dest)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return fetched
+
+
+# === Benchmark ===
+
+def parse_size(text):
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    text = text.strip().upper().rstrip('B')
+    return int(float(text[:-1]) * units[text[-1]]) if text and text[-1] in units else int(text)
+
+
+def make_source_file(path, size):
+    """Write ``size`` bytes of incompressible data without holding them in memory"""
+    block = os.urandom(CHUNK_SIZE)
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:min(remaining, CHUNK_SIZE)])
+            remaining -= CHUNK_SIZE
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    for chunk in iter_file_chunks(path):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+async def transfer(source, workdir, parallel, verify, creds):
+    """Upload then download ``source``; runs in a child process so peak RSS is per transfer"""
+    size = os.path.getsize(source)
+    dest = os.path.join(workdir, f"download-{parallel}")
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+        if not await authenticate(session, creds):
+            raise RuntimeError("authentication failed")
+        started = time.perf_counter()
+        content_uri = await upload_file(session, source)
+        upload_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await download_file(session, content_uri, dest, parallel)
+        download_seconds = time.perf_counter() - started
+
+        resumed = None
+        if verify:
+            os.remove(dest)
+            try:
+                await download_file(session, content_uri, dest, parallel, stop_after=size // 2)
+            except TransferInterrupted:
+                pass
+            fetched = await download_file(session, content_uri, dest, parallel)
+            resumed = fetched < size and file_digest(dest) == file_digest(source)
+    os.remove(dest)
+    return {
+        'upload_mb_s': size / upload_seconds / 1e6,
+        'download_mb_s': size / download_seconds / 1e6,
+        'resumed_ok': resumed,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def _transfer_in_child(source, workdir, parallel, verify, creds):
+    return asyncio.run(transfer(source, workdir, parallel, verify, creds))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Streaming media upload/download benchmark (stand-in only)")
+    parser.add_argument('--sizes', default='1M,64M,512M,2G', help="comma-separated file sizes (K/M/G)")
+    parser.add_argument('--parallel', default='1,4', help="comma-separated parallel range counts")
+    parser.add_argument('--verify', action='store_true',
+                        help="also interrupt a download halfway, resume it and compare checksums")
+    parser.add_argument('--workdir', help="directory for test files (default: a temporary directory)")
+    args = parser.parse_args()
+
+    creds = await load_test_credentials()
+    print("🧪 Streaming Media Transfer Benchmark")
+    print("=" * 60)
+    # Once up front, so bad credentials stop the run (and the children restore the cached session)
+    async with aiohttp.ClientSession() as session:
+        if not await is_standin(session):
+            print(f"❌ {API_BASE} is not proxy_standin.py: streamed uploads need the stand-in's /media/upload "
+                  f"(the real proxy's /upload takes a file_path instead)")
+            return
+        if not await authenticate(session, creds):
+            print("❌ Authentication failed")
+            return
+    print(f"   {'size':>8} {'parallel':>8} {'upload':>12} {'download':>12} {'peak RSS':>10}"
+          + (f" {'resume':>8}" if args.verify else ''))
+
+    loop = asyncio.get_running_loop()
+    with tempfile.TemporaryDirectory(prefix='media_bench_', dir=args.workdir) as workdir:
+        for size_text in args.sizes.split(','):
+            size = parse_size(size_text)
+            source = os.path.join(workdir, 'source.bin')
+            make_source_file(source, size)
+            for parallel in (int(value) for value in args.parallel.split(',')):
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    try:
+                        result = await loop.run_in_executor(pool, _transfer_in_child, source, workdir,
+                                                            parallel, args.verify, creds)
+                    except Exception as e:
+                        print(f"   ❌ {size_text} x{parallel}: {e}")
+                        continue
+                resume = ''
+                if args.verify:
+                    resume = f" {'✅' if result['resumed_ok'] else '❌':>7}"
+                print(f"   {size_text:>8} {parallel:>8} {result['upload_mb_s']:>8.0f} MB/s "
+                      f"{result['download_mb_s']:>8.0f} MB/s {result['peak_rss_mb']:>7.0f} MB{resume}")
+            os.remove(source)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Room Member Index
+Columnar, array-backed index of a room's members keyed by power level and
+membership. Answers "count/list admins", "moderators", "page N of members"
+and name/user ID prefix search without scanning the member list, and is kept
+current from member and power-level events instead of refetching.
+
+Usage (benchmark at 200k synthetic members, no proxy needed):
+    python member_index.py --members 200000
+"""
+
+import argparse
+import bisect
+import gc
+import time
+import tracemalloc
+from array import array
+from urllib.parse import quote
+
+from matrix_client import API_BASE, iter_json_array
+
+ADMIN, MODERATOR, MEMBER = 0, 1, 2
+ROLE_NAMES = ('admin', 'moderator', 'member')
+MEMBERSHIPS = ('join', 'invite', 'leave', 'ban', 'knock')
+_MEMBERSHIP_CODES = {name: code for code, name in enumerate(MEMBERSHIPS)}
+
+
+def role_for(power_level):
+    """Same thresholds as test 5 and MemberList.js"""
+    if power_level >= 100:
+        return ADMIN
+    if power_level >= 50:
+        return MODERATOR
+    return MEMBER
+
+
+class MemberIndex:
+    """Columnar member store with role buckets and sorted row orderings.
+
+    Rows are never moved: a member keeps its row for the life of the index
+    and departures only change the membership column, so row numbers held
+    in the role buckets and orderings stay valid. Each ordering is a compact
+    array of row numbers searched with keys computed from the columns, so
+    no sort key is stored per member.
+    """
+
+    def __init__(self):
+        self.user_ids = []
+        self.display_names = []
+        # Power levels are canonical JSON integers (|level| < 2**53), so they need 64 bits
+        self.power_levels = array('q')
+        self.memberships = array('b')
+        self.rows = {}  # user_id -> row
+        # (role, membership code) -> set of rows
+        self.buckets = {}
+        # Rows in roster order (membership, role, name) and by lowercased display name and user ID
+        self.roster = array('i')
+        self.name_order = array('i')
+        self.user_order = array('i')
+        self._sorted = True
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    # === Building ===
+
+    def _roster_key(self, row):
+        return (self.memberships[row], role_for(self.power_levels[row]),
+                self.display_names[row].lower(), row)
+
+    def _name_key(self, row):
+        return (self.display_names[row].lower(), row)
+
+    def _user_key(self, row):
+        return (self.user_ids[row].lower(), row)
+
+    def _orderings(self):
+        return ((self.roster, self._roster_key), (self.name_order, self._name_key),
+                (self.user_order, self._user_key))
+
+    def _add_keys(self, row):
+        for order, key in self._orderings():
+            order.insert(bisect.bisect_left(order, key(row), key=key), row)
+
+    def _remove_keys(self, row):
+        for order, key in self._orderings():
+            position = bisect.bisect_left(order, key(row), key=key)
+            if position < len(order) and order[position] == row:
+                del order[position]
+
+    def _bucket(self, row):
+        return self.buckets.setdefault((role_for(self.power_levels[row]), self.memberships[row]), set())
+
+    @staticmethod
+    def _membership_code(membership):
+        try:
+            return _MEMBERSHIP_CODES[membership]
+        except KeyError:
+            raise ValueError(f"unknown membership {membership!r} (expected one of {', '.join(MEMBERSHIPS)})")
+
+    def add(self, user_id, display_name=None, power_level=0, membership='join', bulk=False):
+        """Add or update one member; ``bulk`` defers ordering to ``finish``"""
+        row = self.rows.get(user_id)
+        if row is not None:
+            return self.update(user_id, display_name, power_level, membership)
+        code = self._membership_code(membership)
+        row = len(self.user_ids)
+        self.rows[user_id] = row
+        self.user_ids.append(user_id)
+        self.display_names.append(display_name or user_id)
+        self.power_levels.append(power_level)
+        self.memberships.append(code)
+        self._bucket(row).add(row)
+        if bulk or not self._sorted:
+            self._sorted = False
+        else:
+            self._add_keys(row)
+        return row
+
+    def add_member(self, member, bulk=False):
+        """Add a member dict as returned by /rooms/{room_id}/members"""
+        if isinstance(member, str):
+            # A bare list of user IDs is the joined members
+            return self.add(member, bulk=bulk)
+        return self.add(member['user_id'], member.get('display_name'), member.get('power_level') or 0,
+                        member.get('membership'), bulk=bulk)
+
+    def finish(self):
+        """Order the rows after bulk loading, one sort per ordering"""
+        if not self._sorted:
+            rows = range(len(self.user_ids))
+            for order, key in self._orderings():
+                order[:] = array('i', sorted(rows, key=key))
+            self._sorted = True
+        return self
+
+    @classmethod
+    def from_members(cls, members):
+        index = cls()
+        for member in members:
+            index.add_member(member, bulk=True)
+        return index.finish()
+
+    # === Incremental updates ===
+
+    def update(self, user_id, display_name=None, power_level=None, membership=None):
+        row = self.rows.get(user_id)
+        if row is None:
+            return self.add(user_id, display_name, power_level or 0, membership)
+        code = self._membership_code(membership) if membership is not None else None
+        self.finish()
+        self._bucket(row).discard(row)
+        self._remove_keys(row)
+        if display_name is not None:
+            self.display_names[row] = display_name or user_id
+        if power_level is not None:
+            self.power_levels[row] = power_level
+        if code is not None:
+            self.memberships[row] = code
+        self._bucket(row).add(row)
+        self._add_keys(row)
+        return row
+
+    def apply_member_event(self, event):
+        """Apply an m.room.member state event or a ROOM_MEMBER_UPDATED payload"""
+        if 'state_key' in event:
+            content = event.get('content') or {}
+            return self.update(event['state_key'], content.get('displayname'),
+                               None, content.get('membership'))
+        return self.update(event['user_id'], event.get('display_name'),
+                           event.get('power_level'), event.get('membership'))
+
+    def apply_power_levels(self, content):
+        """Apply m.room.power_levels content; users not listed fall back to users_default"""
+        users = content.get('users') or {}
+        default = content.get('users_default', 0)
+        for user_id, row in self.rows.items():
+            level = users.get(user_id, default)
+            if self.power_levels[row] != level:
+                self.update(user_id, power_level=level)
+
+    # === Queries ===
+
+    def count(self, role, membership='join'):
+        return len(self.buckets.get((role, self._membership_code(membership)), ()))
+
+    def list_role(self, role, membership='join'):
+        rows = self.buckets.get((role, self._membership_code(membership)), ())
+        return [self.member(row) for row in sorted(rows, key=lambda row: self.display_names[row].lower())]
+
+    def admins(self):
+        return self.list_role(ADMIN)
+
+    def moderators(self):
+        return self.list_role(MODERATOR)
+
+    def page(self, number, size=50, membership='join'):
+        """Page ``number`` (0-based) of members in roster order: role, then name"""
+        self.finish()
+        code = self._membership_code(membership)
+        start = bisect.bisect_left(self.roster, (code,), key=self._roster_key) + number * size
+        end = min(start + size, bisect.bisect_left(self.roster, (code + 1,), key=self._roster_key))
+        return [self.member(row) for row in self.roster[start:end]]
+
+    def search(self, prefix, limit=20):
+        """Members whose display name or user ID starts with ``prefix``"""
+        self.finish()
+        prefix = prefix.lower()
+        found = []
+        for order, key in ((self.name_order, self._name_key), (self.user_order, self._user_key)):
+            position = bisect.bisect_left(order, (prefix,), key=key)
+            while position < len(order) and len(found) < limit:
+                row = order[position]
+                if not key(row)[0].startswith(prefix):
+                    break
+                if row not in found:
+                    found.append(row)
+                position += 1
+        return [self.member(row) for row in found[:limit]]
+
+    def member(self, row):
+        return {
+            'user_id': self.user_ids[row],
+            'display_name': self.display_names[row],
+            'power_level': self.power_levels[row],
+            'membership': MEMBERSHIPS[self.memberships[row]],
+        }
+
+
+async def fetch_member_index(session, room_id, index=None):
+    """Stream /rooms/{room_id}/members straight into a MemberIndex"""
+    index = index or MemberIndex()
+    url = f"{API_BASE}/rooms/{quote(room_id, safe='')}/members"
+    async with session.get(url) as response:
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status} fetching members for {room_id}")
+        async for member in iter_json_array(response.content):
+            index.add_member(member, bulk=True)
+    return index.finish()
+
+
+def _timed(fn, repeats=5):
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run_benchmark(member_count, updates):
+    from proxy_standin import SyntheticAccount
+
+    account = SyntheticAccount(rooms=1, members=member_count)
+    members = account.members(0)
+    print(f"   {len(members)} synthetic members\n")
+
+    # Memory from a traced build; time from an untraced one, since tracing slows allocation down
+    gc.collect()
+    tracemalloc.start()
+    index = MemberIndex.from_members(members)
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del index
+    gc.collect()
+    build_time, index = _timed(lambda: MemberIndex.from_members(members), repeats=1)
+
+    def scan_roles():
+        admins = [m for m in members if m.get('power_level', 0) >= 100]
+        moderators = [m for m in members if 50 <= m.get('power_level', 0) < 100]
+        regular = [m for m in members if m.get('power_level', 0) < 50]
+        return len(admins), len(moderators), len(regular)
+
+    def scan_page():
+        joined = [m for m in members if m.get('membership', 'join') == 'join']
+        ordered = sorted(joined, key=lambda m: (role_for(m.get('power_level', 0)),
+                                                (m.get('display_name') or m['user_id']).lower()))
+        return ordered[50 * 100:50 * 101]
+
+    def scan_search():
+        return [m for m in members if (m.get('display_name') or '').lower().startswith('user 1999')
+                or m['user_id'].lower().startswith('user 1999')][:20]
+
+    rows = (
+        ('count admins/mods/members', scan_roles,
+         lambda: (index.count(ADMIN), index.count(MODERATOR), index.count(MEMBER))),
+        ('list admins', lambda: [m for m in members if m.get('power_level', 0) >= 100], index.admins),
+        ('page 100 of members', scan_page, lambda: index.page(100)),
+        ("prefix search 'user 1999'", scan_search, lambda: index.search('user 1999')),
+    )
+    print(f"   {'query':<28} {'scan':>10} {'index':>10} {'speed-up':>9}")
+    for name, scan, indexed in rows:
+        scan_time, _ = _timed(scan, repeats=3)
+        index_time, _ = _timed(indexed)
+        print(f"   {name:<28} {scan_time * 1000:>8.2f}ms {index_time * 1000:>8.3f}ms "
+              f"{scan_time / max(index_time, 1e-9):>8.0f}x")
+
+    started = time.perf_counter()
+    for i in range(updates):
+        index.apply_member_event({'user_id': f"@user{i * 7 + 3}:standin.local",
+                                  'power_level': 50 if i % 2 else 0})
+    update_time = time.perf_counter() - started
+    refetch_time, _ = _timed(lambda: MemberIndex.from_members(members), repeats=1)
+
+    print(f"\n   🏗️  Index build: {build_time * 1000:.0f}ms, {index_bytes / 1e6:.1f} MB")
+    print(f"   🔁 {updates} incremental updates: {update_time * 1000:.1f}ms "
+          f"({update_time / updates * 1e6:.0f}µs each) vs rebuild {refetch_time * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Member index benchmark")
+    parser.add_argument('--members', type=int, default=200000)
+    parser.add_argument('--updates', type=int, default=1000)
+    args = parser.parse_args()
+
+    print("🧪 Room Member Index Benchmark")
+    print("=" * 60)
+    run_benchmark(args.members, args.updates)
+
+
+if __name__ == "__main__":
+    main()
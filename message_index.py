@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Local Message Search Index
+On-disk SQLite FTS5 index of message history, filled incrementally from
+/rooms/{room_id}/messages pages and live messageEvent frames, and queried
+offline by keyword, room, sender and date range. Disk use is bounded by a
+per-room event cap and an overall size budget; both evict the oldest events
+of a room first.
+
+Usage (benchmark on a synthetic corpus, no proxy needed):
+    python message_index.py --events 1000000 --rooms 200
+    python message_index.py --events 200000 --db /tmp/messages.db --keep
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import zlib
+from itertools import accumulate
+
+import aiohttp
+
+# rowid = ts * ROWID_SCALE + slot, so rowid order is time order and FTS5 can
+# return the newest matches first, and bound date ranges, without sorting
+ROWID_SCALE = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    rowid INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    room_id TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_room_ts ON events (room_id, ts);
+CREATE INDEX IF NOT EXISTS events_sender_ts ON events (sender, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5 (
+    body, content='events', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS events_ai AFTER INSERT ON events BEGIN
+    INSERT INTO events_fts (rowid, body) VALUES (new.rowid, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS events_ad AFTER DELETE ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, body) VALUES ('delete', old.rowid, old.body);
+END;
+CREATE TABLE IF NOT EXISTS rooms (
+    room_id TEXT PRIMARY KEY,
+    events INTEGER NOT NULL DEFAULT 0,
+    backfill_token TEXT,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def fts_query(text, prefix=False):
+    """Quote user words as FTS5 strings; with ``prefix`` the last word also matches as a prefix"""
+    words = [word.replace('"', '""') for word in text.split()]
+    terms = [f'"{word}"' for word in words]
+    if prefix and terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _event_row(event):
+    """(event_id, room_id, sender, ts, body) from a /messages event, or None"""
+    content = event.get('content') or {}
+    body = event.get('body', content.get('body'))
+    if not body or not event.get('event_id'):
+        return None
+    return (event['event_id'], event.get('room_id') or '', event.get('sender') or '',
+            event.get('origin_server_ts') or event.get('timestamp') or 0, body)
+
+
+def _frame_row(frame):
+    """Row from a /ws/extensions messageEvent frame (or its 'data' payload)"""
+    data = frame.get('data', frame)
+    sender = data.get('sender') or {}
+    text = (data.get('content') or {}).get('text')
+    if not text or not data.get('event_id'):
+        return None
+    return (data['event_id'], data.get('room_id') or '',
+            sender.get('id', '') if isinstance(sender, dict) else sender,
+            data.get('timestamp') or 0, text)
+
+
+class MessageIndex:
+    """SQLite FTS5 message index with per-room and total-size eviction"""
+
+    def __init__(self, path, max_events_per_room=None, max_bytes=None):
+        self.path = path
+        self.max_events_per_room = max_events_per_room
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        # auto_vacuum only takes effect on a new database
+        self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.execute("PRAGMA cache_size = -65536")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # === Indexing ===
+
+    def _insert(self, rows):
+        """Insert rows under time-ordered rowids; returns how many were new"""
+        pending = [(row[3] * ROWID_SCALE + zlib.crc32(row[0].encode()) % ROWID_SCALE, *row) for row in rows]
+        inserted = 0
+        while pending:
+            count = self.db.executemany("INSERT OR IGNORE INTO events (rowid, event_id, room_id, sender, ts, body) "
+                                        "VALUES (?, ?, ?, ?, ?, ?)", pending).rowcount
+            inserted += count
+            if count == len(pending):
+                break
+            # Skipped rows are duplicates or rowid collisions; retry the collisions one slot up
+            present = self.known_events(row[1] for row in pending)
+            pending = [(row[0] + 1, *row[1:]) for row in pending if row[1] not in present]
+        return inserted
+
+    def add_rows(self, rows):
+        """Insert (event_id, room_id, sender, ts, body) rows; duplicates are skipped"""
+        by_room = {}
+        for row in rows:
+            if row is not None:
+                by_room.setdefault(row[1], []).append(row)
+        added = {}
+        with self.db:
+            for room_id, room_rows in by_room.items():
+                count = self._insert(room_rows)
+                if count:
+                    added[room_id] = count
+                    self.db.execute("INSERT INTO rooms (room_id, events) VALUES (?, ?) "
+                                    "ON CONFLICT (room_id) DO UPDATE SET events = events + excluded.events",
+                                    (room_id, count))
+        if added:
+            self.evict(added)
+        return sum(added.values())
+
+    def add_events(self, events, room_id=None):
+        """Index a /messages chunk; ``room_id`` fills events that lack one"""
+        rows = (_event_row(event if not room_id or event.get('room_id') else {**event, 'room_id': room_id})
+                for event in events)
+        return self.add_rows(rows)
+
+    def add_records(self, events, room_id):
+        """Index matrix_client ``Event`` records of one room"""
+        return self.add_rows((event.event_id, room_id, event.sender, event.ts, event.body)
+                             for event in events if event.event_id and event.body)
+
+    def add_frame(self, frame):
+        """Index one live messageEvent frame"""
+        return self.add_rows([_frame_row(frame)])
+
+    def known_events(self, event_ids):
+        """The subset of ``event_ids`` already in the index"""
+        event_ids = list(event_ids)
+        known = set()
+        for start in range(0, len(event_ids), 500):
+            batch = event_ids[start:start + 500]
+            known.update(row[0] for row in self.db.execute(
+                f"SELECT event_id FROM events WHERE event_id IN ({','.join('?' * len(batch))})", batch))
+        return known
+
+    def set_backfill(self, room_id, token, complete=False):
+        with self.db:
+            self.db.execute("INSERT INTO rooms (room_id, backfill_token, complete) VALUES (?, ?, ?) "
+                            "ON CONFLICT (room_id) DO UPDATE SET backfill_token = excluded.backfill_token, "
+                            "complete = excluded.complete", (room_id, token, int(complete)))
+
+    def backfill_state(self, room_id):
+        row = self.db.execute("SELECT backfill_token, complete FROM rooms WHERE room_id = ?",
+                              (room_id,)).fetchone()
+        return (row['backfill_token'], bool(row['complete'])) if row else (None, False)
+
+    # === Eviction ===
+
+    def used_bytes(self):
+        page_size = self.db.execute("PRAGMA page_size").fetchone()[0]
+        pages = self.db.execute("PRAGMA page_count").fetchone()[0]
+        free = self.db.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def _evict_oldest(self, room_id, count):
+        self.db.execute("DELETE FROM events WHERE rowid IN "
+                        "(SELECT rowid FROM events WHERE room_id = ? ORDER BY ts LIMIT ?)", (room_id, count))
+        self.db.execute("UPDATE rooms SET events = MAX(0, events - ?) WHERE room_id = ?",
+                        (count, room_id))
+
+    def evict(self, rooms=None):
+        """Apply the per-room cap (to ``rooms`` or all rooms), then the size budget.
+
+        Returns the number of events evicted.
+        """
+        evicted = 0
+        with self.db:
+            if self.max_events_per_room:
+                if rooms is None:
+                    rooms = [row['room_id'] for row in self.db.execute("SELECT room_id FROM rooms")]
+                for room_id in rooms:
+                    row = self.db.execute("SELECT events FROM rooms WHERE room_id = ?", (room_id,)).fetchone()
+                    excess = (row['events'] if row else 0) - self.max_events_per_room
+                    if excess > 0:
+                        self._evict_oldest(room_id, excess)
+                        evicted += excess
+
+            # Over budget: trim a tenth of the largest room at a time
+            while self.max_bytes and self.used_bytes() > self.max_bytes:
+                row = self.db.execute("SELECT room_id, events FROM rooms ORDER BY events DESC LIMIT 1").fetchone()
+                if not row or row['events'] == 0:
+                    break
+                count = max(1, row['events'] // 10)
+                self._evict_oldest(row['room_id'], count)
+                evicted += count
+        if evicted:
+            self.db.execute("PRAGMA incremental_vacuum")
+        return evicted
+
+    # === Queries ===
+
+    def search(self, text=None, room_id=None, sender=None, since=None, until=None, limit=50, prefix=False):
+        """Newest events matching all given filters; ``since``/``until`` are ms timestamps.
+
+        ``prefix`` lets the last word match as a prefix (search-as-you-type);
+        it is slower for short prefixes since every matching term is merged.
+        """
+        # Blank text has no terms to match (and MATCH '' is an FTS5 syntax error): no text filter
+        match = fts_query(text, prefix) if text else ''
+        if match:
+            # Walk FTS matches newest first by rowid; dates become rowid bounds
+            source = "events_fts JOIN events ON events.rowid = events_fts.rowid"
+            filters = [("events_fts MATCH ?", match),
+                       ("events_fts.rowid >= ?", since * ROWID_SCALE if since is not None else None),
+                       ("events_fts.rowid < ?", until * ROWID_SCALE if until is not None else None)]
+            order = "events_fts.rowid DESC"
+        else:
+            source = "events"
+            filters = [("events.ts >= ?", since), ("events.ts < ?", until)]
+            order = "events.ts DESC"
+        filters += [("events.room_id = ?", room_id), ("events.sender = ?", sender)]
+        clauses = [clause for clause, value in filters if value is not None]
+        params = [value for _, value in filters if value is not None]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (f"SELECT events.event_id, events.room_id, events.sender, events.ts, events.body "
+                 f"FROM {source} {where} ORDER BY {order} LIMIT ?")
+        return [dict(row) for row in self.db.execute(query, (*params, limit))]
+
+    def count(self, room_id=None):
+        if room_id:
+            row = self.db.execute("SELECT events FROM rooms WHERE room_id = ?", (room_id,)).fetchone()
+            return row['events'] if row else 0
+        return self.db.execute("SELECT COALESCE(SUM(events), 0) FROM rooms").fetchone()[0]
+
+
+async def index_room_history(client, index, room_id, limit=100, max_pages=None):
+    """Index a room's history through a ``MatrixProxyClient``; returns the number of new events.
+
+    A room seen before is first caught up from its newest event back to the
+    first page holding an event already indexed, however many pages that
+    takes, so nothing sent between runs is skipped. An unfinished backfill
+    then resumes from its stored token for up to ``max_pages`` pages.
+    """
+    token, complete = index.backfill_state(room_id)
+    added = 0
+    if token or complete:
+        async for events in client.iter_history(room_id, limit):
+            known = index.known_events(event.event_id for event in events)
+            added += index.add_records(events, room_id)
+            if known:
+                break
+    if complete:
+        return added
+
+    pages = 0
+    while True:
+        events, token = await client.messages(room_id, limit, token)
+        added += index.add_records(events, room_id)
+        pages += 1
+        if not events or not token or (max_pages and pages >= max_pages):
+            break
+    index.set_backfill(room_id, token, not events or not token)
+    return added
+
+
+async def index_live(ws, index):
+    """Index messageEvent frames from a /ws/extensions connection until it closes"""
+    async for msg in ws:
+        if msg.type != aiohttp.WSMsgType.TEXT:
+            continue
+        try:
+            frame = json.loads(msg.data)
+        except ValueError:
+            continue
+        if frame.get('type') == 'messageEvent':
+            index.add_frame(frame)
+
+
+# === Benchmark ===
+
+def _vocabulary(size, rng):
+    syllables = ['ka', 'lo', 'mi', 'tor', 'en', 'vi', 'sa', 'ru', 'pel', 'dan', 'ex', 'qua', 'zo', 'fin', 'gra']
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def synthetic_rows(total, rooms, rng, vocabulary):
+    """Events spread over ``rooms`` rooms with Zipf-like word frequencies"""
+    from proxy_standin import SyntheticAccount
+
+    account = SyntheticAccount(rooms=rooms, members=500, messages=total // rooms)
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    per_room = total // rooms
+    for event_index in range(per_room):
+        for room_index in range(rooms):
+            event = account.event(room_index, event_index)
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(4, 16))
+            yield (event['event_id'], event['room_id'], event['sender'], event['origin_server_ts'],
+                   ' '.join(words))
+
+
+def _latency(fn, repeats=20):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1], len(result)
+
+
+def run_benchmark(path, total, rooms, page_size, seed):
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(5000, rng)
+    index = MessageIndex(path)
+
+    rows = synthetic_rows(total, rooms, rng, vocabulary)
+    started = time.perf_counter()
+    indexed = 0
+    while True:
+        page = [row for _, row in zip(range(page_size), rows)]
+        if not page:
+            break
+        indexed += index.add_rows(page)
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(path) + (os.path.getsize(path + '-wal') if os.path.exists(path + '-wal') else 0)
+    print(f"   📥 Indexed {indexed} events in {elapsed:.1f}s ({indexed / elapsed:,.0f} events/s), "
+          f"{size / 1e6:.0f} MB on disk\n")
+
+    room_id = "!room7:standin.local"
+    sender = "@user42:standin.local"
+    oldest, newest = index.db.execute("SELECT MIN(ts), MAX(ts) FROM events").fetchone()
+    quarter = (newest - oldest) // 4
+    queries = (
+        ('common word', lambda: index.search(vocabulary[0])),
+        ('rare word', lambda: index.search(vocabulary[-1])),
+        ('two words', lambda: index.search(f"{vocabulary[3]} {vocabulary[40]}")),
+        ('prefix', lambda: index.search(vocabulary[1200][:4], prefix=True)),
+        ('word in room', lambda: index.search(vocabulary[10], room_id=room_id)),
+        ('sender', lambda: index.search(sender=sender)),
+        ('room, last quarter', lambda: index.search(room_id=room_id, since=newest - quarter)),
+        ('word, date range', lambda: index.search(vocabulary[25], since=oldest + quarter, until=oldest + 2 * quarter)),
+        ('rare word, range', lambda: index.search(vocabulary[-2], since=oldest + quarter, until=newest - quarter)),
+    )
+    print(f"   {'query':<20} {'p50':>9} {'p95':>9} {'hits':>6}")
+    for name, query in queries:
+        p50, p95, hits = _latency(query)
+        print(f"   {name:<20} {p50 * 1000:>7.2f}ms {p95 * 1000:>7.2f}ms {hits:>6}")
+
+    cap = max(1, total // rooms // 2)
+    index.max_events_per_room = cap
+    started = time.perf_counter()
+    evicted = index.evict()
+    print(f"\n   🧹 Per-room cap {cap}: evicted {evicted} events in {time.perf_counter() - started:.1f}s, "
+          f"{index.used_bytes() / 1e6:.0f} MB in use, {index.count()} events kept")
+    index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local message index benchmark")
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=500, help="events per insert batch")
+    parser.add_argument('--db', help="database path (default: a temporary file)")
+    parser.add_argument('--keep', action='store_true', help="keep the database afterwards")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print("🧪 Local Message Index Benchmark")
+    print("=" * 60)
+    print(f"   SQLite {sqlite3.sqlite_version}, {args.events} events in {args.rooms} rooms\n")
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix='message_index_'), 'messages.db')
+    try:
+        run_benchmark(path, args.events, args.rooms, args.page_size, args.seed)
+    finally:
+        if not args.keep:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        else:
+            print(f"\n💾 Index kept at {path}")
+
+
+if __name__ == "__main__":
+    main()
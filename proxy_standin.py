@@ -0,0 +1,1205 @@
+#!/usr/bin/env python3
+"""
+Matrix Message Proxy Stand-in
+Local aiohttp server implementing the /api/message-proxy/element routes used by
+the test scripts and ui-new/utils/ApiClient.js, plus the adapter, query and
+subscription routes extension.js connects with, backed by a synthetic account
+so tests and benchmarks can run without a homeserver.
+
+Usage:
+    python proxy_standin.py --rooms 5000 --members 20000 --messages 100000
+    python proxy_standin.py --fault error_rate=0.05 --fault error_burst=10 --fault reset_rate=0.02
+    MATRIX_USERNAME=bench MATRIX_PASSWORD=bench python test_complete_implementation.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import time
+from collections import deque
+
+from aiohttp import WSMsgType, web
+
+PROXY_PREFIX = "/api/message-proxy"
+API_PREFIX = f"{PROXY_PREFIX}/element"
+WS_PATH = "/ws/extensions"
+DEFAULT_HOST = "localhost"
+DEFAULT_PORT = 8000
+SERVER_NAME = "standin.local"
+MAX_BATCH = 500
+MEDIA_CHUNK = 1 << 20
+# Revoked tokens remembered so restoring them fails; older ones are forgotten
+REVOKED_LIMIT = 10000
+# Frames a /ws/extensions socket may fall behind by before it is dropped as too slow
+OUTBOX_LIMIT = 1000
+
+# Route names used for per-route latency (--latency NAME=SECONDS)
+ROUTE_NAMES = (
+    'health', 'login', 'restore_session', 'rooms', 'sync_status', 'info', 'messages',
+    'members', 'send', 'send_batch', 'typing', 'logout', 'proxy_send', 'subscribe',
+    'media_upload', 'media_download', 'debug_stats', 'debug_faults',
+    'adapter_configure', 'adapter_connect', 'adapter_disconnect', 'query', 'space_hierarchy',
+)
+# Routes never faulted, so health checks and fault control keep working
+FAULT_EXEMPT = ('health', 'debug_stats', 'debug_faults')
+
+
+class SyntheticAccount:
+    """Deterministic synthetic Matrix account.
+
+    Rooms, members and history are derived from their index on demand, so an
+    account with thousands of rooms and 100k-event histories costs almost no
+    memory until something is sent to it.
+    """
+
+    def __init__(self, rooms=50, members=50, messages=1000, user='bench', space_rooms=20, space_fanout=3,
+                 space_pool=None):
+        self.room_count = rooms
+        self.max_members = members
+        self.history_depth = messages
+        # Space hierarchy: every space holds ``space_rooms`` rooms and up to
+        # ``space_fanout`` subspaces drawn from the first ``space_pool`` room
+        # indexes, so rooms sit under several spaces and most are not joined
+        self.space_rooms = space_rooms
+        self.space_fanout = space_fanout
+        self.space_pool = max(space_pool or rooms, rooms)
+        self._space_children = {}
+        self.user_id = f"@{user}:{SERVER_NAME}"
+        self.base_ts = 1_700_000_000_000
+        self.sent = {}  # room_id -> list of events sent through the stand-in
+        self.next_txn = 0
+        self.sessions = {}  # access_token -> user_id
+        self.current = None  # token of the latest login or restore, ended by a bare /logout
+        self.revoked = {}  # access tokens ended by /logout, oldest first (used as an ordered set)
+        # Sync state for delta room lists: every change bumps the version
+        self.version = 0
+        self.changed = {}   # room_id -> version of its latest change
+        self.left = set()   # indexes of rooms the user has left
+
+    # === Sync ===
+
+    def sync_token(self):
+        return f"s{self.version}"
+
+    def mark_changed(self, room_id):
+        self.version += 1
+        self.changed[room_id] = self.version
+
+    def parse_sync_token(self, token):
+        """Version for a token this account issued, else None"""
+        try:
+            version = int(token[1:]) if token and token[0] == 's' else None
+        except ValueError:
+            return None
+        return version if version is not None and 0 <= version <= self.version else None
+
+    def delta(self, since):
+        """(changed rooms, left room IDs) after version ``since``"""
+        rooms, left = [], []
+        for room_id, version in self.changed.items():
+            if version <= since:
+                continue
+            index = self.room_index(room_id)
+            if index in self.left:
+                left.append(room_id)
+            else:
+                rooms.append(self.room(index))
+        return rooms, left
+
+    def leave(self, index):
+        if index not in self.left:
+            self.left.add(index)
+            self.mark_changed(self.room_id(index))
+
+    def join(self, index):
+        if index in self.left:
+            self.left.discard(index)
+            self.mark_changed(self.room_id(index))
+
+    # === Rooms ===
+
+    def room_id(self, index):
+        return f"!room{index}:{SERVER_NAME}"
+
+    def room_index(self, room_id, limit=None):
+        """Return the index for a synthetic room ID below ``limit`` (default: joined rooms), or None"""
+        if not room_id.startswith('!room') or not room_id.endswith(f":{SERVER_NAME}"):
+            return None
+        try:
+            index = int(room_id[5:-len(SERVER_NAME) - 1])
+        except ValueError:
+            return None
+        return index if 0 <= index < (self.room_count if limit is None else limit) else None
+
+    @staticmethod
+    def is_space(index):
+        return index % 50 == 49
+
+    def member_count(self, index):
+        # Every eighth room carries the full member list, the rest taper off
+        return max(2, self.max_members >> (index % 8))
+
+    def history_length(self, index):
+        return self.history_depth + len(self.sent.get(self.room_id(index), ()))
+
+    def room(self, index):
+        room_id = self.room_id(index)
+        is_space = self.is_space(index)
+        is_direct = not is_space and index % 10 == 3
+        return {
+            'room_id': room_id,
+            'name': f"Room {index}" if not is_direct else f"DM {index}",
+            'display_name': f"Room {index}" if not is_direct else f"DM {index}",
+            'canonical_alias': f"#room{index}:{SERVER_NAME}" if not is_direct else None,
+            'topic': f"Synthetic room {index}",
+            'member_count': self.member_count(index),
+            'is_direct': is_direct,
+            'is_space': is_space,
+            'room_type': 'm.space' if is_space else None,
+            'is_encrypted': index % 4 == 0,
+            'unread_count': (index * 7) % 13,
+            'highlight_count': (index * 3) % 5,
+            'last_activity': self.event_ts(index, self.history_length(index) - 1),
+        }
+
+    def rooms(self):
+        return [self.room(i) for i in range(self.room_count) if i not in self.left]
+
+    # === Members ===
+
+    def member(self, room_index, member_index):
+        if member_index == 0:
+            user_id, power_level = self.user_id, 100
+        else:
+            user_id = f"@user{member_index}:{SERVER_NAME}"
+            # A handful of admins and moderators, everyone else at 0
+            if member_index % 1000 == 1:
+                power_level = 100
+            elif member_index % 100 == 2:
+                power_level = 50
+            else:
+                power_level = 0
+        return {
+            'user_id': user_id,
+            'display_name': f"User {member_index}",
+            'avatar_url': None,
+            'membership': 'join' if member_index % 97 else 'invite',
+            'power_level': power_level,
+            'presence': ('online', 'unavailable', 'offline')[(member_index + room_index) % 3],
+        }
+
+    def members(self, room_index):
+        return [self.member(room_index, i) for i in range(self.member_count(room_index))]
+
+    # === History ===
+
+    def event_ts(self, room_index, event_index):
+        return self.base_ts + room_index * 1000 + event_index * 60_000
+
+    def event(self, room_index, event_index):
+        """Return event number ``event_index`` (0 = oldest) of a room"""
+        room_id = self.room_id(room_index)
+        if event_index >= self.history_depth:
+            return self.sent[room_id][event_index - self.history_depth]
+        sender_index = (event_index * 31 + room_index) % self.member_count(room_index)
+        body = f"Message {event_index} in room {room_index}"
+        return {
+            'event_id': f"$r{room_index}e{event_index}",
+            'room_id': room_id,
+            'sender': self.member(room_index, sender_index)['user_id'],
+            'type': 'm.room.message',
+            'origin_server_ts': self.event_ts(room_index, event_index),
+            'body': body,
+            'content': {'msgtype': 'm.text', 'body': body},
+        }
+
+    def messages(self, room_index, limit=50, from_token=None):
+        """Return one page of history walking backwards from ``from_token``.
+
+        Tokens are the index one past the newest event of the page, so pages
+        stay stable while new messages are appended to the room.
+        """
+        total = self.history_length(room_index)
+        end = total
+        if from_token:
+            try:
+                end = max(0, min(total, int(from_token.lstrip('t'))))
+            except ValueError:
+                end = total
+        start = max(0, end - limit)
+        chunk = [self.event(room_index, i) for i in range(start, end)]
+        return {
+            'chunk': chunk,
+            'start': f"t{end}",
+            'end': f"t{start}" if start > 0 else None,
+        }
+
+    def send(self, room_index, body, msg_type='m.text'):
+        room_id = self.room_id(room_index)
+        events = self.sent.setdefault(room_id, [])
+        self.next_txn += 1
+        event = {
+            'event_id': f"$sent{self.next_txn}",
+            'room_id': room_id,
+            'sender': self.user_id,
+            'type': 'm.room.message',
+            'origin_server_ts': int(time.time() * 1000),
+            'body': body,
+            'content': {'msgtype': msg_type, 'body': body},
+        }
+        events.append(event)
+        self.mark_changed(room_id)
+        return event
+
+    # === Spaces ===
+
+    def space_index(self, room_id):
+        """Index of a space anywhere in the hierarchy (joined or not), or None"""
+        index = self.room_index(room_id, self.space_pool)
+        return index if index is not None and self.is_space(index) else None
+
+    def space_children(self, index):
+        """Child indexes of space ``index``: subspaces (only later ones, so no cycles), then rooms"""
+        children = self._space_children.get(index)
+        if children is None:
+            rng = random.Random(index)
+            later = range(index + 50, self.space_pool, 50)
+            subspaces = rng.sample(later, min(self.space_fanout, len(later)))
+            # Ordinary rooms only: no spaces and no DMs
+            wanted = min(self.space_rooms, self.space_pool * 4 // 5 - 1)
+            rooms = set()
+            while len(rooms) < wanted:
+                candidate = rng.randrange(self.space_pool)
+                if not self.is_space(candidate) and candidate % 10 != 3:
+                    rooms.add(candidate)
+            children = self._space_children[index] = subspaces + sorted(rooms)
+        return children
+
+    def space_summary(self, index):
+        """Hierarchy entry for a room or space, shaped like the Matrix /hierarchy response"""
+        summary = {
+            'room_id': self.room_id(index),
+            'name': f"Room {index}",
+            'topic': f"Synthetic room {index}",
+            'canonical_alias': f"#room{index}:{SERVER_NAME}",
+            'num_joined_members': self.member_count(index),
+            'room_type': 'm.space' if self.is_space(index) else None,
+            'join_rule': 'public',
+            'world_readable': False,
+            'guest_can_join': False,
+        }
+        if self.is_space(index):
+            summary['children_state'] = [
+                {'type': 'm.space.child', 'state_key': self.room_id(child), 'content': {'via': [SERVER_NAME]}}
+                for child in self.space_children(index)
+            ]
+        return summary
+
+    def hierarchy(self, index, max_depth):
+        """Indexes under space ``index`` down to ``max_depth`` levels, breadth-first, each once"""
+        order, seen, level = [index], {index}, [index]
+        for _ in range(max_depth):
+            level = [child for space in level if self.is_space(space) for child in self.space_children(space)
+                     if not (child in seen or seen.add(child))]
+            order.extend(level)
+        return order
+
+    # === Sessions ===
+
+    def login(self, username):
+        token = f"syt_{username}_{random.getrandbits(64):016x}"
+        user_id = username if username.startswith('@') else f"@{username}:{SERVER_NAME}"
+        self.sessions[token] = user_id
+        self.current = token
+        return token, user_id
+
+    def logout(self, token):
+        """End one session"""
+        self.sessions.pop(token, None)
+        if self.current == token:
+            self.current = None
+        self.revoked[token] = None
+        if len(self.revoked) > REVOKED_LIMIT:
+            del self.revoked[next(iter(self.revoked))]
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton: every keyword occurring in a text, in one pass over the text"""
+
+    def __init__(self, keywords):
+        goto, output = [{}], [()]
+        for keyword in keywords:
+            node = 0
+            for char in keyword:
+                child = goto[node].get(char)
+                if child is None:
+                    child = goto[node][char] = len(goto)
+                    goto.append({})
+                    output.append(())
+                node = child
+            output[node] += (keyword,)
+        # Failure links, breadth-first so shallower nodes are done first
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                output[child] += output[fail[child]]
+        self.goto, self.fail, self.output = goto, fail, output
+
+    def find(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        node, found = 0, set()
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
+class MessageHub:
+    """Plugin subscriptions and /ws/extensions sockets.
+
+    Published events are queued and handed out by a single dispatcher task
+    to a bounded outbox per socket, each drained by its own writer task, so
+    frames reach each socket in the order the messages were accepted and a
+    slow or failing socket never holds up the others. A socket that falls
+    ``outbox_limit`` frames behind, or whose send fails, is dropped and closed.
+
+    Recipients are found through an index by default: subscriptions without
+    filters, by room, and by keyword (one Aho-Corasick pass over the message
+    finds every subscribed keyword in it), so the cost of a message grows with
+    its recipients rather than with the number of subscriptions.
+    ``matching='linear'`` checks every subscription with ``matches()``
+    instead, the reference the index must agree with.
+    """
+
+    def __init__(self, matching='indexed', outbox_limit=OUTBOX_LIMIT):
+        self.subscriptions = {}  # plugin_id -> {'sources', 'keywords', 'room_ids'}
+        self.sockets = {}        # plugin_id -> set of WebSocketResponse
+        self.outboxes = {}       # WebSocketResponse -> (frame queue, writer task)
+        self.queue = asyncio.Queue()
+        self.dispatcher = None
+        self.matching = matching
+        self.outbox_limit = outbox_limit
+        # Index: filter-free subscriptions, room-only ones by room, keyword ones by keyword
+        self.unfiltered = set()
+        self.by_room = {}     # room_id -> plugin_ids
+        self.by_keyword = {}  # keyword -> plugin_ids (room filter checked on a hit)
+        self.keyword_matcher = None  # rebuilt when the keyword set changes
+        self.stats = {'dispatched': 0, 'deliveries': 0, 'dropped_sockets': 0, 'match_seconds': 0.0,
+                      'dispatch_seconds': 0.0}
+
+    def subscribe(self, plugin_id, sources=None, keywords=None, room_ids=None):
+        self.unsubscribe(plugin_id)
+        subscription = self.subscriptions[plugin_id] = {
+            'sources': set(sources or []),
+            'keywords': [keyword.lower() for keyword in keywords or []],
+            'room_ids': set(room_ids or []),
+        }
+        self._index(plugin_id, subscription, add=True)
+
+    def unsubscribe(self, plugin_id):
+        subscription = self.subscriptions.pop(plugin_id, None)
+        if subscription is None:
+            return False
+        self._index(plugin_id, subscription, add=False)
+        return True
+
+    def _index(self, plugin_id, subscription, add):
+        if subscription['sources'] and 'element' not in subscription['sources']:
+            return  # never matches
+        # An empty keyword is in every text, so it is the same as no keyword filter
+        keywords = subscription['keywords'] if '' not in subscription['keywords'] else []
+        if keywords:
+            for keyword in keywords:
+                self._update(self.by_keyword, keyword, plugin_id, add)
+            self.keyword_matcher = None
+        elif subscription['room_ids']:
+            for room_id in subscription['room_ids']:
+                self._update(self.by_room, room_id, plugin_id, add)
+        elif add:
+            self.unfiltered.add(plugin_id)
+        else:
+            self.unfiltered.discard(plugin_id)
+
+    @staticmethod
+    def _update(index, key, plugin_id, add):
+        if add:
+            index.setdefault(key, set()).add(plugin_id)
+            return
+        plugin_ids = index.get(key)
+        if plugin_ids is not None:
+            plugin_ids.discard(plugin_id)
+            if not plugin_ids:
+                del index[key]
+
+    @staticmethod
+    def matches(subscription, event):
+        """Empty filter lists mean "everything", as in connectToMatrix()"""
+        if subscription['sources'] and 'element' not in subscription['sources']:
+            return False
+        if subscription['room_ids'] and event['room_id'] not in subscription['room_ids']:
+            return False
+        if subscription['keywords']:
+            text = event['body'].lower()
+            return any(keyword in text for keyword in subscription['keywords'])
+        return True
+
+    def recipients_linear(self, event):
+        return [plugin_id for plugin_id, subscription in self.subscriptions.items()
+                if self.matches(subscription, event)]
+
+    def recipients(self, event):
+        if self.matching == 'linear':
+            return self.recipients_linear(event)
+        room_id = event['room_id']
+        found = set(self.unfiltered)
+        found.update(self.by_room.get(room_id, ()))
+        if self.by_keyword:
+            if self.keyword_matcher is None:
+                self.keyword_matcher = KeywordMatcher(self.by_keyword)
+            for keyword in self.keyword_matcher.find(event['body'].lower()):
+                for plugin_id in self.by_keyword[keyword]:
+                    room_ids = self.subscriptions[plugin_id]['room_ids']
+                    if not room_ids or room_id in room_ids:
+                        found.add(plugin_id)
+        return list(found)
+
+    def publish(self, event):
+        self.queue.put_nowait(event)
+
+    def attach(self, plugin_id, ws):
+        """Deliver ``plugin_id``'s frames to ``ws``"""
+        self.sockets.setdefault(plugin_id, set()).add(ws)
+        if ws not in self.outboxes:
+            outbox = asyncio.Queue(self.outbox_limit)
+            self.outboxes[ws] = (outbox, asyncio.ensure_future(self._write(ws, outbox)))
+
+    def detach(self, plugin_id, ws, closed=False):
+        """Stop delivering ``plugin_id``'s frames to ``ws``; ``closed`` also stops its writer"""
+        if plugin_id:
+            self.sockets.get(plugin_id, set()).discard(ws)
+        if closed and ws in self.outboxes:
+            self.outboxes.pop(ws)[1].cancel()
+
+    def _drop(self, ws):
+        """Detach a socket that failed or fell behind and close it"""
+        for sockets in self.sockets.values():
+            sockets.discard(ws)
+        entry = self.outboxes.pop(ws, None)
+        if entry is None:
+            return  # already dropped
+        entry[1].cancel()
+        self.stats['dropped_sockets'] += 1
+        asyncio.ensure_future(ws.close())
+
+    async def _write(self, ws, outbox):
+        while True:
+            frame = await outbox.get()
+            try:
+                await ws.send_str(frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._drop(ws)
+                return
+
+    @staticmethod
+    def frame(event):
+        return json.dumps({
+            'type': 'messageEvent',
+            'data': {
+                'event_id': event['event_id'],
+                'room_id': event['room_id'],
+                'source': 'element',
+                'sender': {'id': event['sender'], 'name': event['sender']},
+                'content': {'text': event['body']},
+                'timestamp': event['origin_server_ts'],
+            },
+        })
+
+    async def dispatch(self):
+        stats = self.stats
+        while True:
+            event = await self.queue.get()
+            started = time.perf_counter()
+            recipients = self.recipients(event)
+            stats['match_seconds'] += time.perf_counter() - started
+            frame = None
+            for plugin_id in recipients:
+                for ws in list(self.sockets.get(plugin_id, ())):
+                    frame = frame or self.frame(event)
+                    try:
+                        self.outboxes[ws][0].put_nowait(frame)
+                    except (KeyError, asyncio.QueueFull):
+                        self._drop(ws)
+            stats['dispatched'] += 1
+            stats['deliveries'] += len(recipients)
+            stats['dispatch_seconds'] += time.perf_counter() - started
+
+    async def start(self, app):
+        self.dispatcher = asyncio.create_task(self.dispatch())
+
+    async def stop(self, app):
+        if self.dispatcher:
+            self.dispatcher.cancel()
+        for _, writer in self.outboxes.values():
+            writer.cancel()
+        for sockets in self.sockets.values():
+            for ws in list(sockets):
+                await ws.close()
+
+
+class MediaStore:
+    """Uploaded media kept in a temporary directory for the life of the app"""
+
+    def __init__(self, root=None):
+        self.root = root or tempfile.mkdtemp(prefix='standin_media_')
+        self.files = {}  # media_id -> (path, filename, content_type)
+        self.next_id = 0
+
+    def new_media_id(self):
+        self.next_id += 1
+        return f"media{self.next_id}"
+
+    def path(self, media_id):
+        return os.path.join(self.root, media_id)
+
+    async def cleanup(self, app):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class LatencyProfile:
+    """Per-route artificial latency in seconds, with optional relative jitter"""
+
+    def __init__(self, default=0.0, per_route=None, jitter=0.0, seed=0):
+        self.default = default
+        self.per_route = dict(per_route or {})
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+
+    def delay_for(self, route_name):
+        delay = self.per_route.get(route_name, self.default)
+        if delay and self.jitter:
+            delay *= 1 + self.rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay)
+
+
+class FaultProfile:
+    """Injected faults: latency spikes, 5xx bursts, connection resets and slow bodies.
+
+    Rates are per-request probabilities. An injected error starts a burst:
+    the next ``error_burst - 1`` requests fail too. Settings can be changed
+    while the stand-in runs through POST /debug/faults.
+    """
+
+    SETTINGS = {
+        'spike_rate': 0.0, 'spike_seconds': 1.0,
+        'error_rate': 0.0, 'error_burst': 1, 'error_status': 503,
+        'reset_rate': 0.0,
+        'slow_body_rate': 0.0, 'slow_body_seconds': 2.0,
+    }
+
+    def __init__(self, seed=0, **settings):
+        self.rng = random.Random(seed)
+        for name, value in self.SETTINGS.items():
+            setattr(self, name, value)
+        self.burst_left = 0
+        self.counts = dict.fromkeys(('requests', 'spikes', 'errors', 'resets', 'slow_bodies'), 0)
+        self.update(**settings)
+
+    def update(self, **settings):
+        unknown = [name for name in settings if name not in self.SETTINGS]
+        if unknown:
+            raise ValueError(f"unknown fault setting '{unknown[0]}' (choose from {', '.join(self.SETTINGS)})")
+        values = {name: type(self.SETTINGS[name])(value) for name, value in settings.items()}
+        for name, value in values.items():
+            setattr(self, name, value)
+        if not self.error_rate:
+            self.burst_left = 0
+
+    def settings(self):
+        return {name: getattr(self, name) for name in self.SETTINGS}
+
+    def draw(self):
+        """Faults for the next request: (spike seconds, error status, reset, slow body seconds)"""
+        self.counts['requests'] += 1
+        spike = self.spike_seconds if self.rng.random() < self.spike_rate else 0.0
+        status = None
+        if self.burst_left:
+            self.burst_left -= 1
+            status = self.error_status
+        elif self.rng.random() < self.error_rate:
+            self.burst_left = self.error_burst - 1
+            status = self.error_status
+        reset = status is None and self.rng.random() < self.reset_rate
+        slow = self.slow_body_seconds if self.rng.random() < self.slow_body_rate else 0.0
+        for name, hit in (('spikes', spike), ('errors', status), ('resets', reset), ('slow_bodies', slow)):
+            if hit:
+                self.counts[name] += 1
+        return spike, status, reset, slow
+
+
+async def _drip_body(request, response, seconds, pieces=10):
+    """Send an already built response body in pieces spread over ``seconds``"""
+    body = response.body
+    stream = web.StreamResponse(status=response.status)
+    stream.content_type = response.content_type
+    stream.content_length = len(body)
+    await stream.prepare(request)
+    step = max(1, -(-len(body) // pieces))
+    try:
+        for offset in range(0, len(body), step):
+            await stream.write(body[offset:offset + step])
+            await asyncio.sleep(seconds / pieces)
+        await stream.write_eof()
+    except ConnectionResetError:
+        pass  # the client gave up (e.g. a hedged request that lost)
+    return stream
+
+
+@web.middleware
+async def fault_middleware(request, handler):
+    """Apply the configured FaultProfile to every named, non-exempt route"""
+    route = request.match_info.route
+    if route is None or route.name is None or route.name in FAULT_EXEMPT:
+        return await handler(request)
+    spike, status, reset, slow = request.app['faults'].draw()
+    if spike:
+        await asyncio.sleep(spike)
+    if reset:
+        # Linger 0 makes close() send a TCP RST, so the client sees ECONNRESET
+        sock = request.transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        request.transport.abort()
+        return web.Response()
+    if status:
+        return _error(status, 'injected fault')
+    response = await handler(request)
+    if slow and isinstance(response, web.Response) and response.body:
+        return await _drip_body(request, response, slow)
+    return response
+
+
+@web.middleware
+async def latency_middleware(request, handler):
+    """Apply the configured per-route latency before handling a request"""
+    profile = request.app['latency']
+    route = request.match_info.route
+    delay = profile.delay_for(route.name) if route is not None else 0.0
+    if delay:
+        await asyncio.sleep(delay)
+    return await handler(request)
+
+
+def _error(status, message):
+    return web.json_response({'success': False, 'error': message}, status=status)
+
+
+def _room_index(request):
+    return request.app['account'].room_index(request.match_info['room_id'])
+
+
+async def _json_body(request):
+    if not request.can_read_body:
+        return {}
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+
+# === Handlers ===
+
+async def handle_health(request):
+    return web.json_response({'status': 'ok', 'service': 'message-proxy-standin'})
+
+
+async def handle_login(request):
+    account = request.app['account']
+    data = await _json_body(request)
+    username = data.get('username')
+    if not username or not data.get('password'):
+        return _error(400, 'username and password are required')
+    token, user_id = account.login(username)
+    return web.json_response({
+        'success': True,
+        'user_id': user_id,
+        'access_token': token,
+        'device_id': 'STANDIN',
+        'user': {'user_id': user_id, 'display_name': username.lstrip('@').split(':')[0]},
+    })
+
+
+async def handle_restore_session(request):
+    account = request.app['account']
+    data = await _json_body(request)
+    user_id = data.get('user_id')
+    token = data.get('access_token')
+    if not user_id or not token:
+        return _error(400, 'user_id and access_token are required')
+    if token in account.revoked:
+        return _error(401, 'Unknown or expired access token')
+    account.sessions[token] = user_id
+    account.current = token
+    return web.json_response({
+        'success': True,
+        'user_id': user_id,
+        'device_id': data.get('device_id') or 'STANDIN',
+        'user': {'user_id': user_id, 'display_name': user_id.lstrip('@').split(':')[0]},
+    })
+
+
+async def handle_rooms(request):
+    """Full room list, or only rooms changed since ``?since=<next_batch>``"""
+    account = request.app['account']
+    if 'since' not in request.query or not request.app['delta_sync']:
+        return web.json_response({'success': True, 'data': account.rooms(), 'next_batch': account.sync_token()})
+    since = account.parse_sync_token(request.query['since'])
+    if since is None:
+        # Unknown or future token: the client has to replace its snapshot
+        rooms, left, full = account.rooms(), [], True
+    else:
+        (rooms, left), full = account.delta(since), False
+    return web.json_response({'success': True, 'data': {
+        'rooms': rooms, 'left': left, 'full': full, 'next_batch': account.sync_token()
+    }})
+
+
+async def handle_sync_status(request):
+    account = request.app['account']
+    return web.json_response({'success': True, 'data': {
+        'state': 'SYNCING', 'next_batch': account.sync_token(), 'room_count': len(account.rooms())
+    }})
+
+
+async def handle_room_info(request):
+    index = _room_index(request)
+    if index is None:
+        return _error(404, 'Room not found')
+    return web.json_response({'success': True, 'data': request.app['account'].room(index)})
+
+
+async def handle_messages(request):
+    index = _room_index(request)
+    if index is None:
+        return _error(404, 'Room not found')
+    try:
+        limit = max(1, min(int(request.query.get('limit', 50)), 1000))
+    except ValueError:
+        return _error(400, 'limit must be an integer')
+    page = request.app['account'].messages(index, limit, request.query.get('from_token'))
+    return web.json_response({'success': True, 'data': page})
+
+
+async def handle_members(request):
+    index = _room_index(request)
+    if index is None:
+        return _error(404, 'Room not found')
+    return web.json_response({'success': True, 'data': request.app['account'].members(index)})
+
+
+async def handle_send(request):
+    index = _room_index(request)
+    if index is None:
+        return _error(404, 'Room not found')
+    data = await _json_body(request)
+    message = data.get('message')
+    if message is None:
+        return _error(400, 'message is required')
+    event = request.app['account'].send(index, message, data.get('msg_type', 'm.text'))
+    request.app['hub'].publish(event)
+    return web.json_response({'success': True, 'event_id': event['event_id']})
+
+
+async def handle_send_batch(request):
+    """Send several messages in one round trip, in list order"""
+    index = _room_index(request)
+    if index is None:
+        return _error(404, 'Room not found')
+    data = await _json_body(request)
+    messages = data.get('messages')
+    if not isinstance(messages, list) or not messages:
+        return _error(400, 'messages must be a non-empty list')
+    if len(messages) > MAX_BATCH:
+        return _error(413, f'at most {MAX_BATCH} messages per batch')
+    account = request.app['account']
+    event_ids = []
+    for item in messages:
+        if isinstance(item, str):
+            item = {'message': item}
+        event = account.send(index, item.get('message', ''), item.get('msg_type', 'm.text'))
+        request.app['hub'].publish(event)
+        event_ids.append(event['event_id'])
+    return web.json_response({'success': True, 'event_ids': event_ids})
+
+
+async def handle_media_upload(request):
+    """POST /media/upload?filename=...: the raw body is streamed to disk"""
+    media = request.app['media']
+    media_id = media.new_media_id()
+    path = media.path(media_id)
+    size = 0
+    with open(path, 'wb') as f:
+        async for chunk in request.content.iter_chunked(MEDIA_CHUNK):
+            f.write(chunk)
+            size += len(chunk)
+    filename = request.query.get('filename') or media_id
+    media.files[media_id] = (path, filename, request.content_type or 'application/octet-stream')
+    return web.json_response({'success': True, 'content_uri': f"mxc://{SERVER_NAME}/{media_id}", 'size': size})
+
+
+async def handle_media_download(request):
+    """GET/HEAD /media/download/{server_name}/{media_id}, with Range support"""
+    entry = request.app['media'].files.get(request.match_info['media_id'])
+    if request.match_info['server_name'] != SERVER_NAME or entry is None:
+        return _error(404, 'Media not found')
+    path, filename, content_type = entry
+    return web.FileResponse(path, chunk_size=MEDIA_CHUNK, headers={
+        'Content-Type': content_type,
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    })
+
+
+async def handle_typing(request):
+    if _room_index(request) is None:
+        return _error(404, 'Room not found')
+    data = await _json_body(request)
+    return web.json_response({'success': True, 'typing': bool(data.get('typing'))})
+
+
+async def handle_space_hierarchy(request):
+    """Space hierarchy page: ``?max_depth=`` (default 3), ``?limit=`` (default 50) and ``?from=``"""
+    account = request.app['account']
+    index = account.space_index(request.match_info['space_id'])
+    if index is None:
+        return _error(404, 'Space not found')
+    try:
+        max_depth = int(request.query.get('max_depth', 3))
+        limit = min(max(int(request.query.get('limit', 50)), 1), 1000)
+        start = int(request.query.get('from', 0))
+    except ValueError:
+        return _error(400, 'max_depth, limit and from must be integers')
+    order = account.hierarchy(index, max(max_depth, 0))
+    page = order[start:start + limit]
+    next_batch = str(start + limit) if start + limit < len(order) else None
+    return web.json_response({'success': True, 'data': {
+        'rooms': [account.space_summary(child) for child in page], 'next_batch': next_batch
+    }})
+
+
+async def handle_logout(request):
+    """End the session whose token is in the Authorization header or body, else the current one"""
+    account = request.app['account']
+    data = await _json_body(request)
+    auth = request.headers.get('Authorization', '')
+    token = auth[7:].strip() if auth.startswith('Bearer ') else data.get('access_token') or account.current
+    if token:
+        account.logout(token)
+    return web.json_response({'success': True})
+
+
+def process_stats():
+    """Resident memory and open descriptors of this process.
+
+    Reads /proc on Linux; elsewhere RSS falls back to the peak and the
+    descriptor counts are None.
+    """
+    stats = {'rss_bytes': None, 'open_fds': None, 'open_sockets': None}
+    try:
+        with open('/proc/self/statm') as f:
+            stats['rss_bytes'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        fds = os.listdir('/proc/self/fd')
+    except OSError:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats['rss_bytes'] = peak if sys.platform == 'darwin' else peak * 1024
+        return stats
+    sockets = 0
+    for fd in fds:
+        try:
+            sockets += os.readlink(f'/proc/self/fd/{fd}').startswith('socket:')
+        except OSError:
+            pass  # closed while listing
+    stats['open_fds'] = len(fds)
+    stats['open_sockets'] = sockets
+    return stats
+
+
+async def handle_debug_stats(request):
+    """Process and state sizes, sampled by soak_bench.py to spot slow growth"""
+    account = request.app['account']
+    hub = request.app['hub']
+    return web.json_response({'success': True, 'data': {
+        **process_stats(),
+        'uptime': time.monotonic() - request.app['started'],
+        'cpu_seconds': time.process_time(),
+        'tasks': len(asyncio.all_tasks()),
+        'sessions': len(account.sessions),
+        'sent_events': sum(len(events) for events in account.sent.values()),
+        'subscriptions': len(hub.subscriptions),
+        'websockets': sum(len(sockets) for sockets in hub.sockets.values()),
+        'hub_queue': hub.queue.qsize(),
+        'hub_matching': hub.matching,
+        **{f"hub_{name}": value for name, value in hub.stats.items()},
+        'media_files': len(request.app['media'].files),
+    }})
+
+
+async def handle_debug_faults(request):
+    """GET: current fault settings and counts; POST: update settings from a JSON object"""
+    faults = request.app['faults']
+    if request.method == 'POST':
+        try:
+            faults.update(**await _json_body(request))
+        except (TypeError, ValueError) as e:
+            return _error(400, str(e))
+    return web.json_response({'success': True, 'data': {'settings': faults.settings(), 'counts': faults.counts}})
+
+
+# === Message proxy (plugin) handlers ===
+
+async def handle_proxy_send(request):
+    """POST /api/message-proxy/send as used by sendMatrixMessage() in extension.js"""
+    account = request.app['account']
+    data = await _json_body(request)
+    if data.get('action') in ('join_room', 'leave_room'):
+        index = account.room_index(data.get('room_id') or '')
+        if index is not None:
+            (account.join if data['action'] == 'join_room' else account.leave)(index)
+        return web.json_response({'success': True, 'room_id': data.get('room_id')})
+    index = account.room_index(data.get('target_id') or '')
+    if index is None:
+        return _error(404, 'Target room not found')
+    if data.get('text') is None:
+        return _error(400, 'text is required')
+    event = account.send(index, data['text'])
+    request.app['hub'].publish(event)
+    return web.json_response({'success': True, 'message_id': event['event_id']})
+
+
+async def handle_adapter_configure(request):
+    data = await _json_body(request)
+    if not data.get('access_token'):
+        return _error(400, 'access_token is required')
+    request.app['adapter'].update(config=data, connected=False)
+    return web.json_response({'success': True, 'adapter': 'element'})
+
+
+async def handle_adapter_connect(request):
+    adapter = request.app['adapter']
+    if adapter['config'] is None:
+        return _error(400, 'Element adapter is not configured')
+    if adapter['config']['access_token'] in request.app['account'].revoked:
+        return _error(401, 'Unknown or expired access token')
+    adapter['connected'] = True
+    return web.json_response({'success': True, 'adapter': 'element', 'connected': True})
+
+
+async def handle_adapter_disconnect(request):
+    request.app['adapter']['connected'] = False
+    return web.json_response({'success': True, 'adapter': 'element', 'connected': False})
+
+
+async def handle_query(request):
+    """POST /api/message-proxy/query as extension.js loadRooms() uses it (query_type 'rooms')"""
+    data = await _json_body(request)
+    if data.get('query_type') != 'rooms':
+        return _error(400, f"unsupported query_type '{data.get('query_type')}'")
+    if not request.app['adapter']['connected']:
+        return _error(503, 'Element adapter is not connected')
+    limit = int(data.get('limit') or 100)
+    rooms = [{
+        'id': room['room_id'],
+        'name': room['name'],
+        'topic': room['topic'],
+        'member_count': room['member_count'],
+        'is_encrypted': room['is_encrypted'],
+        'is_direct': room['is_direct'],
+        'unread_count': room['unread_count'],
+        'last_activity': room['last_activity'],
+    } for room in request.app['account'].rooms()[:limit]]
+    return web.json_response({'success': True, 'source': 'element', 'rooms': rooms})
+
+
+async def handle_subscribe(request):
+    data = await _json_body(request)
+    plugin_id = data.get('plugin_id')
+    if not plugin_id:
+        return _error(400, 'plugin_id is required')
+    request.app['hub'].subscribe(plugin_id, data.get('sources'), data.get('keywords'), data.get('room_ids'))
+    return web.json_response({'success': True, 'plugin_id': plugin_id})
+
+
+async def handle_unsubscribe(request):
+    removed = request.app['hub'].unsubscribe(request.match_info['plugin_id'])
+    return web.json_response({'success': removed})
+
+
+async def handle_websocket(request):
+    """/ws/extensions: plugins identify themselves, then receive messageEvent frames"""
+    hub = request.app['hub']
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    plugin_id = None
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                frame = json.loads(msg.data)
+            except ValueError:
+                continue
+            if frame.get('type') == 'identify' and frame.get('plugin_id'):
+                hub.detach(plugin_id, ws)
+                plugin_id = frame['plugin_id']
+                await ws.send_json({'type': 'connectionStatus', 'data': {'connected': True}})
+                hub.attach(plugin_id, ws)
+    finally:
+        hub.detach(plugin_id, ws, closed=True)
+    return ws
+
+
+def make_app(account=None, latency=None, faults=None, matching='indexed', delta_sync=True):
+    """Build the stand-in application for a synthetic account; ``delta_sync=False`` ignores ``/rooms?since=``
+    like a proxy without delta support"""
+    app = web.Application(middlewares=[fault_middleware, latency_middleware])
+    app['account'] = account or SyntheticAccount()
+    app['latency'] = latency or LatencyProfile()
+    app['faults'] = faults or FaultProfile()
+    app['hub'] = MessageHub(matching)
+    app['media'] = MediaStore()
+    app['adapter'] = {'config': None, 'connected': False}
+    app['delta_sync'] = delta_sync
+    app['started'] = time.monotonic()
+    app.on_startup.append(app['hub'].start)
+    app.on_shutdown.append(app['hub'].stop)
+    app.on_cleanup.append(app['media'].cleanup)
+
+    routes = [
+        ('GET', '/health', handle_health, 'health'),
+        ('POST', '/login', handle_login, 'login'),
+        ('POST', '/restore_session', handle_restore_session, 'restore_session'),
+        ('GET', '/rooms', handle_rooms, 'rooms'),
+        ('GET', '/sync/status', handle_sync_status, 'sync_status'),
+        ('GET', '/rooms/{room_id}/info', handle_room_info, 'info'),
+        ('GET', '/rooms/{room_id}/messages', handle_messages, 'messages'),
+        ('GET', '/rooms/{room_id}/members', handle_members, 'members'),
+        ('POST', '/rooms/{room_id}/send', handle_send, 'send'),
+        ('POST', '/rooms/{room_id}/send_batch', handle_send_batch, 'send_batch'),
+        ('PUT', '/rooms/{room_id}/typing', handle_typing, 'typing'),
+        ('POST', '/media/upload', handle_media_upload, 'media_upload'),
+        ('GET', '/media/download/{server_name}/{media_id}', handle_media_download, 'media_download'),
+        ('GET', '/spaces/{space_id}/hierarchy', handle_space_hierarchy, 'space_hierarchy'),
+        ('POST', '/logout', handle_logout, 'logout'),
+        ('GET', '/debug/stats', handle_debug_stats, 'debug_stats'),
+        ('*', '/debug/faults', handle_debug_faults, 'debug_faults'),
+    ]
+    for method, path, handler, name in routes:
+        app.router.add_route(method, f"{API_PREFIX}{path}", handler, name=name)
+
+    app.router.add_post(f"{PROXY_PREFIX}/send", handle_proxy_send, name='proxy_send')
+    app.router.add_post(f"{PROXY_PREFIX}/subscribe", handle_subscribe, name='subscribe')
+    app.router.add_delete(f"{PROXY_PREFIX}/subscribe/{{plugin_id}}", handle_unsubscribe)
+    app.router.add_post(f"{PROXY_PREFIX}/adapters/element/configure", handle_adapter_configure,
+                        name='adapter_configure')
+    app.router.add_post(f"{PROXY_PREFIX}/adapters/element/connect", handle_adapter_connect, name='adapter_connect')
+    app.router.add_post(f"{PROXY_PREFIX}/adapters/element/disconnect", handle_adapter_disconnect,
+                        name='adapter_disconnect')
+    app.router.add_post(f"{PROXY_PREFIX}/query", handle_query, name='query')
+    app.router.add_get(WS_PATH, handle_websocket)
+    return app
+
+
+async def start_standin(app, host=DEFAULT_HOST, port=0):
+    """Start ``app`` in the running loop; returns (runner, base_url)"""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def route_latency(value):
+    """argparse type for ROUTE=SECONDS; returns (route, seconds)"""
+    name, _, seconds = value.partition('=')
+    if name not in ROUTE_NAMES:
+        raise argparse.ArgumentTypeError(f"unknown route '{name}' (choose from {', '.join(ROUTE_NAMES)})")
+    try:
+        return name, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{seconds}' is not a number of seconds for route '{name}'")
+
+
+def fault_setting(value):
+    """argparse type for NAME=VALUE fault settings; returns (name, value of the setting's type)"""
+    name, _, setting = value.partition('=')
+    if name not in FaultProfile.SETTINGS:
+        raise argparse.ArgumentTypeError(
+            f"unknown fault setting '{name}' (choose from {', '.join(FaultProfile.SETTINGS)})")
+    kind = type(FaultProfile.SETTINGS[name])
+    try:
+        return name, kind(setting)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{setting}' is not a valid {kind.__name__} for '{name}'")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Matrix message proxy")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--rooms', type=int, default=50, help="number of joined rooms")
+    parser.add_argument('--members', type=int, default=50, help="members in the largest rooms")
+    parser.add_argument('--messages', type=int, default=1000, help="history depth per room")
+    parser.add_argument('--space-rooms', type=int, default=20, help="rooms in each space")
+    parser.add_argument('--space-fanout', type=int, default=3, help="subspaces in each space")
+    parser.add_argument('--space-pool', type=int, help="distinct rooms spaces draw from (default: --rooms)")
+    parser.add_argument('--seed', type=int, default=0, help="seed for latency jitter")
+    parser.add_argument('--default-latency', type=float, default=0.0, help="seconds added to every route")
+    parser.add_argument('--latency', action='append', type=route_latency, default=[], metavar='ROUTE=SECONDS',
+                        help="per-route latency, may be repeated")
+    parser.add_argument('--jitter', type=float, default=0.0, help="relative latency jitter, e.g. 0.2")
+    parser.add_argument('--matching', choices=('indexed', 'linear'), default='indexed',
+                        help="subscription filter matching (linear is the reference scan)")
+    parser.add_argument('--no-delta-sync', dest='delta_sync', action='store_false',
+                        help="ignore /rooms?since= and always return the full list, like an older proxy")
+    parser.add_argument('--fault', action='append', type=fault_setting, default=[], metavar='NAME=VALUE',
+                        help="fault injection setting, may be repeated "
+                             "(e.g. error_rate=0.1, error_burst=5, reset_rate=0.05, spike_rate=0.01)")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    account = SyntheticAccount(rooms=args.rooms, members=args.members, messages=args.messages,
+                               space_rooms=args.space_rooms, space_fanout=args.space_fanout,
+                               space_pool=args.space_pool)
+    latency = LatencyProfile(default=args.default_latency, per_route=dict(args.latency),
+                             jitter=args.jitter, seed=args.seed)
+    faults = FaultProfile(seed=args.seed, **dict(args.fault))
+    print(f"🧪 Message proxy stand-in on http://{args.host}:{args.port}{API_PREFIX}")
+    print(f"   Rooms: {args.rooms}, members: {args.members}, history depth: {args.messages}")
+    web.run_app(make_app(account, latency, faults, args.matching, args.delta_sync), host=args.host, port=args.port,
+                access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Matrix Proxy Request Tracing
+Per-request timing breakdown built on aiohttp's TraceConfig: pool queueing,
+connect (DNS + TCP), send, time to first byte, body read and JSON decode for
+every call, tagged with the endpoint template and room ID. Runs any existing
+script with tracing installed and exports Chrome/Perfetto trace JSON
+(open in ui.perfetto.dev or chrome://tracing) and OpenMetrics text.
+
+Usage:
+    python request_trace.py test_complete_implementation:test_complete_matrix_client --chrome trace.json
+    python request_trace.py load_bench:main --metrics metrics.txt -- --users 20 --duration 10
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+from urllib.parse import unquote, urlsplit
+
+import aiohttp
+
+from matrix_client import API_BASE
+
+PHASES = ('queue', 'connect', 'send', 'ttfb', 'body', 'decode')
+# OpenMetrics histogram bucket bounds, seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_API_PATH = urlsplit(API_BASE).path
+_ROOM_SEGMENT = re.compile(r'/(![^/?]+)')
+
+
+def endpoint_tags(url, trace_ctx=None):
+    """(endpoint template, room_id) for a request URL"""
+    if trace_ctx and 'endpoint' in trace_ctx:
+        path = trace_ctx['endpoint'].split('?', 1)[0]
+    else:
+        path = urlsplit(str(url)).path
+        if path.startswith(_API_PATH):
+            path = path[len(_API_PATH):] or '/'
+    path = unquote(path)
+    match = _ROOM_SEGMENT.search(path)
+    return _ROOM_SEGMENT.sub('/{room_id}', path), match.group(1) if match else None
+
+
+class RequestSpan:
+    """Timestamps (perf_counter) of one request; phases are derived on demand"""
+
+    __slots__ = ('method', 'template', 'room_id', 'status', 'error', 'reused', 'marks', 'ctx')
+
+    def __init__(self, method, template, room_id, ctx):
+        self.method = method
+        self.template = template
+        self.room_id = room_id
+        self.status = None
+        self.error = None
+        self.reused = False
+        self.marks = {}
+        self.ctx = ctx  # test_api_endpoint's trace_request_ctx, filled after the body is read
+
+    @property
+    def name(self):
+        return f"{self.method} {self.template}"
+
+    def phases(self):
+        """[(phase, start, end)] in request order; missing phases are omitted"""
+        marks = self.marks
+        ctx = self.ctx or {}
+        start = marks['start']
+        connected = marks.get('connected', marks.get('queue_end', start))
+        sent = marks.get('sent', connected)
+        headers = marks.get('headers', sent)
+        body = ctx.get('body_read', marks.get('last_chunk', headers))
+        spans = [
+            ('queue', marks.get('queue_start'), marks.get('queue_end')),
+            ('connect', marks.get('connect_start'), marks.get('connected') if not self.reused else None),
+            ('send', connected, sent),
+            ('ttfb', sent, headers if 'headers' in marks else None),
+            ('body', headers, body if 'headers' in marks else None),
+            ('decode', ctx.get('body_read'), ctx.get('decoded')),
+        ]
+        return [(phase, begin, end) for phase, begin, end in spans
+                if begin is not None and end is not None and end >= begin]
+
+    def durations(self):
+        """{phase: seconds} for the phases this request went through (no queue or connect on a reused connection)"""
+        return {phase: end - begin for phase, begin, end in self.phases()}
+
+    @property
+    def end(self):
+        ctx = self.ctx or {}
+        return ctx.get('decoded') or ctx.get('body_read') or self.marks.get('last_chunk') \
+            or self.marks.get('headers') or self.marks.get('failed') or self.marks['start']
+
+
+class RequestTracer:
+    """Collects a RequestSpan for every request made on traced sessions"""
+
+    def __init__(self):
+        self.spans = []
+        self.started = time.perf_counter()
+
+    def trace_config(self):
+        config = aiohttp.TraceConfig(trace_config_ctx_factory=SimpleNamespace)
+        tracer = self
+
+        def mark(name):
+            async def handler(session, ctx, params):
+                span = getattr(ctx, 'span', None)
+                if span is not None:
+                    span.marks[name] = time.perf_counter()
+            return handler
+
+        async def on_request_start(session, ctx, params):
+            request_ctx = ctx.trace_request_ctx if isinstance(ctx.trace_request_ctx, dict) else None
+            template, room_id = endpoint_tags(params.url, request_ctx)
+            ctx.span = RequestSpan(params.method, template, room_id, request_ctx)
+            ctx.span.marks['start'] = time.perf_counter()
+            tracer.spans.append(ctx.span)
+
+        async def on_connection_reuseconn(session, ctx, params):
+            ctx.span.reused = True
+            ctx.span.marks['connected'] = time.perf_counter()
+
+        async def on_request_end(session, ctx, params):
+            ctx.span.marks['headers'] = time.perf_counter()
+            ctx.span.status = params.response.status
+
+        async def on_request_exception(session, ctx, params):
+            ctx.span.marks['failed'] = time.perf_counter()
+            ctx.span.error = type(params.exception).__name__
+
+        config.on_request_start.append(on_request_start)
+        config.on_connection_queued_start.append(mark('queue_start'))
+        config.on_connection_queued_end.append(mark('queue_end'))
+        config.on_connection_create_start.append(mark('connect_start'))
+        config.on_connection_create_end.append(mark('connected'))
+        config.on_connection_reuseconn.append(on_connection_reuseconn)
+        config.on_request_headers_sent.append(mark('sent'))
+        config.on_request_chunk_sent.append(mark('sent'))
+        config.on_request_end.append(on_request_end)
+        config.on_response_chunk_received.append(mark('last_chunk'))
+        config.on_request_exception.append(on_request_exception)
+        return config
+
+    def install(self):
+        """Add this tracer to every aiohttp.ClientSession created from now on"""
+        original_init = aiohttp.ClientSession.__init__
+        tracer = self
+
+        def __init__(session, *args, trace_configs=None, **kwargs):
+            trace_configs = [*(trace_configs or []), tracer.trace_config()]
+            original_init(session, *args, trace_configs=trace_configs, **kwargs)
+
+        aiohttp.ClientSession.__init__ = __init__
+
+    # === Export ===
+
+    def chrome_trace(self):
+        """Chrome trace-event JSON; overlapping requests go on separate lanes (tids)"""
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': 'message proxy requests'}}]
+        lane_ends = []
+        for span in sorted(self.spans, key=lambda span: span.marks['start']):
+            start, end = span.marks['start'], span.end
+            lane = next((i for i, lane_end in enumerate(lane_ends) if lane_end <= start), len(lane_ends))
+            if lane == len(lane_ends):
+                lane_ends.append(end)
+            lane_ends[lane] = end
+            args = {'endpoint': span.template, 'room_id': span.room_id, 'status': span.status,
+                    'reused_connection': span.reused}
+            if span.error:
+                args['error'] = span.error
+            events.append({'name': span.name, 'cat': 'request', 'ph': 'X', 'pid': 1, 'tid': lane + 1,
+                           'ts': (start - self.started) * 1e6, 'dur': (end - start) * 1e6, 'args': args})
+            for phase, begin, finish in span.phases():
+                events.append({'name': phase, 'cat': 'phase', 'ph': 'X', 'pid': 1, 'tid': lane + 1,
+                               'ts': (begin - self.started) * 1e6, 'dur': (finish - begin) * 1e6,
+                               'args': {'endpoint': span.template, 'room_id': span.room_id}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def openmetrics(self):
+        """OpenMetrics text: a phase-duration histogram per endpoint template"""
+        series = {}
+        for span in self.spans:
+            for phase, seconds in span.durations().items():
+                counts, total = series.setdefault((span.method, span.template, phase),
+                                                  ([0] * (len(BUCKETS) + 1), [0.0]))
+                index = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+                counts[index] += 1
+                total[0] += seconds
+
+        lines = [
+            '# TYPE matrix_proxy_request_phase_seconds histogram',
+            '# UNIT matrix_proxy_request_phase_seconds seconds',
+            '# HELP matrix_proxy_request_phase_seconds Client-side time per request phase.',
+        ]
+        for (method, template, phase), (counts, total) in sorted(series.items()):
+            labels = f'method="{method}",endpoint="{template}",phase="{phase}"'
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, '+Inf'), counts):
+                cumulative += count
+                lines.append(f'matrix_proxy_request_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'matrix_proxy_request_phase_seconds_count{{{labels}}} {cumulative}')
+            lines.append(f'matrix_proxy_request_phase_seconds_sum{{{labels}}} {total[0]:.6f}')
+
+        errors = {}
+        for span in self.spans:
+            if span.error or (span.status or 0) >= 400:
+                key = (span.method, span.template)
+                errors[key] = errors.get(key, 0) + 1
+        lines.append('# TYPE matrix_proxy_request_errors counter')
+        lines.append('# HELP matrix_proxy_request_errors Requests that failed or returned HTTP >= 400.')
+        for (method, template), count in sorted(errors.items()):
+            lines.append(f'matrix_proxy_request_errors_total{{method="{method}",endpoint="{template}"}} {count}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def print_report(self):
+        totals = {}
+        for span in self.spans:
+            entry = totals.setdefault(span.name, [0, dict.fromkeys(PHASES, 0.0)])
+            entry[0] += 1
+            for phase, seconds in span.durations().items():
+                entry[1][phase] += seconds
+        grand_total = sum(sum(phases.values()) for _, phases in totals.values()) or 1.0
+
+        print(f"\n📊 Request timing breakdown ({len(self.spans)} requests, mean ms per request)")
+        header = ''.join(f"{phase:>9}" for phase in PHASES)
+        print(f"   {'endpoint':<36} {'reqs':>5}{header} {'share':>7}")
+        for name, (count, phases) in sorted(totals.items(), key=lambda item: -sum(item[1][1].values())):
+            cells = ''.join(f"{phases[phase] / count * 1000:>9.2f}" for phase in PHASES)
+            print(f"   {name:<36} {count:>5}{cells} {sum(phases.values()) / grand_total:>6.1%}")
+
+
+async def run_traced(tracer, target, script_args):
+    """Run ``module:function`` with tracing installed"""
+    module_name, _, function_name = target.partition(':')
+    module = importlib.import_module(module_name)
+    tracer.install()
+    sys.argv = [module_name + '.py', *script_args]
+    result = getattr(module, function_name or 'main')()
+    if asyncio.iscoroutine(result):
+        await result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace message proxy requests made by a script")
+    parser.add_argument('target', help="module:function to run, e.g. load_bench:main")
+    parser.add_argument('--chrome', help="write Chrome/Perfetto trace JSON here")
+    parser.add_argument('--metrics', help="write OpenMetrics text here")
+    # Everything after '--' belongs to the traced script
+    argv = sys.argv[1:]
+    split = argv.index('--') if '--' in argv else len(argv)
+    args = parser.parse_args(argv[:split])
+
+    tracer = RequestTracer()
+    try:
+        asyncio.run(run_traced(tracer, args.target, argv[split + 1:]))
+    finally:
+        if tracer.spans:
+            tracer.print_report()
+        if args.chrome:
+            with open(args.chrome, 'w') as f:
+                json.dump(tracer.chrome_trace(), f)
+            print(f"\n💾 Chrome trace: {args.chrome} ({os.path.getsize(args.chrome) / 1e3:.0f} kB)")
+        if args.metrics:
+            with open(args.metrics, 'w') as f:
+                f.write(tracer.openmetrics())
+            print(f"💾 OpenMetrics: {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Matrix Proxy Retry Policy Study
+Replays the retry policy of ApiClient.request() (retry network errors and 5xx
+with retryDelay * 2^(attempt-1) backoff; 4xx and timeouts are final) against
+an in-process stand-in that is healthy, then degraded by injected faults
+(5xx bursts, connection resets, latency spikes or slow bodies), then healthy
+again. Calls arrive open-loop at a fixed rate, so slow calls do not hold back
+later ones. For each policy -- no retry, the ApiClient policy, hedged attempts
+and a circuit breaker -- reports success rate, p50/p99 latency, request
+amplification and the time to recover after the faults stop.
+
+Usage:
+    python retry_study.py
+    python retry_study.py --scenarios errors,spikes --rate 100 --degraded 20
+    python retry_study.py --retry-delay 0.25 --hedge-delay 0.02 --breaker-open 1
+"""
+
+import argparse
+import asyncio
+import time
+from collections import deque
+
+import aiohttp
+
+from bench_common import LatencyHistogram
+from proxy_standin import API_PREFIX, FaultProfile, LatencyProfile, SyntheticAccount, make_app, start_standin
+
+# Fault settings applied during the degraded phase
+SCENARIOS = {
+    'errors': {'error_rate': 0.2, 'error_burst': 5},
+    'resets': {'reset_rate': 0.2},
+    'spikes': {'spike_rate': 0.05, 'spike_seconds': 1.0},
+    'slow': {'slow_body_rate': 0.1, 'slow_body_seconds': 2.0},
+    'mixed': {'error_rate': 0.05, 'error_burst': 3, 'reset_rate': 0.05,
+              'spike_rate': 0.02, 'slow_body_rate': 0.03},
+}
+
+# Outcomes of one physical request, classified as ApiClient.request() does
+OK, CLIENT_ERROR, RETRYABLE, TIMEOUT, REJECTED = 'ok', 'client_error', 'retryable', 'timeout', 'rejected'
+
+
+async def attempt(session, url, timeout):
+    """One physical GET; returns its outcome"""
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            await response.read()
+            if response.status < 400:
+                return OK
+            return CLIENT_ERROR if response.status < 500 else RETRYABLE
+    except asyncio.TimeoutError:
+        return TIMEOUT
+    except aiohttp.ClientError:
+        return RETRYABLE
+
+
+class RetryPolicy:
+    """ApiClient.request(): up to ``attempts`` tries with exponential backoff between them"""
+
+    def __init__(self, name='retry', attempts=3, retry_delay=1.0):
+        self.name = name
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+
+    async def send_once(self, send):
+        return await send()
+
+    async def run(self, send):
+        """Returns True if the call succeeded"""
+        for attempt_number in range(1, self.attempts + 1):
+            outcome = await self.send_once(send)
+            if outcome != RETRYABLE:
+                return outcome == OK
+            if attempt_number < self.attempts:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt_number - 1))
+        return False
+
+
+class HedgedPolicy(RetryPolicy):
+    """RetryPolicy whose attempts send a second copy if the first is still out after ``hedge_delay``"""
+
+    def __init__(self, name='hedged', attempts=3, retry_delay=1.0, hedge_delay=0.05):
+        super().__init__(name, attempts, retry_delay)
+        self.hedge_delay = hedge_delay
+
+    async def send_once(self, send):
+        first = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        if done:
+            return first.result()
+        pending = {first, asyncio.ensure_future(send())}
+        outcome = RETRYABLE
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                outcome = task.result()
+                if outcome != RETRYABLE:
+                    for other in pending:
+                        other.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    return outcome
+        return outcome
+
+
+class BreakerPolicy(RetryPolicy):
+    """RetryPolicy behind a circuit breaker.
+
+    When at least ``threshold`` of the last ``window`` attempts failed, the
+    breaker opens and calls fail fast for ``open_seconds``; then a single
+    probe is let through (half-open) and closes the breaker if it succeeds.
+    """
+
+    def __init__(self, name='breaker', attempts=3, retry_delay=1.0, threshold=0.5, window=20, open_seconds=2.0):
+        super().__init__(name, attempts, retry_delay)
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.recent = deque(maxlen=window)  # True for a failed attempt
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.probing = False
+
+    async def send_once(self, send):
+        probe = False
+        if self.state == 'open':
+            if self.probing or time.perf_counter() - self.opened_at < self.open_seconds:
+                return REJECTED
+            self.probing = probe = True
+        try:
+            outcome = await send()
+        finally:
+            if probe:
+                self.probing = False
+        if self.state == 'open' and not probe:
+            return outcome  # sent before the breaker opened; doesn't count
+        failed = outcome in (RETRYABLE, TIMEOUT)
+        if probe:
+            self.recent.clear()
+            self.state = 'open' if failed else 'closed'
+            self.opened_at = time.perf_counter()
+            return outcome
+        self.recent.append(failed)
+        if len(self.recent) == self.recent.maxlen and sum(self.recent) >= self.threshold * len(self.recent):
+            self.recent.clear()
+            self.state, self.opened_at = 'open', time.perf_counter()
+        return outcome
+
+
+def build_policy(name, args):
+    if name == 'none':
+        return RetryPolicy('none', 1, args.retry_delay)
+    if name == 'retry':
+        return RetryPolicy('retry', args.attempts, args.retry_delay)
+    if name == 'hedged':
+        return HedgedPolicy('hedged', args.attempts, args.retry_delay, args.hedge_delay)
+    if name == 'breaker':
+        return BreakerPolicy('breaker', args.attempts, args.retry_delay, args.breaker_threshold,
+                             args.breaker_window, args.breaker_open)
+    raise SystemExit(f"Unknown policy '{name}' (choose from none, retry, hedged, breaker)")
+
+
+async def run_policy(policy, scenario, args):
+    """Healthy, degraded and recovery phases for one policy; returns the call and attempt log"""
+    account = SyntheticAccount(rooms=20, members=20, messages=200)
+    faults = FaultProfile(seed=args.seed)
+    runner, base_url = await start_standin(make_app(account, LatencyProfile(default=args.base_latency), faults))
+    url = f"{base_url}{API_PREFIX}/rooms/{account.room_id(0)}/messages?limit=20"
+    calls = []          # (scheduled, finished, ok), seconds from the start
+    attempt_times = []  # start of every physical request
+    fault_on, fault_off = args.healthy, args.healthy + args.degraded
+    try:
+        connector = aiohttp.TCPConnector(limit=args.connections)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            started = time.perf_counter()
+
+            async def send():
+                attempt_times.append(time.perf_counter() - started)
+                return await attempt(session, url, args.timeout)
+
+            async def call(scheduled):
+                ok = await policy.run(send)
+                calls.append((scheduled, time.perf_counter() - started, ok))
+
+            async def switch_faults():
+                await asyncio.sleep(fault_on)
+                faults.update(**SCENARIOS[scenario])
+                await asyncio.sleep(args.degraded)
+                faults.update(**FaultProfile.SETTINGS)
+
+            switcher = asyncio.ensure_future(switch_faults())
+            tasks = []
+            for i in range(int((fault_off + args.recovery) * args.rate)):
+                scheduled = i / args.rate
+                await asyncio.sleep(max(0.0, started + scheduled - time.perf_counter()))
+                tasks.append(asyncio.ensure_future(call(scheduled)))
+            await asyncio.gather(switcher, *tasks)
+        server_requests = faults.counts['requests']
+    finally:
+        await runner.cleanup()
+    return summarize(calls, attempt_times, server_requests, fault_on, fault_off, args.rate)
+
+
+def summarize(calls, attempt_times, server_requests, fault_on, fault_off, rate):
+    overall, degraded, healthy = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for scheduled, finished, ok in calls:
+        overall.record(finished - scheduled)
+        if fault_on <= scheduled < fault_off:
+            degraded.record(finished - scheduled)
+        elif scheduled < fault_on:
+            healthy.record(finished - scheduled)
+
+    # Recovered once no call finishing after the faults stop fails or is slower than 3x the healthy p99
+    slow = max(3 * healthy.percentile(99), 0.05)
+    bad_after = [finished for scheduled, finished, ok in calls
+                 if finished >= fault_off and (not ok or finished - scheduled > slow)]
+    per_second = {}
+    for started in attempt_times:
+        per_second[int(started)] = per_second.get(int(started), 0) + 1
+
+    degraded_calls = [ok for scheduled, _, ok in calls if fault_on <= scheduled < fault_off]
+    return {
+        'calls': len(calls),
+        'success': sum(ok for _, _, ok in calls) / len(calls),
+        'degraded_success': sum(degraded_calls) / len(degraded_calls) if degraded_calls else 1.0,
+        'p50': overall.percentile(50),
+        'p99': overall.percentile(99),
+        'degraded_p99': degraded.percentile(99),
+        'max': overall.max_us / 1_000_000,
+        'amplification': len(attempt_times) / len(calls),
+        'server_amplification': server_requests / len(calls),
+        'peak_amplification': max(per_second.values()) / rate,
+        'recovery': max(bad_after) - fault_off if bad_after else 0.0,
+    }
+
+
+def print_scenario(scenario, results):
+    settings = ', '.join(f"{name}={value}" for name, value in SCENARIOS[scenario].items())
+    print(f"\n⚡ {scenario}: {settings}")
+    header = (f"   {'policy':<9} {'ok':>7} {'ok (deg)':>9} {'p50':>8} {'p99':>9} {'p99 (deg)':>10} "
+              f"{'max':>8} {'amp':>6} {'srv amp':>8} {'peak':>6} {'recover':>8}")
+    print(header)
+    print("   " + "-" * (len(header) - 3))
+    for name, result in results.items():
+        print(f"   {name:<9} {result['success']:>7.1%} {result['degraded_success']:>9.1%} "
+              f"{result['p50'] * 1000:>6.1f}ms {result['p99'] * 1000:>7.0f}ms {result['degraded_p99'] * 1000:>8.0f}ms "
+              f"{result['max']:>7.2f}s {result['amplification']:>5.2f}x {result['server_amplification']:>7.2f}x "
+              f"{result['peak_amplification']:>5.1f}x {result['recovery']:>7.2f}s")
+
+    # Best tail among the policies whose success rate is within a point of the best
+    best_success = max(result['success'] for result in results.values())
+    eligible = {name: result for name, result in results.items() if result['success'] >= best_success - 0.01}
+    best = min(eligible, key=lambda name: (eligible[name]['p99'], eligible[name]['amplification']))
+    print(f"   🏆 Best tail: {best} (p99 {eligible[best]['p99'] * 1000:.0f}ms, "
+          f"{eligible[best]['success']:.1%} ok, {eligible[best]['amplification']:.2f}x requests)")
+
+
+async def run(args):
+    for scenario in args.scenarios.split(','):
+        if scenario not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{scenario}' (choose from {', '.join(SCENARIOS)})")
+        results = {}
+        for name in args.policies.split(','):
+            results[name] = await run_policy(build_policy(name, args), scenario, args)
+        print_scenario(scenario, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tail latency of retry, hedging and circuit breaker policies")
+    parser.add_argument('--scenarios', default='errors,resets,spikes,slow',
+                        help=f"comma-separated fault scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument('--policies', default='none,retry,hedged,breaker', help="comma-separated policies")
+    parser.add_argument('--rate', type=float, default=50.0, help="calls per second (open loop)")
+    parser.add_argument('--healthy', type=float, default=3.0, help="seconds before the faults start")
+    parser.add_argument('--degraded', type=float, default=10.0, help="seconds of injected faults")
+    parser.add_argument('--recovery', type=float, default=10.0, help="seconds after the faults stop")
+    parser.add_argument('--base-latency', type=float, default=0.005, help="stand-in latency per request")
+    parser.add_argument('--attempts', type=int, default=3, help="ApiClient retryAttempts")
+    parser.add_argument('--retry-delay', type=float, default=1.0, help="ApiClient retryDelay, seconds")
+    parser.add_argument('--timeout', type=float, default=30.0, help="ApiClient timeout, seconds")
+    parser.add_argument('--hedge-delay', type=float, default=0.05, help="seconds before a hedged copy is sent")
+    parser.add_argument('--breaker-threshold', type=float, default=0.5,
+                        help="share of failed attempts in the window that opens the breaker")
+    parser.add_argument('--breaker-window', type=int, default=20, help="recent attempts the breaker looks at")
+    parser.add_argument('--breaker-open', type=float, default=2.0, help="seconds the breaker stays open")
+    parser.add_argument('--connections', type=int, default=100, help="connection pool limit")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print("🧪 Retry Policy Tail-Latency Study")
+    print("=" * 60)
+    print(f"   {args.rate:.0f} calls/s; {args.healthy:.0f}s healthy, {args.degraded:.0f}s degraded, "
+          f"{args.recovery:.0f}s recovery; retry: {args.attempts} attempts, {args.retry_delay}s base delay")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
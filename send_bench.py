@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Matrix Send-Path Throughput Benchmark
+Pushes sends to /rooms/{room_id}/send at rising rates and compares send
+strategies: sequential, concurrent (connection pool), pipelined (HTTP/1.1
+pipelining over one keep-alive connection) and batched (/send_batch).
+Reports sustained msgs/sec, latency at each rate, the rate where latency
+starts to climb, and whether per-room ordering held.
+
+Usage:
+    python send_bench.py --modes sequential,pipelined,batched --rates 50,200,800,0
+    python send_bench.py --rooms 20 --body-size 4096 --duration 5
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import ssl
+import time
+import uuid
+from urllib.parse import quote, urlsplit
+
+import aiohttp
+
+from bench_common import LatencyHistogram, authenticate
+from matrix_client import API_BASE
+from test_complete_implementation import load_test_credentials, test_api_endpoint
+
+MODES = ('sequential', 'concurrent', 'pipelined', 'batched')
+
+
+async def send_batch(session, room_id, messages, msg_type='m.text'):
+    """Send several messages to a room in one round trip.
+
+    Falls back to one /send per message when the proxy has no /send_batch
+    route. Returns (status, result) like test_api_endpoint, with 'event_ids'.
+    """
+    status, result = await test_api_endpoint(session, f'/rooms/{room_id}/send_batch', 'POST', {
+        'messages': [{'message': message, 'msg_type': msg_type} for message in messages]
+    })
+    if status not in (404, 405):
+        return status, result
+
+    event_ids = []
+    for message in messages:
+        status, result = await test_api_endpoint(session, f'/rooms/{room_id}/send', 'POST', {
+            'message': message,
+            'msg_type': msg_type
+        })
+        if status != 200:
+            return status, result
+        event_ids.append(result.get('event_id'))
+    return 200, {'success': True, 'event_ids': event_ids}
+
+
+async def read_http_response(reader):
+    """Read one HTTP/1.1 response; returns (status, body bytes)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by proxy")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+        return status, bytes(body)
+    return status, await reader.readexactly(int(headers.get('content-length', 0)))
+
+
+class PipelinedConnection:
+    """HTTP/1.1 pipelining over a single keep-alive connection.
+
+    Requests are written back to back without waiting; a reader task matches
+    responses to requests in FIFO order, as HTTP/1.1 requires.
+    """
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.path_prefix = parts.path
+        self.pending = collections.deque()
+        self.reader = self.writer = self.reader_task = None
+        self.error = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.reader_task = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self):
+        try:
+            while True:
+                status, body = await read_http_response(self.reader)
+                self.pending.popleft().set_result((status, body))
+        except Exception as e:
+            # Anything unparseable leaves the stream out of sync: fail everything still waiting
+            self.error = ConnectionError(f"pipelined connection failed: {e!r}")
+            while self.pending:
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(self.error)
+            self.writer.close()
+
+    async def post_json(self, path, data):
+        body = json.dumps(data).encode()
+        request = (
+            f"POST {self.path_prefix}{path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode() + body
+        if self.error:
+            raise self.error
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(request)
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        if self.reader_task:
+            self.reader_task.cancel()
+        if self.writer:
+            self.writer.close()
+
+
+class Sender:
+    """One send strategy; ``send`` resolves when the proxy acknowledged the message"""
+
+    def __init__(self, mode, session, window, batch_size=50, linger=0.005):
+        self.mode = mode
+        self.session = session
+        # Batched sends count messages, not requests, against the window
+        self.window = asyncio.Semaphore(window * batch_size if mode == 'batched' else window)
+        self.batch_size = batch_size
+        self.linger = linger
+        self.lock = asyncio.Lock()
+        self.room_locks = collections.defaultdict(asyncio.Lock)
+        self.pipe = None
+        self.batches = {}  # room_id -> list of (message, future)
+        self.flushers = {}
+
+    async def start(self):
+        if self.mode == 'pipelined':
+            self.pipe = PipelinedConnection(API_BASE)
+            await self.pipe.connect()
+
+    async def close(self):
+        if self.pipe:
+            await self.pipe.close()
+
+    async def send(self, room_id, message):
+        async with self.window:
+            if self.mode == 'sequential':
+                async with self.lock:
+                    status, _ = await test_api_endpoint(self.session, f'/rooms/{room_id}/send', 'POST',
+                                                        {'message': message, 'msg_type': 'm.text'})
+                return status == 200
+            if self.mode == 'concurrent':
+                status, _ = await test_api_endpoint(self.session, f'/rooms/{room_id}/send', 'POST',
+                                                    {'message': message, 'msg_type': 'm.text'})
+                return status == 200
+            if self.mode == 'pipelined':
+                try:
+                    status, _ = await self.pipe.post_json(f"/rooms/{quote(room_id, safe='')}/send",
+                                                          {'message': message, 'msg_type': 'm.text'})
+                except ConnectionError:
+                    return False
+                return status == 200
+            if self.mode == 'batched':
+                return await self._send_batched(room_id, message)
+            raise ValueError(f"unknown send mode {self.mode!r}")
+
+    async def _send_batched(self, room_id, message):
+        future = asyncio.get_running_loop().create_future()
+        batch = self.batches.setdefault(room_id, [])
+        batch.append((message, future))
+        if len(batch) >= self.batch_size:
+            await self._flush(room_id)
+        elif room_id not in self.flushers:
+            self.flushers[room_id] = asyncio.create_task(self._flush_later(room_id))
+        return await future
+
+    async def _flush_later(self, room_id):
+        await asyncio.sleep(self.linger)
+        self.flushers.pop(room_id, None)
+        await self._flush(room_id)
+
+    async def _flush(self, room_id):
+        batch = self.batches.pop(room_id, [])
+        if not batch:
+            return
+        # One batch per room in flight keeps per-room ordering
+        async with self.room_locks[room_id]:
+            status, _ = await send_batch(self.session, room_id, [message for message, _ in batch])
+        for _, future in batch:
+            if not future.done():
+                future.set_result(status == 200)
+
+
+async def run_rate(sender, rooms, rate, duration, body_size, run_tag):
+    """Submit messages at ``rate`` msgs/sec (0 = unbounded) for ``duration`` seconds"""
+    latency = LatencyHistogram()
+    counters = {'ok': 0, 'failed': 0}
+    seqs = collections.Counter()
+    padding = 'x' * max(0, body_size - 40)
+
+    async def one(room_id, seq):
+        started = time.perf_counter()
+        ok = await sender.send(room_id, f"{run_tag}:{seq} {padding}")
+        latency.record(time.perf_counter() - started)
+        counters['ok' if ok else 'failed'] += 1
+
+    tasks = []
+    started = time.perf_counter()
+    deadline = started + duration
+    interval = 1.0 / rate if rate else 0.0
+    n = 0
+    while time.perf_counter() < deadline:
+        room_id = rooms[n % len(rooms)]
+        tasks.append(asyncio.create_task(one(room_id, seqs[room_id])))
+        seqs[room_id] += 1
+        n += 1
+        if interval:
+            delay = started + n * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            # Unbounded: let the window throttle submission (wait for a free slot, leave it to the sends)
+            await asyncio.sleep(0)
+            async with sender.window:
+                pass
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        'rate': rate,
+        'submitted': n,
+        'achieved': counters['ok'] / elapsed,
+        'failed': counters['failed'],
+        'latency': latency,
+        'sent_per_room': dict(seqs),
+    }
+
+
+async def check_ordering(session, room_id, run_tag, expected, page_limit=500, max_pages=50):
+    """Walk recent history and count out-of-order messages tagged ``run_tag``"""
+    seen = []
+    token = None
+    for _ in range(max_pages):
+        endpoint = f'/rooms/{room_id}/messages?limit={page_limit}'
+        if token:
+            endpoint += f'&from_token={token}'
+        status, result = await test_api_endpoint(session, endpoint)
+        if status != 200:
+            break
+        page = result.get('data', {})
+        chunk = page.get('chunk', [])
+        # Pages are chronological, walked newest page first
+        seen[:0] = [int(event['body'].split(' ', 1)[0].rsplit(':', 1)[1])
+                    for event in chunk if event.get('body', '').startswith(run_tag + ':')]
+        token = page.get('end')
+        if len(seen) >= expected or not token:
+            break
+    violations = sum(1 for a, b in zip(seen, seen[1:]) if b < a)
+    return violations, len(seen)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Send-path throughput benchmark")
+    parser.add_argument('--modes', default=','.join(MODES), help=f"comma-separated modes ({', '.join(MODES)})")
+    parser.add_argument('--rates', default='25,100,400,0', help="comma-separated msgs/sec, 0 = unbounded")
+    parser.add_argument('--rooms', type=int, default=1, help="number of rooms to spread sends over")
+    parser.add_argument('--duration', type=float, default=3.0, help="seconds per rate step")
+    parser.add_argument('--body-size', type=int, default=64, help="approximate message body bytes")
+    parser.add_argument('--window', type=int, default=32, help="max sends in flight")
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--check-order', action='store_true', help="verify per-room ordering from history")
+    args = parser.parse_args()
+    modes = args.modes.split(',')
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        raise SystemExit(f"Unknown mode(s) {', '.join(unknown)} (choose from {', '.join(MODES)})")
+
+    creds = await load_test_credentials()
+    rates = [float(value) for value in args.rates.split(',')]
+
+    print("🧪 Matrix Send-Path Throughput Benchmark")
+    print("=" * 60)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.window)) as session:
+        if not await authenticate(session, creds):
+            print("❌ Authentication failed")
+            return
+        status, result = await test_api_endpoint(session, '/rooms')
+        rooms = [room['room_id'] for room in (result.get('data', []) if status == 200 else [])][:args.rooms]
+        if not rooms:
+            print("❌ No rooms available")
+            return
+        print(f"   Rooms: {len(rooms)}, body ~{args.body_size}B, window {args.window}\n")
+
+        for mode in modes:
+            sender = Sender(mode, session, args.window, args.batch_size)
+            await sender.start()
+            baseline_p50 = None
+            knee = None
+            try:
+                for rate in rates:
+                    run_tag = f"send-bench-{uuid.uuid4().hex[:8]}"
+                    step = await run_rate(sender, rooms, rate, args.duration, args.body_size, run_tag)
+                    p50 = step['latency'].percentile(50)
+                    baseline_p50 = baseline_p50 or p50
+                    climbing = p50 > 2 * baseline_p50 or (rate and step['achieved'] < 0.9 * rate)
+                    if climbing and knee is None:
+                        knee = rate
+                    order = ''
+                    if args.check_order:
+                        violations, checked = 0, 0
+                        for room_id, sent in step['sent_per_room'].items():
+                            v, c = await check_ordering(session, room_id, run_tag, sent)
+                            violations, checked = violations + v, checked + c
+                        order = f"  order {'✅' if not violations else '❌'} {violations}/{checked}"
+                    print(f"   📤 {mode:<10} rate {'max' if not rate else int(rate):>5}  "
+                          f"{step['achieved']:>8.1f} msg/s  p50 {p50 * 1000:>7.1f}ms  "
+                          f"p99 {step['latency'].percentile(99) * 1000:>7.1f}ms  failed {step['failed']}{order}")
+            finally:
+                await sender.close()
+            if knee is not None:
+                print(f"   📈 {mode}: latency starts to climb at {'max' if not knee else int(knee)} msg/s\n")
+            else:
+                print(f"   📈 {mode}: no latency knee within tested rates\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
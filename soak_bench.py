@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Matrix Proxy Soak Test
+Runs steady, realistic traffic for hours: load_bench.py virtual users with think
+time, plus a /ws/extensions listener that is dropped and re-established with
+the same 5 s delay as setupMessageListener() in extension.js. Every interval
+it samples the client heap (tracemalloc), open file descriptors and sockets,
+the proxy's /debug/stats (memory, descriptors, tasks, sessions, sockets) and
+the latency of that window. At the end each series gets a least-squares growth
+rate and a Mann-Kendall trend test; resources that keep growing and latency
+that drifts upwards are flagged (exit code 1).
+
+Usage:
+    python soak_bench.py --duration 4h --interval 60
+    python soak_bench.py --duration 10m --interval 10 --users 5 --output soak.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import aiohttp
+
+from bench_common import LatencyHistogram
+from load_bench import DEFAULT_MIX, LoadStats, VirtualUser, parse_mix
+from matrix_client import BASE_URL
+from proxy_standin import process_stats
+from test_complete_implementation import load_test_credentials, test_api_endpoint
+
+PROXY_BASE = f"{BASE_URL}/api/message-proxy"
+WS_URL = BASE_URL.replace('http', 'ws', 1) + "/ws/extensions"
+PLUGIN_ID = 'ai-ide-matrix-client-plugin-soak'
+# One-sided Mann-Kendall z for p < 0.01
+TREND_Z = 2.326
+
+# Sample key -> (label, unit divisor, unit)
+RESOURCES = {
+    'client_heap_bytes': ('client heap (tracemalloc)', 1 << 20, 'MB'),
+    'client_rss_bytes': ('client RSS', 1 << 20, 'MB'),
+    'client_fds': ('client open FDs', 1, ''),
+    'client_sockets': ('client sockets', 1, ''),
+    'proxy_rss_bytes': ('proxy RSS', 1 << 20, 'MB'),
+    'proxy_open_fds': ('proxy open FDs', 1, ''),
+    'proxy_open_sockets': ('proxy sockets', 1, ''),
+    'proxy_tasks': ('proxy asyncio tasks', 1, ''),
+    'proxy_sessions': ('proxy sessions', 1, ''),
+    'proxy_websockets': ('proxy websockets', 1, ''),
+}
+LATENCY = {
+    'p50_ms': ('latency p50', 1, 'ms'),
+    'p99_ms': ('latency p99', 1, 'ms'),
+}
+
+
+def parse_duration(text):
+    """'90', '90s', '30m', '4h' or '2d' -> seconds"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def format_elapsed(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def mann_kendall_z(values):
+    """Mann-Kendall trend statistic; z > 0 for an increasing series (ties count as no change)"""
+    n = len(values)
+    s = sum((values[j] > values[i]) - (values[j] < values[i])
+            for i in range(n - 1) for j in range(i + 1, n))
+    variance = n * (n - 1) * (2 * n + 5) / 18
+    if s == 0 or variance == 0:
+        return 0.0
+    return (s - math.copysign(1, s)) / math.sqrt(variance)
+
+
+def fit_trend(times, values):
+    """Growth statistics of one series: slope per hour, R^2, MK z, share of rising steps"""
+    slope, r2 = 0.0, 0.0
+    if len(set(values)) > 1:
+        slope = statistics.linear_regression(times, values).slope * 3600
+        r2 = statistics.correlation(times, values) ** 2
+    steps = list(zip(values, values[1:]))
+    return {
+        'start': values[0],
+        'end': values[-1],
+        'slope_per_hour': slope,
+        'r2': r2,
+        'mk_z': mann_kendall_z(values),
+        'rising_steps': sum(b > a for a, b in steps) / len(steps) if steps else 0.0,
+    }
+
+
+def analyze(samples, warmup, min_growth, max_drift):
+    """Trend per resource and latency series, skipping the first ``warmup`` samples"""
+    steady = samples[warmup:]
+    trends = {}
+    if len(steady) < 4:
+        return trends
+    for key, threshold in [*((key, min_growth) for key in RESOURCES), *((key, max_drift) for key in LATENCY)]:
+        points = [(sample['t'], sample[key]) for sample in steady if sample.get(key) is not None]
+        if len(points) < 4:
+            continue
+        trend = fit_trend([t for t, _ in points], [value for _, value in points])
+        growth = (trend['end'] - trend['start']) / max(abs(trend['start']), 1)
+        trend['growth'] = growth
+        trend['flagged'] = trend['mk_z'] >= TREND_Z and growth >= threshold
+        trends[key] = trend
+    return trends
+
+
+async def ws_listener(session, stop, lifetime, reconnect_delay, counters):
+    """Connect, identify and listen like extension.js; drop the socket after ``lifetime`` seconds"""
+    while not stop.is_set():
+        try:
+            async with session.ws_connect(WS_URL) as ws:
+                counters['ws_connects'] += 1
+                await ws.send_json({'type': 'identify', 'plugin_id': PLUGIN_ID})
+                closes_at = time.perf_counter() + lifetime
+                while not stop.is_set():
+                    remaining = closes_at - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    try:
+                        msg = await ws.receive(timeout=min(remaining, 1.0))
+                    except asyncio.TimeoutError:
+                        continue
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    counters['ws_frames'] += 1
+        except aiohttp.ClientError:
+            counters['ws_failures'] += 1
+        try:
+            await asyncio.wait_for(stop.wait(), reconnect_delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+class SoakMonitor:
+    """Interval samples of client, proxy and latency state"""
+
+    def __init__(self, session, frames):
+        self.session = session
+        self.samples = []
+        self.started = time.perf_counter()
+        self.proxy_stats = True
+        tracemalloc.start(frames)
+        self.first_snapshot = None
+        self.last_snapshot = None
+
+    def snapshot(self):
+        # The monitor's own samples are expected to grow, so they are left out
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+
+    async def sample(self, window, counters, warmup):
+        snapshot = self.snapshot()
+        heap = sum(trace.size for trace in snapshot.traces)
+        client = process_stats()
+        combined = LatencyHistogram()
+        for histogram in window.latency.values():
+            combined.merge(histogram)
+        sample = {
+            't': time.perf_counter() - self.started,
+            'requests': combined.total,
+            'errors': sum(window.errors.values()),
+            'p50_ms': combined.percentile(50) * 1000 if combined.total else None,
+            'p99_ms': combined.percentile(99) * 1000 if combined.total else None,
+            'client_heap_bytes': heap,
+            'client_rss_bytes': client['rss_bytes'],
+            'client_fds': client['open_fds'],
+            'client_sockets': client['open_sockets'],
+            **counters,
+        }
+        if self.proxy_stats:
+            status, result = await test_api_endpoint(self.session, '/debug/stats')
+            if status == 200 and result.get('success'):
+                sample.update({f"proxy_{key}": value for key, value in result['data'].items()})
+            else:
+                # A real proxy may not expose /debug/stats; client-side sampling continues
+                self.proxy_stats = False
+                print(f"   ⚠️  No proxy stats (HTTP {status}); sampling the client only")
+        self.samples.append(sample)
+
+        if len(self.samples) == warmup + 1:
+            self.first_snapshot = snapshot
+        elif len(self.samples) > warmup + 1:
+            self.last_snapshot = snapshot
+        return sample
+
+    def heap_growth(self, limit=10):
+        """Source lines whose allocations grew most since the end of warm-up"""
+        if not self.first_snapshot or not self.last_snapshot:
+            return []
+        stats = self.last_snapshot.compare_to(self.first_snapshot, 'lineno')
+        return [(str(stat.traceback[0]), stat.size_diff, stat.count_diff)
+                for stat in stats[:limit] if stat.size_diff > 0]
+
+
+def print_sample(sample):
+    def mb(key):
+        value = sample.get(key)
+        return f"{value / (1 << 20):>8.1f}" if value is not None else f"{'-':>8}"
+
+    def count(key):
+        value = sample.get(key)
+        return f"{value:>7}" if value is not None else f"{'-':>7}"
+
+    p50 = f"{sample['p50_ms']:>7.1f}" if sample['p50_ms'] is not None else f"{'-':>7}"
+    p99 = f"{sample['p99_ms']:>7.1f}" if sample['p99_ms'] is not None else f"{'-':>7}"
+    print(f"   {format_elapsed(sample['t']):>9} {sample['requests']:>7} {sample['errors']:>5} {p50} {p99} "
+          f"{mb('client_heap_bytes')} {count('client_fds')} {count('client_sockets')} "
+          f"{mb('proxy_rss_bytes')} {count('proxy_open_fds')} {count('proxy_tasks')} {sample['ws_connects']:>6}")
+
+
+def print_trends(trends):
+    print("\n📈 Growth trends (after warm-up)")
+    header = (f"   {'series':<28} {'start':>10} {'end':>10} {'per hour':>10} {'R²':>6} "
+              f"{'MK z':>6} {'rising':>7}  verdict")
+    print(header)
+    print("   " + "-" * (len(header) - 3))
+    for key, (label, divisor, unit) in {**RESOURCES, **LATENCY}.items():
+        trend = trends.get(key)
+        if trend is None:
+            continue
+        if key in LATENCY:
+            verdict = '📈 latency drift' if trend['flagged'] else '✅ stable'
+        else:
+            verdict = '📈 monotonic growth' if trend['flagged'] else '✅ stable'
+        print(f"   {label:<28} {trend['start'] / divisor:>8.1f}{unit:<2} {trend['end'] / divisor:>8.1f}{unit:<2} "
+              f"{trend['slope_per_hour'] / divisor:>+8.1f}{unit:<2} {trend['r2']:>6.2f} {trend['mk_z']:>6.2f} "
+              f"{trend['rising_steps']:>6.0%}  {verdict}")
+
+
+async def run_soak(creds, duration, interval, users=5, mix=None, think_time=1.0, ws_lifetime=60.0,
+                   ws_reconnect=5.0, warmup=2, frames=1, min_growth=0.05, max_drift=0.2):
+    """Run the soak; returns (samples, trends, heap growth lines)"""
+    connector = aiohttp.TCPConnector(limit=users * 2)
+    sessions = [aiohttp.ClientSession(connector=connector, connector_owner=False) for _ in range(users + 1)]
+    monitor_session = sessions[-1]
+    monitor = SoakMonitor(monitor_session, frames)
+    counters = {'ws_connects': 0, 'ws_failures': 0, 'ws_frames': 0}
+    stop = asyncio.Event()
+    window = LoadStats()
+    try:
+        async with monitor_session.post(f"{PROXY_BASE}/subscribe", json={
+            'plugin_id': PLUGIN_ID, 'sources': ['element'], 'keywords': [], 'room_ids': []
+        }) as response:
+            if response.status != 200:
+                print(f"   ⚠️  Subscribe failed (HTTP {response.status}); WebSocket frames will not arrive")
+
+        virtual_users = []
+        for index in range(users):
+            user_creds = dict(creds)
+            if creds.get('username_template'):
+                user_creds['username'] = creds['username_template'].format(n=index)
+            virtual_users.append(VirtualUser(index, sessions[index], window, user_creds, mix or DEFAULT_MIX,
+                                             random.Random(index), think_time))
+
+        deadline = time.perf_counter() + duration
+        traffic = [asyncio.ensure_future(user.run(deadline)) for user in virtual_users]
+        listener = asyncio.ensure_future(ws_listener(monitor_session, stop, ws_lifetime, ws_reconnect, counters))
+
+        print(f"   {'elapsed':>9} {'reqs':>7} {'err':>5} {'p50 ms':>7} {'p99 ms':>7} {'heap MB':>8} "
+              f"{'FDs':>7} {'socks':>7} {'proxy MB':>8} {'p.FDs':>7} {'p.tasks':>7} {'ws':>6}")
+        next_sample = monitor.started + interval
+        while True:
+            await asyncio.sleep(max(0.0, next_sample - time.perf_counter()))
+            next_sample += interval
+            window, finished = LoadStats(), window
+            for user in virtual_users:
+                user.stats = window
+            print_sample(await monitor.sample(finished, counters, warmup))
+            if time.perf_counter() >= deadline or all(task.done() for task in traffic):
+                break
+
+        stop.set()
+        await asyncio.gather(*traffic, listener)
+        async with monitor_session.delete(f"{PROXY_BASE}/subscribe/{PLUGIN_ID}"):
+            pass
+    finally:
+        for session in sessions:
+            await session.close()
+        await connector.close()
+
+    trends = analyze(monitor.samples, warmup, min_growth, max_drift)
+    growth = monitor.heap_growth()
+    tracemalloc.stop()
+    return monitor.samples, trends, growth
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Long-running soak test with leak and drift detection")
+    parser.add_argument('--duration', default='1h', help="run time, e.g. 600, 30m, 4h")
+    parser.add_argument('--interval', default='60', help="sampling interval, e.g. 10, 1m")
+    parser.add_argument('--users', type=int, default=5, help="number of virtual users")
+    parser.add_argument('--think-time', type=float, default=1.0, help="mean pause between user actions")
+    parser.add_argument('--mix', action='append', metavar='SCENARIO=WEIGHT',
+                        help=f"scenario weight, may be repeated ({', '.join(DEFAULT_MIX)})")
+    parser.add_argument('--username-template', help="per-user login name, e.g. 'soak{n}'")
+    parser.add_argument('--ws-lifetime', type=float, default=60.0,
+                        help="seconds before the WebSocket is dropped to exercise reconnects")
+    parser.add_argument('--ws-reconnect', type=float, default=5.0,
+                        help="reconnect delay after a close (extension.js uses 5 s)")
+    parser.add_argument('--warmup', type=int, default=2, help="samples excluded from trend fitting")
+    parser.add_argument('--min-growth', type=float, default=0.05,
+                        help="relative growth a monotonic resource trend must reach to be flagged")
+    parser.add_argument('--max-drift', type=float, default=0.2,
+                        help="relative latency increase that counts as drift")
+    parser.add_argument('--frames', type=int, default=1, help="tracemalloc traceback depth")
+    parser.add_argument('--output', help="write samples and trends as JSON")
+    args = parser.parse_args()
+
+    creds = await load_test_credentials()
+    if not creds.get('username') or not creds.get('password'):
+        print("❌ Soak test needs username/password (userdata file or MATRIX_USERNAME/MATRIX_PASSWORD)")
+        sys.exit(2)
+    creds['username_template'] = args.username_template
+    duration, interval = parse_duration(args.duration), parse_duration(args.interval)
+
+    print("🧪 Matrix Proxy Soak Test")
+    print("=" * 60)
+    print(f"   Duration: {format_elapsed(duration)}, interval: {interval:.0f}s, users: {args.users}, "
+          f"WebSocket dropped every {args.ws_lifetime:.0f}s\n")
+    samples, trends, growth = await run_soak(
+        creds, duration, interval, args.users, parse_mix(args.mix), args.think_time, args.ws_lifetime,
+        args.ws_reconnect, args.warmup, args.frames, args.min_growth, args.max_drift)
+
+    if trends:
+        print_trends(trends)
+    else:
+        print(f"\n⚠️  Too few samples after warm-up for trend fitting ({len(samples)} taken, "
+              f"{args.warmup} warm-up); run longer or sample more often")
+    if growth:
+        print("\n🔍 Largest client heap growth since warm-up")
+        for line, size_diff, count_diff in growth:
+            print(f"   {size_diff / 1024:>+9.1f} KiB {count_diff:>+7} blocks  {line}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'samples': samples, 'trends': trends,
+                       'heap_growth': [{'line': line, 'size_diff': size, 'count_diff': count}
+                                       for line, size, count in growth]}, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    flagged = [key for key, trend in trends.items() if trend['flagged']]
+    print("\n" + "=" * 60)
+    if flagged:
+        names = ', '.join({**RESOURCES, **LATENCY}[key][0] for key in flagged)
+        print(f"⚠️  Growing: {names}")
+        sys.exit(1)
+    print("✅ No monotonic growth or latency drift detected")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
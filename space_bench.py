@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Matrix Space Hierarchy Crawl Benchmark
+Builds nested, heavily overlapping space hierarchies of increasing size in an
+in-process stand-in and walks every joined space:
+
+  per_space      what ApiClient.getSpaceHierarchy() callers do today: one
+                 joined space at a time, max_depth=3, every page, nothing
+                 shared between spaces
+  per_space_all  the same without the depth limit, so it finds what the
+                 crawl finds
+  crawl          matrix_client.SpaceCrawler: breadth-first, concurrent, each
+                 space expanded once, summaries cached
+  recrawl        the same crawl again within the cache TTL
+  stale          a recrawl after a share of the cached spaces expired
+
+Reports requests, room summaries transferred, distinct rooms found and
+wall-clock time per hierarchy size.
+
+Usage:
+    python space_bench.py
+    python space_bench.py --sizes 2000,10000,50000 --space-rooms 200 --latency 0.05 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from matrix_client import MatrixProxyClient, SpaceCrawler, SummaryCache
+from proxy_standin import API_PREFIX, LatencyProfile, SyntheticAccount, make_app, start_standin
+
+MODES = ('per_space', 'per_space_all', 'crawl', 'recrawl', 'stale')
+# max_depth standing in for "no limit" in per_space_all
+ALL_LEVELS = 1000
+
+
+class CountingClient(MatrixProxyClient):
+    """Counts hierarchy requests and the room summaries they return"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = 0
+        self.summaries = 0
+
+    async def space_hierarchy(self, *args, **kwargs):
+        self.requests += 1
+        rooms, token = await super().space_hierarchy(*args, **kwargs)
+        self.summaries += len(rooms)
+        return rooms, token
+
+
+async def per_space(client, space_ids, max_depth, page_limit):
+    """Each joined space on its own, as getSpaceHierarchy(spaceId, 3) is used; returns distinct room IDs"""
+    found = set()
+    for space_id in space_ids:
+        token = None
+        while True:
+            rooms, token = await client.space_hierarchy(space_id, max_depth, page_limit, token)
+            found.update(room['room_id'] for room in rooms)
+            if not token:
+                break
+    return found
+
+
+def expire(cache, share, rng):
+    """Expire ``share`` of the expanded spaces, as if they had been fetched a TTL ago"""
+    for space_id in rng.sample(sorted(cache.expanded), int(len(cache.expanded) * share)):
+        cache.expire(space_id)
+
+
+async def run_size(size, args):
+    """All modes against one hierarchy size; returns [(mode, requests, summaries, rooms, spaces, seconds)]"""
+    account = SyntheticAccount(rooms=args.joined, space_rooms=args.space_rooms, space_fanout=args.space_fanout,
+                               space_pool=size)
+    latency = LatencyProfile(per_route={'space_hierarchy': args.latency})
+    runner, base_url = await start_standin(make_app(account, latency))
+    rows = []
+    try:
+        async with CountingClient(api_base=f"{base_url}{API_PREFIX}") as client:
+            roots = [room.room_id for room in await client.rooms() if room.is_space]
+            cache = SummaryCache(ttl=args.ttl)
+            crawler = SpaceCrawler(client, cache, args.concurrency, args.page_limit)
+            for mode in MODES:
+                client.requests = client.summaries = 0
+                if mode == 'stale':
+                    expire(cache, args.stale, random.Random(size))
+                started = time.perf_counter()
+                if mode.startswith('per_space'):
+                    max_depth = ALL_LEVELS if mode == 'per_space_all' else 3
+                    found = await per_space(client, roots, max_depth, args.page_limit)
+                    spaces = sum(1 for room_id in found if account.space_index(room_id) is not None)
+                else:
+                    tree = await crawler.crawl(roots)
+                    found, spaces = tree.rooms, len(tree.spaces)
+                elapsed = time.perf_counter() - started
+                rows.append((mode, client.requests, client.summaries, len(found), spaces, elapsed))
+    finally:
+        await runner.cleanup()
+    return rows
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Space hierarchy crawl time and request count vs hierarchy size")
+    parser.add_argument('--sizes', default='1000,5000,20000',
+                        help="comma-separated numbers of distinct rooms the spaces draw from")
+    parser.add_argument('--joined', type=int, default=500, help="joined rooms (every 50th is a space)")
+    parser.add_argument('--space-rooms', type=int, default=100, help="rooms in each space")
+    parser.add_argument('--space-fanout', type=int, default=3, help="subspaces in each space")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds per hierarchy request")
+    parser.add_argument('--concurrency', type=int, default=8, help="crawler requests in flight")
+    parser.add_argument('--page-limit', type=int, default=50, help="summaries per hierarchy page")
+    parser.add_argument('--ttl', type=float, default=300.0, help="summary cache TTL, seconds")
+    parser.add_argument('--stale', type=float, default=0.1, help="share of the expanded spaces expired before 'stale'")
+    args = parser.parse_args()
+
+    print("🧪 Space Hierarchy Crawl Benchmark")
+    print("=" * 60)
+    print(f"   {args.joined // 50} joined spaces, {args.space_rooms} rooms and {args.space_fanout} subspaces "
+          f"per space, {args.latency * 1000:.0f}ms per request, concurrency {args.concurrency}\n")
+    header = (f"   {'size':>7} {'mode':<13} {'requests':>9} {'summaries':>10} {'rooms':>7} {'spaces':>7} "
+              f"{'time':>10}")
+    print(header)
+    print("   " + "-" * (len(header) - 3))
+    for size in (int(value) for value in args.sizes.split(',')):
+        for mode, requests, summaries, rooms, spaces, elapsed in await run_size(size, args):
+            print(f"   {size:>7} {mode:<13} {requests:>9} {summaries:>10} {rooms:>7} {spaces:>7} "
+                  f"{elapsed * 1000:>8.0f}ms")
+        print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
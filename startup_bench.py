@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Matrix Client Startup Benchmark
+Measures time-to-first-room-list from a new process-like start (new HTTP
+session, credentials read from disk) for:
+
+  cold  password /login, then the session is saved to the session cache
+  warm  the cached access token is restored through /restore_session
+
+each followed by the extension.js connect sequence, either strictly in order
+(configure -> connect -> subscribe -> query rooms, as connectToMatrix() used to
+run) or overlapped (configure -> connect alongside subscribe, the WebSocket
+opening while the rooms load). Scenarios are interleaved so drift in the proxy
+affects all of them alike.
+
+Every cold run is a real login; against a homeserver each creates a device,
+so keep --iterations small there.
+
+Usage (start proxy_standin.py first, e.g. with homeserver-like costs):
+    python proxy_standin.py --latency login=0.3 --latency adapter_connect=0.4 --default-latency 0.02
+    python startup_bench.py --iterations 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+from bench_common import authenticate
+from matrix_client import BASE_URL
+from test_complete_implementation import load_test_credentials
+
+PROXY_BASE = f"{BASE_URL}/api/message-proxy"
+WS_URL = BASE_URL.replace('http', 'ws', 1) + "/ws/extensions"
+PLUGIN_ID = 'ai-ide-matrix-client-plugin-startup'
+SCENARIOS = (('cold', 'sequential'), ('cold', 'overlapped'), ('warm', 'sequential'), ('warm', 'overlapped'))
+STAGES = ('auth', 'adapter', 'subscribe', 'rooms')
+
+
+async def _post(session, path, data=None):
+    async with session.post(f"{PROXY_BASE}{path}", json=data) as response:
+        result = await response.json()
+        if response.status != 200 or not result.get('success', True):
+            raise RuntimeError(f"POST {path}: HTTP {response.status}: {result.get('error', result)}")
+        return result
+
+
+async def configure_and_connect(session, creds):
+    await _post(session, '/adapters/element/configure', {
+        'homeserver': creds['homeserver'],
+        'access_token': creds['access_token'],
+        'user_id': creds['user_id'],
+        'device_id': creds['device_id']
+    })
+    await _post(session, '/adapters/element/connect')
+
+
+async def subscribe(session):
+    return await _post(session, '/subscribe', {
+        'plugin_id': PLUGIN_ID, 'sources': ['element'], 'keywords': [], 'room_ids': []
+    })
+
+
+async def load_rooms(session):
+    result = await _post(session, '/query', {
+        'plugin_id': PLUGIN_ID, 'sources': ['element'], 'query_type': 'rooms', 'limit': 100
+    })
+    return result.get('rooms', [])
+
+
+async def open_listener(session):
+    """Open and identify on /ws/extensions as setupMessageListener() does"""
+    ws = await session.ws_connect(WS_URL)
+    await ws.send_json({'type': 'identify', 'plugin_id': PLUGIN_ID})
+    return ws
+
+
+async def start_once(warm, overlapped, password_creds):
+    """One startup; returns ({stage: seconds since start}, rooms, restored from cache)"""
+    marks = {}
+    started = time.perf_counter()
+
+    def mark(stage):
+        marks[stage] = time.perf_counter() - started
+
+    async with aiohttp.ClientSession() as session:
+        if warm:
+            creds = await load_test_credentials()
+            cached = creds.get('from_cache', False)
+        else:
+            creds, cached = dict(password_creds, access_token=None, device_id=None), False
+        if not await authenticate(session, creds):
+            raise RuntimeError("authentication failed")
+        # authenticate() drops 'from_cache' when the cached token was rejected
+        cached = cached and creds.get('from_cache', False)
+        mark('auth')
+
+        async def adapter():
+            await configure_and_connect(session, creds)
+            mark('adapter')
+
+        async def subscription():
+            await subscribe(session)
+            mark('subscribe')
+
+        if overlapped:
+            await asyncio.gather(adapter(), subscription())
+        else:
+            await adapter()
+            await subscription()
+        # Both versions of connectToMatrix() open the WebSocket without waiting for it
+        listener = asyncio.ensure_future(open_listener(session))
+        rooms = await load_rooms(session)
+        mark('rooms')
+
+        # Untimed: let the WebSocket finish opening, then disconnect like disconnectFromMatrix()
+        ws = await listener
+        await ws.close()
+        async with session.delete(f"{PROXY_BASE}/subscribe/{PLUGIN_ID}"):
+            pass
+        await _post(session, '/adapters/element/disconnect')
+    return marks, len(rooms), cached
+
+
+def _p95(values):
+    return statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Time to first room list: cold login vs warm session restore")
+    parser.add_argument('--iterations', type=int, default=20, help="startups per scenario")
+    parser.add_argument('--warmup', type=int, default=1, help="untimed startups per scenario first")
+    args = parser.parse_args()
+
+    password_creds = await load_test_credentials()
+    scenarios = list(SCENARIOS)
+    if not (password_creds.get('username') and password_creds.get('password')):
+        print("⚠️  No username/password: skipping cold login scenarios")
+        scenarios = [scenario for scenario in scenarios if scenario[0] == 'warm']
+
+    print("🧪 Matrix Client Startup Benchmark")
+    print("=" * 60)
+    print(f"   {args.iterations} startups per scenario against {BASE_URL}\n")
+
+    samples = {scenario: [] for scenario in scenarios}
+    room_counts, restored = {}, {scenario: 0 for scenario in scenarios}
+    for iteration in range(args.warmup + args.iterations):
+        # Rotate the order so no scenario always follows the same one
+        shift = iteration % len(scenarios)
+        for scenario in scenarios[shift:] + scenarios[:shift]:
+            try:
+                marks, rooms, cached = await start_once(scenario[0] == 'warm', scenario[1] == 'overlapped',
+                                                        password_creds)
+            except (RuntimeError, aiohttp.ClientError) as e:
+                print(f"   ❌ {scenario[0]} / {scenario[1]}: {e}")
+                return
+            if iteration >= args.warmup:
+                samples[scenario].append(marks)
+                room_counts[scenario] = rooms
+                restored[scenario] += cached
+
+    print(f"   {'auth':<6} {'connect':<11} {'auth ms':>8} {'adapter':>8} {'subscr.':>8} "
+          f"{'rooms p50':>10} {'rooms p95':>10} {'from cache':>11}")
+    print("   " + "-" * 78)
+    for scenario in scenarios:
+        runs = samples[scenario]
+        medians = {stage: statistics.median(run[stage] for run in runs) * 1000 for stage in STAGES}
+        ttfrl = [run['rooms'] * 1000 for run in runs]
+        cache = f"{restored[scenario]}/{len(runs)}" if scenario[0] == 'warm' else '-'
+        print(f"   {scenario[0]:<6} {scenario[1]:<11} {medians['auth']:>8.1f} {medians['adapter']:>8.1f} "
+              f"{medians['subscribe']:>8.1f} {statistics.median(ttfrl):>8.1f}ms {_p95(ttfrl):>8.1f}ms {cache:>11}")
+
+    baseline = samples.get(('cold', 'sequential'))
+    best = samples.get(('warm', 'overlapped'))
+    if baseline and best:
+        before = statistics.median(run['rooms'] for run in baseline)
+        after = statistics.median(run['rooms'] for run in best)
+        print(f"\n🏁 First room list ({room_counts[('warm', 'overlapped')]} rooms): "
+              f"{before * 1000:.1f}ms cold/sequential -> {after * 1000:.1f}ms warm/overlapped "
+              f"({before / after:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Matrix Subscription Filter Scaling Benchmark
+Registers thousands of /api/message-proxy/subscribe subscriptions with a mix
+of filters (none, room_ids, keywords, both), keeps a WebSocket open on
+/ws/extensions for a sample of them and injects tagged messages through
+/api/message-proxy/send into rooms and with words chosen so that filters hit.
+For each subscription count it reports:
+
+  - per-message dispatch cost on the proxy (matching and whole dispatch, from
+    the stand-in's /debug/stats; n/a on proxies without it)
+  - WebSocket fan-out latency: send -> frame received, per delivery and until
+    the last recipient of a message got it
+  - delivery correctness for the sampled sockets against the reference
+    filter semantics (MessageHub.matches): missing, unexpected and duplicate
+    frames
+
+Runs with --in-process against stand-ins using each matching implementation
+(indexed and the linear scan), or with --live against the proxy at
+MATRIX_PROXY_URL. --live posts the tagged messages into the account's real
+rooms, so use it only with a test account.
+
+Usage:
+    python subscription_bench.py --in-process indexed,linear --counts 1000,5000,20000 --sockets 200
+    python subscription_bench.py --live --counts 100,1000,5000
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import string
+import time
+
+import aiohttp
+
+from bench_common import LatencyHistogram, authenticate
+from matrix_client import BASE_URL, MatrixProxyClient, ProxyError
+from proxy_standin import API_PREFIX, MessageHub, SyntheticAccount, make_app, start_standin
+from test_complete_implementation import load_test_credentials
+
+DEFAULT_MIX = {'all': 0.02, 'rooms': 0.5, 'keywords': 0.28, 'both': 0.2}
+# Keywords are letters only, so they never match inside a tag
+TAG = re.compile(r'^~(\d+)~(\d+)~')
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown filter kind '{name}' (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight)
+    return mix
+
+
+class Workload:
+    """Subscriptions and messages, drawn so that room and keyword filters hit at realistic rates"""
+
+    def __init__(self, rooms, vocabulary, seed=0):
+        self.rng = random.Random(seed)
+        self.rooms = rooms
+        self.words = sorted({''.join(self.rng.choice(string.ascii_lowercase) for _ in range(self.rng.randint(4, 8)))
+                             for _ in range(vocabulary)})
+        # Zipf-like popularity: a few busy rooms and common words, a long tail of quiet ones
+        self.room_weights = [1 / (rank + 1) for rank in range(len(rooms))]
+        self.word_weights = [1 / (rank + 1) for rank in range(len(self.words))]
+
+    def subscription(self, kind):
+        """(keywords, room_ids) for a filter kind"""
+        keywords, room_ids = [], []
+        if kind in ('rooms', 'both'):
+            room_ids = sorted(set(self.rng.choices(self.rooms, self.room_weights, k=self.rng.randint(1, 5))))
+        if kind in ('keywords', 'both'):
+            keywords = sorted(set(self.rng.sample(self.words, self.rng.randint(1, 3))))
+        return keywords, room_ids
+
+    def message(self, run, seq):
+        """(room_id, text) for a tagged message"""
+        room_id = self.rng.choices(self.rooms, self.room_weights)[0]
+        words = self.rng.choices(self.words, self.word_weights, k=self.rng.randint(5, 20))
+        return room_id, f"~{run}~{seq}~ " + ' '.join(words)
+
+
+class DeliveryLog:
+    """Frames received per sampled subscription"""
+
+    def __init__(self, run):
+        self.run = run
+        self.sent = {}       # seq -> send time
+        self.received = {}   # plugin_id -> {seq: count}
+        self.latency = LatencyHistogram()
+        self.last = {}       # seq -> latest delivery time
+        self.expected_total = None
+        self.delivered = 0
+        self.done = asyncio.Event()
+
+    def on_frame(self, plugin_id, frame, received_at):
+        data = frame.get('data', frame) if frame.get('type') == 'messageEvent' else None
+        text = ((data or {}).get('content') or {}).get('text') or ''
+        match = TAG.match(text)
+        if not match or int(match.group(1)) != self.run:
+            return
+        seq = int(match.group(2))
+        counts = self.received.setdefault(plugin_id, {})
+        counts[seq] = counts.get(seq, 0) + 1
+        if seq in self.sent:
+            self.latency.record(received_at - self.sent[seq])
+            self.last[seq] = max(self.last.get(seq, 0.0), received_at)
+        self.delivered += 1
+        if self.expected_total is not None and self.delivered >= self.expected_total:
+            self.done.set()
+
+
+async def listen(ws, plugin_id, log):
+    async for msg in ws:
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            log.on_frame(plugin_id, msg.json(), time.perf_counter())
+        elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+            break
+
+
+async def read_hub_stats(client):
+    """Dispatch counters from /debug/stats (stand-in only); None when unavailable"""
+    try:
+        result = await client.request('GET', '/debug/stats')
+    except (ProxyError, aiohttp.ClientError):
+        return None
+    data = result.get('data', {})
+    return data if 'hub_dispatched' in data else None
+
+
+async def bounded(concurrency, calls):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await call
+
+    return await asyncio.gather(*(run(call) for call in calls))
+
+
+async def run_count(session, base_url, workload, count, args, run):
+    """One subscription count; returns a result dict"""
+    proxy_base = f"{base_url}/api/message-proxy"
+    ws_url = base_url.replace('http', 'ws', 1) + "/ws/extensions"
+    client = MatrixProxyClient(f"{base_url}{API_PREFIX}", session)
+    kinds = list(args.mix)
+    weights = [args.mix[kind] for kind in kinds]
+
+    subscriptions = {}
+    for index in range(count):
+        keywords, room_ids = workload.subscription(workload.rng.choices(kinds, weights)[0])
+        subscriptions[f"subbench-{run}-{index}"] = {'sources': ['element'], 'keywords': keywords,
+                                                    'room_ids': room_ids}
+
+    async def subscribe(plugin_id, subscription):
+        async with session.post(f"{proxy_base}/subscribe", json={'plugin_id': plugin_id, **subscription}) as response:
+            await response.read()
+            if response.status != 200:
+                raise RuntimeError(f"subscribe {plugin_id}: HTTP {response.status}")
+
+    async def unsubscribe(plugin_id):
+        async with session.delete(f"{proxy_base}/subscribe/{plugin_id}") as response:
+            await response.read()
+
+    await bounded(args.concurrency, (subscribe(plugin_id, sub) for plugin_id, sub in subscriptions.items()))
+    # Reference matching state for every subscription, lower-cased as the proxy stores it
+    reference = {plugin_id: {'sources': set(sub['sources']), 'keywords': [k.lower() for k in sub['keywords']],
+                             'room_ids': set(sub['room_ids'])} for plugin_id, sub in subscriptions.items()}
+
+    log = DeliveryLog(run)
+    sampled = workload.rng.sample(sorted(subscriptions), min(args.sockets, count))
+    sockets, listeners = [], []
+    try:
+        for plugin_id in sampled:
+            ws = await session.ws_connect(ws_url)
+            await ws.send_json({'type': 'identify', 'plugin_id': plugin_id})
+            sockets.append(ws)
+            listeners.append(asyncio.ensure_future(listen(ws, plugin_id, log)))
+        # Identify frames get no reply, so give the proxy a moment to register the sockets
+        await asyncio.sleep(0.2)
+
+        before = await read_hub_stats(client)
+        messages, expected = [], {}
+        for seq in range(args.messages):
+            room_id, text = workload.message(run, seq)
+            messages.append((seq, room_id, text))
+            event = {'room_id': room_id, 'body': text}
+            expected[seq] = {plugin_id for plugin_id, sub in reference.items() if MessageHub.matches(sub, event)}
+
+        async def send(seq, room_id, text):
+            log.sent[seq] = time.perf_counter()
+            async with session.post(f"{proxy_base}/send", json={
+                'plugin_id': sampled[0] if sampled else 'subbench',
+                'source': 'element', 'target_type': 'room', 'target_id': room_id, 'text': text, 'attachments': []
+            }) as response:
+                await response.read()
+                return response.status == 200
+
+        sampled_set = set(sampled)
+        log.expected_total = sum(len(recipients & sampled_set) for recipients in expected.values())
+        if log.delivered >= log.expected_total:
+            log.done.set()
+        started = time.perf_counter()
+        tasks = []
+        for seq, room_id, text in messages:
+            delay = started + seq / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(seq, room_id, text)))
+        failed = (await asyncio.gather(*tasks)).count(False)
+        try:
+            await asyncio.wait_for(log.done.wait(), args.drain)
+        except asyncio.TimeoutError:
+            pass
+        after = await read_hub_stats(client)
+    finally:
+        for ws in sockets:
+            await ws.close()
+        for listener in listeners:
+            listener.cancel()
+        await bounded(args.concurrency, (unsubscribe(plugin_id) for plugin_id in subscriptions))
+
+    missing = unexpected = duplicates = 0
+    for plugin_id in sampled:
+        counts = log.received.get(plugin_id, {})
+        wanted = {seq for seq, recipients in expected.items() if plugin_id in recipients}
+        missing += len(wanted - set(counts))
+        unexpected += len(set(counts) - wanted)
+        duplicates += sum(count - 1 for count in counts.values())
+
+    dispatch = None
+    if before and after and after['hub_dispatched'] > before['hub_dispatched']:
+        dispatched = after['hub_dispatched'] - before['hub_dispatched']
+        dispatch = {
+            'matching': after.get('hub_matching'),
+            'match_us': (after['hub_match_seconds'] - before['hub_match_seconds']) / dispatched * 1e6,
+            'dispatch_us': (after['hub_dispatch_seconds'] - before['hub_dispatch_seconds']) / dispatched * 1e6,
+        }
+    last = sorted(log.last[seq] - log.sent[seq] for seq in log.last)
+    return {
+        'subscriptions': count,
+        'sockets': len(sampled),
+        'recipients': sum(len(recipients) for recipients in expected.values()) / max(1, len(expected)),
+        'failed_sends': failed,
+        'dispatch': dispatch,
+        'p50': log.latency.percentile(50),
+        'p99': log.latency.percentile(99),
+        'last_p99': last[min(len(last) - 1, int(len(last) * 0.99))] if last else None,
+        'missing': missing,
+        'unexpected': unexpected,
+        'duplicates': duplicates,
+    }
+
+
+def print_row(label, result):
+    dispatch = result['dispatch']
+    cost = (f"{dispatch['match_us']:>9.0f}us {dispatch['dispatch_us']:>9.0f}us" if dispatch
+            else f"{'n/a':>11} {'n/a':>11}")
+    last = f"{result['last_p99'] * 1000:>7.1f}ms" if result['last_p99'] is not None else f"{'-':>9}"
+    verdict = '✅' if not (result['missing'] or result['unexpected'] or result['duplicates']) else '❌'
+    print(f"   {label:<9} {result['subscriptions']:>7} {result['recipients']:>8.1f} {cost} "
+          f"{result['p50'] * 1000:>7.1f}ms {result['p99'] * 1000:>7.1f}ms {last} "
+          f"{result['missing']:>5}/{result['unexpected']}/{result['duplicates']} {verdict}")
+
+
+async def run_against(base_url, label, rooms, args):
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency + args.sockets)) as session:
+        for run, count in enumerate(int(value) for value in args.counts.split(',')):
+            workload = Workload(rooms, args.vocabulary, seed=args.seed + count)
+            print_row(label, await run_count(session, base_url, workload, count, args, run + 1))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Subscription filter matching and WebSocket fan-out vs subscriptions")
+    parser.add_argument('--counts', default='100,1000,5000', help="comma-separated subscription counts")
+    parser.add_argument('--sockets', type=int, default=100, help="subscriptions with a live WebSocket (sampled)")
+    parser.add_argument('--messages', type=int, default=300, help="messages injected per count")
+    parser.add_argument('--rate', type=float, default=100.0, help="messages per second")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="filter kinds as all=W,rooms=W,keywords=W,both=W")
+    parser.add_argument('--vocabulary', type=int, default=500, help="distinct words in messages and keywords")
+    parser.add_argument('--rooms', type=int, default=200, help="rooms for --in-process stand-ins")
+    parser.add_argument('--in-process', metavar='MATCHING',
+                        help="run in-process stand-ins, e.g. indexed,linear")
+    parser.add_argument('--live', action='store_true',
+                        help="run against the proxy at MATRIX_PROXY_URL, sending into the account's real rooms")
+    parser.add_argument('--concurrency', type=int, default=50, help="parallel subscribe/unsubscribe calls")
+    parser.add_argument('--drain', type=float, default=10.0, help="seconds to wait for the last frames")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if not (args.in_process or args.live):
+        raise SystemExit("Pass --in-process indexed,linear to run against stand-ins, or --live to send "
+                         "messages into the real rooms of the proxy at MATRIX_PROXY_URL")
+
+    print("🧪 Subscription Filter Scaling Benchmark")
+    print("=" * 60)
+    mix = ', '.join(f"{kind} {weight:g}" for kind, weight in args.mix.items())
+    print(f"   {args.messages} messages at {args.rate:.0f}/s, {args.sockets} sockets, filters: {mix}\n")
+    header = (f"   {'matching':<9} {'subs':>7} {'recip.':>8} {'match/msg':>11} {'dispatch':>11} "
+              f"{'p50':>9} {'p99':>9} {'last p99':>9} {'miss/unexp/dup':>16}")
+    print(header)
+    print("   " + "-" * (len(header) - 3))
+
+    if args.in_process:
+        account = SyntheticAccount(rooms=args.rooms)
+        rooms = [room['room_id'] for room in account.rooms()]
+        for matching in args.in_process.split(','):
+            if matching not in ('indexed', 'linear'):
+                raise SystemExit(f"Unknown matching '{matching}' (choose from indexed, linear)")
+            runner, base_url = await start_standin(make_app(account, matching=matching))
+            try:
+                await run_against(base_url, matching, rooms, args)
+            finally:
+                await runner.cleanup()
+        return
+
+    creds = await load_test_credentials()
+    async with aiohttp.ClientSession() as session:
+        if not await authenticate(session, creds):
+            print("❌ Login failed (userdata file or MATRIX_USERNAME/MATRIX_PASSWORD)")
+            return
+        rooms = [room.room_id for room in await MatrixProxyClient(session=session).rooms()]
+    if not rooms:
+        print("❌ No rooms to send to")
+        return
+    await run_against(BASE_URL, 'proxy', rooms, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,15 +8,16 @@ import asyncio
 import aiohttp
 import json
 import os
+import time
 from pathlib import Path
 
+from matrix_client import API_BASE, forget_session, save_session, with_cached_session
+
 # Test configuration
-BASE_URL = "http://localhost:8000"
-API_BASE = f"{BASE_URL}/api/message-proxy/element"
 USERDATA_FILE = Path(__file__).parent / "userdata"
 
 async def load_test_credentials():
-    """Load test credentials from userdata file"""
+    """Load test credentials from userdata file, with any cached session"""
     try:
         if USERDATA_FILE.exists():
             with open(USERDATA_FILE, 'r') as f:
@@ -33,40 +34,54 @@ async def load_test_credentials():
                     else:
                         user_id = username
                     
-                    return {
+                    return with_cached_session({
                         'homeserver': homeserver,
                         'username': username,
                         'password': password,
                         'user_id': user_id,
                         'access_token': None,
                         'device_id': None
-                    }
+                    })
     except Exception as e:
         print(f"Could not load credentials from userdata: {e}")
     
-    return {
+    return with_cached_session({
         'homeserver': os.getenv('MATRIX_HOMESERVER', 'https://matrix.org'),
+        'username': os.getenv('MATRIX_USERNAME'),
+        'password': os.getenv('MATRIX_PASSWORD'),
         'user_id': os.getenv('MATRIX_USER_ID'),
         'access_token': os.getenv('MATRIX_ACCESS_TOKEN'),
         'device_id': os.getenv('MATRIX_DEVICE_ID')
-    }
+    })
+
+async def read_json(response, trace_ctx=None):
+    """Read and decode a JSON response, noting when each step finished in trace_ctx"""
+    await response.read()
+    if trace_ctx is not None:
+        trace_ctx['body_read'] = time.perf_counter()
+    result = await response.json()
+    if trace_ctx is not None:
+        trace_ctx['decoded'] = time.perf_counter()
+    return result
 
 async def test_api_endpoint(session, endpoint, method='GET', data=None):
     """Test a single API endpoint"""
     url = f"{API_BASE}{endpoint}"
-    
+    # Passed to any aiohttp TraceConfig on the session (see request_trace.py)
+    trace_ctx = {'endpoint': endpoint, 'method': method}
+
     try:
         if method == 'GET':
-            async with session.get(url) as response:
-                result = await response.json()
+            async with session.get(url, trace_request_ctx=trace_ctx) as response:
+                result = await read_json(response, trace_ctx)
                 return response.status, result
         elif method == 'POST':
-            async with session.post(url, json=data) as response:
-                result = await response.json()
+            async with session.post(url, json=data, trace_request_ctx=trace_ctx) as response:
+                result = await read_json(response, trace_ctx)
                 return response.status, result
         elif method == 'PUT':
-            async with session.put(url, json=data) as response:
-                result = await response.json()
+            async with session.put(url, json=data, trace_request_ctx=trace_ctx) as response:
+                result = await read_json(response, trace_ctx)
                 return response.status, result
     except Exception as e:
         return None, {'error': str(e)}
@@ -103,10 +118,38 @@ async def test_complete_matrix_client():
             test_results['failed'] += 1
             return test_results
         
-        # Test 2: Authentication System
-        if creds.get('username') and creds.get('password'):
+        # Test 2: Authentication System (restore the configured or cached session, else log in)
+        has_password = bool(creds.get('username') and creds.get('password'))
+        if not (has_password or (creds.get('user_id') and creds.get('access_token'))):
+            print("\n2️⃣ Skipping authentication test (no credentials)")
+            return test_results
+        test_results['total'] += 1
+
+        restored = False
+        if creds.get('user_id') and creds.get('access_token'):
+            print("\n2️⃣ Testing Session Restoration...")
+            status, result = await test_api_endpoint(session, '/restore_session', 'POST', {
+                'homeserver_url': creds['homeserver'],
+                'user_id': creds['user_id'],
+                'access_token': creds['access_token'],
+                'device_id': creds['device_id']
+            })
+            if status == 200 and result.get('success'):
+                print("   ✅ Session restored" + (" from cache" if creds.get('from_cache') else ""))
+                print(f"   👤 User: {creds['user_id']}")
+                test_results['passed'] += 1
+                restored = True
+            elif creds.pop('from_cache', False) and has_password:
+                # The cached token was rejected: forget it and log in below
+                print("   ⚠️  Cached session rejected, logging in again")
+                forget_session(creds)
+            else:
+                print(f"   ❌ Session restoration failed: {result.get('error', 'Unknown error')}")
+                test_results['failed'] += 1
+                return test_results
+
+        if not restored:
             print("\n2️⃣ Testing Authentication System...")
-            test_results['total'] += 1
             status, result = await test_api_endpoint(session, '/login', 'POST', {
                 'homeserver': creds['homeserver'],
                 'username': creds['username'],
@@ -119,14 +162,12 @@ async def test_complete_matrix_client():
                 creds['access_token'] = result.get('access_token')
                 creds['device_id'] = result.get('device_id')
                 creds['user_id'] = result.get('user_id')
+                save_session(creds)
                 test_results['passed'] += 1
             else:
                 print(f"   ❌ Login failed: {result.get('error', 'Unknown error')}")
                 test_results['failed'] += 1
                 return test_results
-        else:
-            print("\n2️⃣ Skipping authentication test (no credentials)")
-            return test_results
         
         # Test 3: Room List and Navigation
         print("\n3️⃣ Testing Room List and Navigation...")
@@ -299,7 +340,19 @@ async def test_complete_matrix_client():
         # Test 8: Logout
         print("\n8️⃣ Testing Logout...")
         test_results['total'] += 1
-        status, result = await test_api_endpoint(session, '/logout', 'POST')
+        logout_data = None
+        if has_password:
+            # End a throwaway session rather than the cached one, so the next run can restore it
+            status, result = await test_api_endpoint(session, '/login', 'POST', {
+                'homeserver': creds['homeserver'],
+                'username': creds['username'],
+                'password': creds['password']
+            })
+            if status == 200 and result.get('success'):
+                logout_data = {'access_token': result.get('access_token')}
+        status, result = await test_api_endpoint(session, '/logout', 'POST', logout_data)
+        if logout_data is None:
+            forget_session(creds)
         if status == 200:
             print("   ✅ Logout successful")
             test_results['passed'] += 1
@@ -10,15 +10,13 @@ import json
 import os
 from pathlib import Path
 
-# Test configuration
-BASE_URL = "http://localhost:8000"
-API_BASE = f"{BASE_URL}/api/message-proxy/element"
+from matrix_client import API_BASE, forget_session, save_session, with_cached_session
 
 # Test user credentials (from userdata file)
 USERDATA_FILE = Path(__file__).parent / "userdata"
 
 async def load_test_credentials():
-    """Load test credentials from userdata file"""
+    """Load test credentials from userdata file, with any cached session"""
     try:
         # Try to read plain text format (homeserver, username, password)
         if USERDATA_FILE.exists():
@@ -37,24 +35,26 @@ async def load_test_credentials():
                     else:
                         user_id = username
 
-                    return {
+                    return with_cached_session({
                         'homeserver': homeserver,
                         'username': username,
                         'password': password,
                         'user_id': user_id,
                         'access_token': None,
                         'device_id': None
-                    }
+                    })
     except Exception as e:
         print(f"Could not load credentials from userdata: {e}")
 
     # Fallback to environment variables or defaults
-    return {
+    return with_cached_session({
         'homeserver': os.getenv('MATRIX_HOMESERVER', 'https://matrix.org'),
+        'username': os.getenv('MATRIX_USERNAME'),
+        'password': os.getenv('MATRIX_PASSWORD'),
         'user_id': os.getenv('MATRIX_USER_ID'),
         'access_token': os.getenv('MATRIX_ACCESS_TOKEN'),
         'device_id': os.getenv('MATRIX_DEVICE_ID')
-    }
+    })
 
 async def test_api_endpoint(session, endpoint, method='GET', data=None):
     """Test a single API endpoint"""
@@ -99,7 +99,8 @@ async def test_matrix_client():
             print(f"   ❌ Message proxy unavailable: {result}")
             return
 
-        # Test 2: Test login (if we have credentials)
+        # Test 2: Test login (if we have credentials), restoring a configured or cached session first
+        restored = False
         if creds['user_id'] and creds['access_token']:
             print("\n2️⃣ Testing Session Restoration...")
             status, result = await test_api_endpoint(session, '/restore_session', 'POST', {
@@ -113,10 +114,15 @@ async def test_matrix_client():
                 print("   ✅ Session restored successfully")
                 user_info = result.get('user', {})
                 print(f"   👤 User: {user_info.get('display_name', user_info.get('user_id', 'Unknown'))}")
+                restored = True
+            elif creds.pop('from_cache', False) and creds.get('username') and creds.get('password'):
+                # The cached token was rejected: forget it and log in below
+                print("   ⚠️  Cached session rejected, logging in again")
+                forget_session(creds)
             else:
                 print(f"   ❌ Session restoration failed: {result.get('error', 'Unknown error')}")
                 return
-        elif creds.get('username') and creds.get('password'):
+        if not restored and creds.get('username') and creds.get('password'):
             print("\n2️⃣ Testing Login...")
             status, result = await test_api_endpoint(session, '/login', 'POST', {
                 'homeserver': creds['homeserver'],
@@ -133,10 +139,11 @@ async def test_matrix_client():
                 creds['access_token'] = result.get('access_token')
                 creds['device_id'] = result.get('device_id')
                 creds['user_id'] = result.get('user_id')
+                save_session(creds)
             else:
                 print(f"   ❌ Login failed: {result.get('error', 'Unknown error')}")
                 return
-        else:
+        elif not restored:
             print("\n2️⃣ Skipping authentication test (no credentials available)")
             print("   ℹ️  To test with real credentials, add them to userdata/ directory")
             return
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Matrix Proxy Traffic Capture and Replay
+Records the requests made through test_api_endpoint() and the frames seen on
+/ws/extensions into a compact, memory-mappable file, and replays
+a capture against the proxy or the stand-in at 1x, Nx or maximum speed while
+keeping inter-request timing. Credentials are scrubbed when recording and
+filled back in from load_test_credentials() when replaying.
+
+File format: an 8-byte magic header followed by records of
+``<kind:u8><offset_seconds:f64><length:u32>`` and ``length`` bytes of JSON.
+A file holds one recording session; recording again replaces it. Each record
+is flushed as it is written, so an interrupted recording keeps what it saw.
+
+Usage:
+    python traffic_capture.py record session.mxcap test_complete_implementation:test_complete_matrix_client
+    python traffic_capture.py record load.mxcap load_bench:main -- --users 20 --duration 30
+    python traffic_capture.py replay session.mxcap --speed 4 --remap-rooms
+    python traffic_capture.py show session.mxcap
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+
+import aiohttp
+
+from bench_common import LatencyHistogram
+from matrix_client import BASE_URL
+from test_complete_implementation import load_test_credentials, test_api_endpoint
+
+MAGIC = b'MXCAP\x00\x01\x00'
+RECORD = struct.Struct('<BdI')
+
+KIND_META = 0
+KIND_HTTP = 1
+KIND_WS_SEND = 2
+KIND_WS_RECV = 3
+
+SECRET_KEYS = {'password', 'access_token', 'refresh_token', 'token'}
+REDACTED = '<redacted>'
+_ROOM_SEGMENT = re.compile(r'/(![^/?]+)')
+WS_URL = BASE_URL.replace('http', 'ws', 1) + "/ws/extensions"
+
+
+def scrub(value):
+    """Copy of ``value`` with credential fields replaced"""
+    if isinstance(value, dict):
+        return {key: REDACTED if key in SECRET_KEYS and item else scrub(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+
+def endpoint_template(endpoint):
+    """'/rooms/!abc:hs/messages?limit=50' -> '/rooms/{room_id}/messages'"""
+    return _ROOM_SEGMENT.sub('/{room_id}', endpoint.split('?', 1)[0])
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+class CaptureWriter:
+    """Capture file writer; replaces any capture already at ``path``"""
+
+    def __init__(self, path, store_responses=True):
+        self.path = path
+        self.store_responses = store_responses
+        # One session per file: offsets restart at 0, so appending would interleave sessions on replay
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.started = time.perf_counter()
+        self.write(KIND_META, {'created': time.time(), 'pid': os.getpid()})
+
+    def write(self, kind, payload, offset=None):
+        body = _dumps(payload)
+        if offset is None:
+            offset = time.perf_counter() - self.started
+        self.file.write(RECORD.pack(kind, offset, len(body)))
+        self.file.write(body)
+        # Flushed per record so a crash or Ctrl-C keeps everything recorded so far
+        self.file.flush()
+
+    def record_http(self, started, method, endpoint, data, status, result, elapsed):
+        self.write(KIND_HTTP, {
+            'method': method,
+            'endpoint': endpoint,
+            'data': scrub(data),
+            'status': status,
+            'elapsed': elapsed,
+            'response': scrub(result) if self.store_responses else None,
+        }, offset=started - self.started)
+
+    def record_ws(self, kind, text):
+        try:
+            frame = scrub(json.loads(text))
+        except ValueError:
+            frame = text
+        self.write(kind, {'frame': frame})
+
+    def close(self):
+        self.file.close()
+
+    def wrap_endpoint(self, endpoint_fn=test_api_endpoint):
+        """Return a drop-in replacement for test_api_endpoint that records each call"""
+        async def recording_endpoint(session, endpoint, method='GET', data=None):
+            started = time.perf_counter()
+            status, result = await endpoint_fn(session, endpoint, method, data)
+            self.record_http(started, method, endpoint, data, status, result, time.perf_counter() - started)
+            return status, result
+        recording_endpoint.wrapped = endpoint_fn
+        return recording_endpoint
+
+    def install(self):
+        """Record every test_api_endpoint reference and client WebSocket frame"""
+        original = test_api_endpoint
+        replacement = self.wrap_endpoint(original)
+        for module in list(sys.modules.values()):
+            if getattr(module, 'test_api_endpoint', None) is original:
+                module.test_api_endpoint = replacement
+
+        writer = self
+        ws_class = aiohttp.ClientWebSocketResponse
+        original_send, original_receive = ws_class.send_str, ws_class.receive
+
+        async def send_str(ws, data, *args, **kwargs):
+            writer.record_ws(KIND_WS_SEND, data)
+            return await original_send(ws, data, *args, **kwargs)
+
+        async def receive(ws, *args, **kwargs):
+            msg = await original_receive(ws, *args, **kwargs)
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                writer.record_ws(KIND_WS_RECV, msg.data)
+            return msg
+
+        ws_class.send_str, ws_class.receive = send_str, receive
+
+
+def read_capture(path):
+    """Yield (kind, offset, payload) from a capture file via mmap"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if view[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a capture file")
+            pos = len(MAGIC)
+            size = len(view)
+            while pos + RECORD.size <= size:
+                kind, offset, length = RECORD.unpack_from(view, pos)
+                pos += RECORD.size
+                if pos + length > size:
+                    break  # truncated final record from an interrupted capture
+                yield kind, offset, json.loads(view[pos:pos + length])
+                pos += length
+
+
+def fill_credentials(endpoint, data, creds):
+    """Put real credentials back into scrubbed login/restore bodies"""
+    if not isinstance(data, dict):
+        return data
+    data = dict(data)
+    if endpoint.startswith('/login'):
+        data.update({'homeserver': creds.get('homeserver'), 'username': creds.get('username'),
+                     'password': creds.get('password')})
+    elif endpoint.startswith('/restore_session'):
+        data.update({'homeserver_url': creds.get('homeserver'), 'user_id': creds.get('user_id'),
+                     'access_token': creds.get('access_token'), 'device_id': creds.get('device_id')})
+    return data
+
+
+class RoomMapper:
+    """Maps captured room IDs onto rooms of the replay target, in first-seen order"""
+
+    def __init__(self, target_rooms):
+        self.target_rooms = target_rooms
+        self.mapping = {}
+
+    def __call__(self, endpoint):
+        def replace(match):
+            room_id = match.group(1)
+            if room_id not in self.mapping:
+                self.mapping[room_id] = self.target_rooms[len(self.mapping) % len(self.target_rooms)]
+            return '/' + self.mapping[room_id]
+        return _ROOM_SEGMENT.sub(replace, endpoint)
+
+
+async def replay_websocket(session, frames, speed, started, origin, received, done):
+    """Send captured client frames on one /ws/extensions connection and count frames received
+    until ``done`` is set; frames are scheduled from the capture offset ``origin``, as HTTP records are"""
+    async with session.ws_connect(WS_URL) as ws:
+        async def listen():
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    received['frames'] += 1
+
+        listener = asyncio.create_task(listen())
+        for offset, frame in frames:
+            if speed:
+                delay = (offset - origin) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await ws.send_str(frame if isinstance(frame, str) else json.dumps(frame))
+        await done.wait()
+        await asyncio.sleep(0.5)  # let trailing frames arrive
+        listener.cancel()
+
+
+async def replay(path, speed=1.0, concurrency=64, remap_rooms=False):
+    """Replay a capture; ``speed`` 0 means as fast as possible.
+
+    HTTP records are re-issued at their recorded offsets (scaled by
+    ``speed``); client WebSocket frames are re-sent on one connection.
+    """
+    creds = await load_test_credentials()
+    records = []
+    ws_frames = []
+    ws_recorded = 0
+    for kind, offset, payload in read_capture(path):
+        if kind == KIND_HTTP:
+            records.append((offset, payload))
+        elif kind == KIND_WS_SEND:
+            ws_frames.append((offset, payload['frame']))
+        elif kind == KIND_WS_RECV:
+            ws_recorded += 1
+    # Records are appended on completion; replay in start order
+    records.sort(key=lambda record: record[0])
+    ws_frames.sort(key=lambda frame: frame[0])
+    ws_received = {'frames': 0, 'recorded': ws_recorded}
+    recorded = {}
+    replayed = {}
+    errors = {}
+    limit = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        mapper = None
+        if remap_rooms:
+            status, result = await test_api_endpoint(session, '/rooms')
+            rooms = [room['room_id'] for room in (result.get('data', []) if status == 200 else [])]
+            mapper = RoomMapper(rooms) if rooms else None
+
+        async def one(payload):
+            endpoint = payload['endpoint']
+            template = f"{payload['method']} {endpoint_template(endpoint)}"
+            if mapper:
+                endpoint = mapper(endpoint)
+            data = fill_credentials(endpoint, payload.get('data'), creds)
+            async with limit:
+                started = time.perf_counter()
+                status, _ = await test_api_endpoint(session, endpoint, payload['method'], data)
+                elapsed = time.perf_counter() - started
+            replayed.setdefault(template, LatencyHistogram()).record(elapsed)
+            recorded.setdefault(template, LatencyHistogram()).record(payload['elapsed'])
+            if status != payload['status']:
+                errors[template] = errors.get(template, 0) + 1
+
+        tasks = []
+        started = time.perf_counter()
+        # Both streams keep their recorded spacing relative to each other
+        origin = min(stream[0][0] for stream in (records, ws_frames) if stream) if records or ws_frames else 0.0
+        ws_task = None
+        http_done = asyncio.Event()
+        if ws_frames:
+            ws_task = asyncio.create_task(
+                replay_websocket(session, ws_frames, speed, started, origin, ws_received, http_done))
+        for offset, payload in records:
+            if speed:
+                delay = (offset - origin) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(payload)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        http_done.set()
+        if ws_task:
+            await ws_task
+
+    return elapsed, recorded, replayed, errors, ws_received
+
+
+async def record(path, target, script_args, store_responses=True):
+    """Run ``module:function`` with capture installed"""
+    module_name, _, function_name = target.partition(':')
+    module = importlib.import_module(module_name)
+    writer = CaptureWriter(path, store_responses)
+    writer.install()
+    sys.argv = [module_name + '.py', *script_args]
+    try:
+        result = getattr(module, function_name or 'main')()
+        if asyncio.iscoroutine(result):
+            await result
+    finally:
+        writer.close()
+
+
+def show(path):
+    counts = {}
+    last = 0.0
+    for kind, offset, payload in read_capture(path):
+        last = max(last, offset)
+        if kind == KIND_HTTP:
+            key = f"{payload['method']} {endpoint_template(payload['endpoint'])}"
+        else:
+            key = {KIND_META: 'meta', KIND_WS_SEND: 'ws send', KIND_WS_RECV: 'ws recv'}.get(kind, kind)
+        counts[key] = counts.get(key, 0) + 1
+    print(f"📼 {path}: {os.path.getsize(path) / 1e6:.2f} MB, {last:.1f}s of traffic")
+    for key, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"   {key:<40} {count:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture and replay message proxy traffic")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="run a script with capture enabled")
+    record_parser.add_argument('file')
+    record_parser.add_argument('target', help="module:function to run, e.g. load_bench:main")
+    record_parser.add_argument('--no-responses', action='store_true', help="store status and timing only")
+    record_parser.add_argument('script_args', nargs=argparse.REMAINDER)
+
+    replay_parser = commands.add_parser('replay', help="replay a capture")
+    replay_parser.add_argument('file')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help="time scale, 0 = max speed")
+    replay_parser.add_argument('--concurrency', type=int, default=64)
+    replay_parser.add_argument('--remap-rooms', action='store_true',
+                               help="map captured room IDs onto the target's rooms")
+
+    show_parser = commands.add_parser('show', help="summarise a capture")
+    show_parser.add_argument('file')
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        script_args = [arg for arg in args.script_args if arg != '--']
+        asyncio.run(record(args.file, args.target, script_args, not args.no_responses))
+    elif args.command == 'show':
+        show(args.file)
+    else:
+        print("🧪 Matrix Proxy Traffic Replay")
+        print("=" * 60)
+        elapsed, recorded, replayed, errors, ws_received = asyncio.run(
+            replay(args.file, args.speed, args.concurrency, args.remap_rooms))
+        print(f"   Replayed in {elapsed:.2f}s at {'max' if not args.speed else f'{args.speed:g}x'} speed\n")
+        print(f"   {'endpoint':<40} {'reqs':>6} {'rec p50':>9} {'rep p50':>9} {'rec p95':>9} {'rep p95':>9} {'mismatch':>9}")
+        for template in sorted(replayed):
+            rec, rep = recorded[template], replayed[template]
+            print(f"   {template:<40} {rep.total:>6} {rec.percentile(50) * 1000:>7.1f}ms "
+                  f"{rep.percentile(50) * 1000:>7.1f}ms {rec.percentile(95) * 1000:>7.1f}ms "
+                  f"{rep.percentile(95) * 1000:>7.1f}ms {errors.get(template, 0):>9}")
+        if ws_received['recorded']:
+            print(f"\n   🔌 WebSocket frames received: {ws_received['frames']} (recorded {ws_received['recorded']})")
+
+
+if __name__ == "__main__":
+    main()
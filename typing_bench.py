@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Matrix Typing Notification Benchmark
+Simulates hundreds of users composing messages (bursts of keystrokes, thinking
+pauses, sends and idle time between messages) and compares three ways of
+turning keystrokes into PUT /rooms/{room_id}/typing:
+
+  per_keystroke  a typing PUT on every keystroke
+  message_input  the previous MessageInput.js effect: "typing" on the first
+                 keystroke and "stopped" after 3 s idle, but the effect re-ran
+                 when isTyping flipped, so a draft left in the composer
+                 flapped stop/start every 3 s
+  coalesced      matrix_client.TypingCoalescer (as ui-new/utils/TypingCoalescer.js)
+
+Every mode replays the same keystroke streams. Reports typing requests per
+user-minute, request latency, proxy CPU (from the stand-in's /debug/stats) and
+how much of the time spent typing the server actually saw as typing.
+
+Usage (start proxy_standin.py first):
+    python typing_bench.py --users 300 --duration 60
+    python typing_bench.py --users 100 --modes message_input,coalesced --refresh-interval 10
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from bench_common import LatencyHistogram, authenticate
+from matrix_client import MatrixProxyClient, ProxyError, TypingCoalescer
+from test_complete_implementation import load_test_credentials
+
+MODES = ('per_keystroke', 'message_input', 'coalesced')
+# Seconds of idle after which MessageInput.js (and the coalescer) consider typing stopped
+STOP_DELAY = 3.0
+SERVER_TIMEOUT_MS = 30000
+# Resolution of the typing coverage comparison, seconds
+GRID = 0.1
+
+
+class TypingRecorder:
+    """Sends typing PUTs for all users and keeps what each user told the server"""
+
+    def __init__(self, client, started):
+        self.client = client
+        self.started = started
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.sent = {}  # user -> [(t, typing, timeout seconds)]
+        self.tasks = set()
+
+    async def send(self, user, room_id, typing, timeout=SERVER_TIMEOUT_MS):
+        self.sent.setdefault(user, []).append((time.perf_counter() - self.started, typing, timeout / 1000))
+        started = time.perf_counter()
+        try:
+            await self.client.typing(room_id, typing, timeout)
+        except (ProxyError, aiohttp.ClientError):
+            self.errors += 1
+        self.latency.record(time.perf_counter() - started)
+
+    def fire(self, user, room_id, typing):
+        """Send without waiting, as the UI does"""
+        task = asyncio.ensure_future(self.send(user, room_id, typing))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def drain(self):
+        await asyncio.gather(*self.tasks)
+
+
+class PerKeystrokeTyping:
+    def __init__(self, recorder, user):
+        self.recorder = recorder
+        self.user = user
+
+    def keystroke(self, room_id):
+        self.recorder.fire(self.user, room_id, True)
+
+    def message_sent(self, room_id):
+        self.recorder.fire(self.user, room_id, False)
+
+    async def close(self):
+        pass
+
+
+class MessageInputTyping:
+    """The MessageInput.js typing effect before TypingCoalescer"""
+
+    def __init__(self, recorder, user):
+        self.recorder = recorder
+        self.user = user
+        self.typing = False
+        self.draft = False
+        self.timer = None
+
+    def _arm(self, room_id):
+        if self.timer:
+            self.timer.cancel()
+        self.timer = asyncio.get_running_loop().call_later(STOP_DELAY, self._idle, room_id)
+
+    def _idle(self, room_id):
+        self.typing = False
+        self.recorder.fire(self.user, room_id, False)
+        if self.draft:
+            # isTyping flipped with text still in the composer: the effect announced typing again
+            self.typing = True
+            self.recorder.fire(self.user, room_id, True)
+            self._arm(room_id)
+
+    def keystroke(self, room_id):
+        self.draft = True
+        if not self.typing:
+            self.typing = True
+            self.recorder.fire(self.user, room_id, True)
+        self._arm(room_id)
+
+    def message_sent(self, room_id):
+        self.draft = False
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if self.typing:
+            self.typing = False
+            self.recorder.fire(self.user, room_id, False)
+
+    async def close(self):
+        if self.timer:
+            self.timer.cancel()
+
+
+class CoalescedTyping:
+    def __init__(self, recorder, user, refresh_interval):
+        self.coalescer = TypingCoalescer(
+            lambda room_id, typing, timeout: recorder.send(user, room_id, typing, timeout),
+            refresh_interval=refresh_interval, stop_delay=STOP_DELAY, server_timeout=SERVER_TIMEOUT_MS / 1000)
+
+    def keystroke(self, room_id):
+        self.coalescer.keystroke(room_id)
+
+    def message_sent(self, room_id):
+        self.coalescer.stop(room_id)
+
+    async def close(self):
+        await self.coalescer.close()
+
+
+async def _sleep_until(seconds, deadline):
+    """Sleep ``seconds`` but not past ``deadline``; False once the deadline is reached"""
+    await asyncio.sleep(max(0.0, min(seconds, deadline - time.perf_counter())))
+    return time.perf_counter() < deadline
+
+
+async def compose(rng, typing, room_id, deadline, args, keystrokes, sends, started):
+    """One user's keystroke stream: idle, type a message with thinking pauses, send, repeat"""
+    while True:
+        if not await _sleep_until(rng.expovariate(1.0 / args.idle), deadline):
+            return
+        for _ in range(rng.randint(10, 120)):
+            if rng.random() < args.pause_chance:
+                gap = rng.expovariate(1.0 / args.pause)
+            else:
+                gap = rng.lognormvariate(-1.8, 0.5)  # ~0.17 s between keys
+            if not await _sleep_until(gap, deadline):
+                return
+            keystrokes.append(time.perf_counter() - started)
+            typing.keystroke(room_id)
+        sends.append(time.perf_counter() - started)
+        typing.message_sent(room_id)
+
+
+def _mark(cells, start, end):
+    for cell in range(max(0, int(start / GRID)), min(len(cells), int(end / GRID))):
+        cells[cell] = 1
+
+
+def typing_coverage(keystrokes, sends, sent, duration):
+    """(share of typing time the server showed typing, shown-while-not-typing time as a share of typing time)"""
+    size = int(duration / GRID) + 1
+    actual, shown = bytearray(size), bytearray(size)
+    send_times = sorted(sends)
+    for key in keystrokes:
+        # Typing lasts until the composer is idle for STOP_DELAY or the message is sent
+        next_send = next((t for t in send_times if t >= key), duration)
+        _mark(actual, key, min(key + STOP_DELAY, next_send))
+    for (t, typing, timeout), following in zip(sent, [*sent[1:], None]):
+        if typing:
+            _mark(shown, t, min(t + timeout, following[0] if following else duration))
+    typed = sum(actual)
+    if not typed:
+        return 1.0, 0.0
+    both = sum(a & s for a, s in zip(actual, shown))
+    return both / typed, (sum(shown) - both) / typed
+
+
+async def run_mode(mode, creds, rooms, args, proxy_cpu):
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency)) as session:
+        await authenticate(session, creds)
+        client = MatrixProxyClient(session=session)
+        cpu_before = await proxy_cpu(session)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        recorder = TypingRecorder(client, started)
+
+        users, streams = [], []  # streams: (keystroke times, send times) per user
+        for user in range(args.users):
+            if mode == 'per_keystroke':
+                users.append(PerKeystrokeTyping(recorder, user))
+            elif mode == 'message_input':
+                users.append(MessageInputTyping(recorder, user))
+            else:
+                users.append(CoalescedTyping(recorder, user, args.refresh_interval))
+            streams.append(([], []))
+
+        await asyncio.gather(*(
+            compose(rng, typing, rng.choice(rooms), deadline, args, keystrokes, sends, started)
+            for typing, (keystrokes, sends), rng in zip(
+                users, streams, (random.Random(args.seed + user) for user in range(args.users)))))
+        for typing in users:
+            await typing.close()
+        await recorder.drain()
+        elapsed = time.perf_counter() - started
+        cpu_after = await proxy_cpu(session)
+
+    coverage, spurious = [], []
+    for user, (keystrokes, sends) in enumerate(streams):
+        if keystrokes:
+            shown, extra = typing_coverage(keystrokes, sends, recorder.sent.get(user, []), elapsed)
+            coverage.append(shown)
+            spurious.append(extra)
+    requests = sum(len(sent) for sent in recorder.sent.values())
+    return {
+        'requests': requests,
+        'per_user_minute': requests / args.users / (elapsed / 60),
+        'keystrokes': sum(len(stream[0]) for stream in streams),
+        'errors': recorder.errors,
+        'p50': recorder.latency.percentile(50),
+        'p99': recorder.latency.percentile(99),
+        'proxy_cpu': cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None,
+        'elapsed': elapsed,
+        'coverage': sum(coverage) / len(coverage) if coverage else 1.0,
+        'spurious': sum(spurious) / len(spurious) if spurious else 0.0,
+    }
+
+
+async def read_proxy_cpu(session):
+    """Proxy CPU seconds from /debug/stats (stand-in only); None when unavailable"""
+    client = MatrixProxyClient(session=session)
+    try:
+        result = await client.request('GET', '/debug/stats')
+    except (ProxyError, aiohttp.ClientError):
+        return None
+    return result.get('data', {}).get('cpu_seconds')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Typing notification request rate with and without coalescing")
+    parser.add_argument('--users', type=int, default=300, help="simulated users typing")
+    parser.add_argument('--duration', type=float, default=60.0, help="seconds per mode")
+    parser.add_argument('--modes', default=','.join(MODES), help=f"comma-separated modes ({', '.join(MODES)})")
+    parser.add_argument('--refresh-interval', type=float, default=20.0,
+                        help="coalescer: seconds between 'still typing' refreshes")
+    parser.add_argument('--idle', type=float, default=15.0, help="mean seconds between messages")
+    parser.add_argument('--pause', type=float, default=4.0, help="mean thinking pause while composing")
+    parser.add_argument('--pause-chance', type=float, default=0.04, help="chance of a pause before a keystroke")
+    parser.add_argument('--concurrency', type=int, default=100, help="connection pool limit")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    modes = args.modes.split(',')
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        raise SystemExit(f"Unknown mode(s) {', '.join(unknown)} (choose from {', '.join(MODES)})")
+
+    creds = await load_test_credentials()
+    async with aiohttp.ClientSession() as session:
+        if not await authenticate(session, creds):
+            print("❌ Login failed (userdata file or MATRIX_USERNAME/MATRIX_PASSWORD)")
+            return
+        rooms = [room.room_id for room in await MatrixProxyClient(session=session).rooms()]
+    if not rooms:
+        print("❌ No rooms to type in")
+        return
+
+    print("🧪 Typing Notification Benchmark")
+    print("=" * 60)
+    print(f"   {args.users} users over {len(rooms)} rooms, {args.duration:.0f}s per mode, "
+          f"refresh interval {args.refresh_interval:.0f}s\n")
+    header = (f"   {'mode':<14} {'keys':>7} {'PUTs':>7} {'/user-min':>10} {'p50':>8} {'p99':>8} "
+              f"{'proxy CPU':>10} {'shown':>7} {'spurious':>9}")
+    print(header)
+    print("   " + "-" * (len(header) - 3))
+    for mode in modes:
+        result = await run_mode(mode, creds, rooms, args, read_proxy_cpu)
+        cpu = (f"{result['proxy_cpu']:>5.1f}s {result['proxy_cpu'] / result['elapsed']:>3.0%}"
+               if result['proxy_cpu'] is not None else f"{'-':>10}")
+        print(f"   {mode:<14} {result['keystrokes']:>7} {result['requests']:>7} {result['per_user_minute']:>10.1f} "
+              f"{result['p50'] * 1000:>6.1f}ms {result['p99'] * 1000:>6.1f}ms {cpu} "
+              f"{result['coverage']:>7.1%} {result['spurious']:>9.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,6 +4,7 @@
 import * as React from 'react';
 import { Button, IconButton } from '../base/Button.js';
 import { apiClient } from '../../utils/ApiClient.js';
+import { typingCoalescer } from '../../utils/TypingCoalescer.js';
 import { eventBus, MATRIX_EVENTS } from '../../utils/EventBus.js';
 
 /**
@@ -28,25 +29,21 @@ export function MessageInput({ roomId, disabled = false }) {
     }
   }, [message]);
 
-  // Handle typing indicators
+  // Handle typing indicators; the coalescer decides which keystrokes reach the server.
+  // Only message edits count as typing, so the local indicator timing out doesn't re-announce it.
   React.useEffect(() => {
-    if (message.trim() && !isTyping) {
-      setIsTyping(true);
-      // Send typing notification to server
-      apiClient.sendTyping(roomId, true).catch(console.error);
+    if (!message.trim()) {
+      setIsTyping(false);
+      typingCoalescer.stop(roomId);
+      return undefined;
     }
 
-    // Clear existing timeout
-    if (typingTimeoutRef.current) {
-      clearTimeout(typingTimeoutRef.current);
-    }
+    typingCoalescer.keystroke(roomId);
+    setIsTyping(true);
 
-    // Set new timeout to stop typing
+    // Clear the local indicator once the user pauses
     typingTimeoutRef.current = setTimeout(() => {
-      if (isTyping) {
-        setIsTyping(false);
-        apiClient.sendTyping(roomId, false).catch(console.error);
-      }
+      setIsTyping(false);
     }, 3000);
 
     return () => {
@@ -54,7 +51,12 @@ export function MessageInput({ roomId, disabled = false }) {
         clearTimeout(typingTimeoutRef.current);
       }
     };
-  }, [message, roomId, isTyping]);
+  }, [message, roomId]);
+
+  // Stop typing in a room when switching away from it
+  React.useEffect(() => {
+    return () => typingCoalescer.stop(roomId);
+  }, [roomId]);
 
   const handleInputChange = (event) => {
     setMessage(event.target.value);
@@ -79,8 +81,8 @@ export function MessageInput({ roomId, disabled = false }) {
       // Stop typing indicator
       if (isTyping) {
         setIsTyping(false);
-        apiClient.sendTyping(roomId, false).catch(console.error);
       }
+      typingCoalescer.stop(roomId);
 
       // Send message
       const response = await apiClient.sendMessage(roomId, trimmedMessage);
@@ -12,7 +12,8 @@ export class RoomsStore {
       isLoading: false,
       error: null,
       searchQuery: '',
-      filteredRooms: []
+      filteredRooms: [],
+      syncToken: null // next_batch of the current snapshot, enables delta refresh
     };
 
     this.listeners = new Set();
@@ -24,11 +25,16 @@ export class RoomsStore {
    */
   setupEventListeners() {
     eventBus.on(MATRIX_EVENTS.ROOM_LIST_UPDATED, (result) => {
-      if (result.rooms) {
-        this.processRoomList(result.rooms);
+      const rooms = result.rooms || (Array.isArray(result.data) ? result.data : null);
+      if (rooms) {
+        this.processRoomList(rooms, result.next_batch || null);
       }
     });
 
+    eventBus.on(MATRIX_EVENTS.ROOM_LIST_DELTA, (delta) => {
+      this.applyRoomDelta(delta);
+    });
+
     eventBus.on(MATRIX_EVENTS.ROOM_SELECTED, (roomId) => {
       this.updateState({ selectedRoomId: roomId });
     });
@@ -50,43 +56,88 @@ export class RoomsStore {
     });
   }
 
+  /**
+   * Convert an API room object to store format
+   * @param {object} room - Room object from the API
+   * @returns {object} Room data
+   */
+  normalizeRoom(room) {
+    return {
+      id: room.room_id,
+      name: room.name || room.canonical_alias || room.room_id,
+      displayName: room.display_name || room.name || room.canonical_alias || 'Unnamed Room',
+      topic: room.topic || '',
+      avatarUrl: room.avatar_url || null,
+      canonicalAlias: room.canonical_alias || null,
+      isDirect: room.is_direct || false,
+      isEncrypted: room.is_encrypted || false,
+      memberCount: room.member_count || 0,
+      unreadCount: room.unread_count || 0,
+      highlightCount: room.highlight_count || 0,
+      lastMessage: room.last_message || null,
+      lastActivity: room.last_activity ? new Date(room.last_activity) : null,
+      powerLevel: room.power_level || 0,
+      joinRule: room.join_rule || 'invite',
+      guestAccess: room.guest_access || 'can_join',
+      historyVisibility: room.history_visibility || 'shared',
+      members: new Map(), // userId -> member data
+      isSpace: room.room_type === 'm.space',
+      spaceParents: room.space_parents || [],
+      spaceChildren: room.space_children || []
+    };
+  }
+
   /**
    * Process room list from API response
    * @param {array} rooms - Array of room objects
+   * @param {string|null} syncToken - next_batch the list corresponds to
    */
-  processRoomList(rooms) {
+  processRoomList(rooms, syncToken = null) {
     const roomsMap = new Map();
 
     rooms.forEach(room => {
-      roomsMap.set(room.room_id, {
-        id: room.room_id,
-        name: room.name || room.canonical_alias || room.room_id,
-        displayName: room.display_name || room.name || room.canonical_alias || 'Unnamed Room',
-        topic: room.topic || '',
-        avatarUrl: room.avatar_url || null,
-        canonicalAlias: room.canonical_alias || null,
-        isDirect: room.is_direct || false,
-        isEncrypted: room.is_encrypted || false,
-        memberCount: room.member_count || 0,
-        unreadCount: room.unread_count || 0,
-        highlightCount: room.highlight_count || 0,
-        lastMessage: room.last_message || null,
-        lastActivity: room.last_activity ? new Date(room.last_activity) : null,
-        powerLevel: room.power_level || 0,
-        joinRule: room.join_rule || 'invite',
-        guestAccess: room.guest_access || 'can_join',
-        historyVisibility: room.history_visibility || 'shared',
-        members: new Map(), // userId -> member data
-        isSpace: room.room_type === 'm.space',
-        spaceParents: room.space_parents || [],
-        spaceChildren: room.space_children || []
-      });
+      roomsMap.set(room.room_id, this.normalizeRoom(room));
     });
 
     this.updateState({
       rooms: roomsMap,
       isLoading: false,
-      error: null
+      error: null,
+      syncToken
+    });
+
+    this.updateFilteredRooms();
+  }
+
+  /**
+   * Apply a delta room list: replace changed rooms, add joins, drop leaves
+   * @param {object} delta - { rooms, left, full, next_batch } from getRoomsDelta()
+   */
+  applyRoomDelta(delta) {
+    if (delta.full) {
+      this.processRoomList(delta.rooms || [], delta.next_batch || null);
+      return;
+    }
+
+    const rooms = new Map(this.state.rooms);
+    (delta.rooms || []).forEach(room => {
+      const updatedRoom = this.normalizeRoom(room);
+      const existing = rooms.get(room.room_id);
+      if (existing) {
+        updatedRoom.members = existing.members; // members are loaded separately
+      }
+      rooms.set(room.room_id, updatedRoom);
+    });
+    (delta.left || []).forEach(roomId => rooms.delete(roomId));
+
+    const selectedRoomId = rooms.has(this.state.selectedRoomId) ? this.state.selectedRoomId : null;
+
+    this.updateState({
+      rooms,
+      selectedRoomId,
+      isLoading: false,
+      error: null,
+      syncToken: delta.next_batch || this.state.syncToken
     });
 
     this.updateFilteredRooms();
@@ -149,8 +200,13 @@ export class RoomsStore {
   async loadRooms() {
     try {
       this.updateState({ isLoading: true, error: null });
-      await apiClient.getRooms();
+      // Take the sync position before the list so no change falls between them
+      const syncToken = await this.fetchSyncToken();
+      const result = await apiClient.getRooms();
       // Room list will be updated via event listener
+      if (!result.next_batch && syncToken) {
+        this.updateState({ syncToken });
+      }
     } catch (error) {
       this.updateState({
         isLoading: false,
@@ -161,9 +217,32 @@ export class RoomsStore {
   }
 
   /**
-   * Refresh room list
+   * Current sync position from the proxy, or null if it has none
+   * @returns {Promise<string|null>} next_batch token
+   */
+  async fetchSyncToken() {
+    try {
+      const status = await apiClient.getSyncStatus();
+      const data = status.data || status;
+      return data.next_batch || null;
+    } catch (error) {
+      return null;
+    }
+  }
+
+  /**
+   * Refresh room list, fetching only changed rooms when a sync token is known
    */
   async refreshRoomList() {
+    if (this.state.syncToken) {
+      try {
+        await apiClient.getRoomsDelta(this.state.syncToken);
+        // Snapshot will be updated via event listener
+        return;
+      } catch (error) {
+        console.warn('Delta room refresh failed, loading full list:', error);
+      }
+    }
     await this.loadRooms();
   }
 
@@ -367,7 +446,8 @@ export class RoomsStore {
       isLoading: false,
       error: null,
       searchQuery: '',
-      filteredRooms: []
+      filteredRooms: [],
+      syncToken: null
     });
   }
 
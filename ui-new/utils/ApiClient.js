@@ -4,6 +4,30 @@
 
 import { eventBus, MATRIX_EVENTS } from './EventBus.js';
 
+/**
+ * Normalize a /rooms?since= response to { rooms, left, full, next_batch }.
+ * A proxy without delta support ignores `since` and returns its plain room
+ * list; that becomes a full delta so the snapshot is replaced, not left stale.
+ * @param {object|Array} result - Response body
+ * @returns {object} Room delta
+ */
+export function toRoomDelta(result) {
+  const data = result && result.data !== undefined ? result.data : result;
+  if (data && !Array.isArray(data) && Array.isArray(data.rooms) && 'full' in data) {
+    return data;
+  }
+  const rooms = Array.isArray(data) ? data : data && (data.rooms || data.joined_rooms);
+  if (!Array.isArray(rooms)) {
+    throw new Error('Room list response has no rooms');
+  }
+  return {
+    rooms,
+    left: [],
+    full: true,
+    next_batch: (result && result.next_batch) || (data && data.next_batch) || null
+  };
+}
+
 export class ApiClient {
   constructor(options = {}) {
     // Base URL matches the message proxy router prefix
@@ -114,9 +138,10 @@ export class ApiClient {
     let lastError;
 
     for (let attempt = 1; attempt <= this.retryAttempts; attempt++) {
+      let timeoutId;
       try {
         const controller = new AbortController();
-        const timeoutId = setTimeout(() => controller.abort(), this.timeout);
+        timeoutId = setTimeout(() => controller.abort(), this.timeout);
 
         config.signal = controller.signal;
 
@@ -151,6 +176,9 @@ export class ApiClient {
       } catch (error) {
         lastError = error;
 
+        // A failed fetch skips the clearTimeout above; don't leave the timer holding the controller
+        clearTimeout(timeoutId);
+
         // Remove from pending requests
         this.pendingRequests.delete(requestId);
 
@@ -264,6 +292,19 @@ export class ApiClient {
     }
   }
 
+  /**
+   * Fetch only the rooms changed since a sync token
+   * @param {string} since - next_batch token from a previous room list or sync status
+   * @returns {Promise<object>} { rooms, left, full, next_batch }; full means the
+   *   token was not accepted and rooms is the complete list
+   */
+  async getRoomsDelta(since) {
+    const result = await this.get(`/rooms?since=${encodeURIComponent(since)}`);
+    const delta = toRoomDelta(result);
+    eventBus.emit(MATRIX_EVENTS.ROOM_LIST_DELTA, delta);
+    return delta;
+  }
+
   async getRoomMembers(roomId) {
     return await this.get(`/rooms/${roomId}/members`);
   }
@@ -293,6 +334,37 @@ export class ApiClient {
     }
   }
 
+  /**
+   * Send several messages to a room in one round trip
+   * Falls back to one /send per message if the proxy has no batch endpoint
+   * @param {string} roomId - Room ID
+   * @param {string[]} messages - Message bodies, sent in order
+   * @param {string} msgType - Message type for every message
+   * @returns {Promise<object>} Result with event_ids in message order
+   */
+  async sendMessages(roomId, messages, msgType = 'm.text') {
+    let result;
+    try {
+      result = await this.post(`/rooms/${roomId}/send_batch`, {
+        messages: messages.map(message => ({ message, msg_type: msgType }))
+      });
+    } catch (error) {
+      if (!error.message.includes('HTTP 404') && !error.message.includes('HTTP 405')) {
+        throw error;
+      }
+      const eventIds = [];
+      for (const message of messages) {
+        const single = await this.post(`/rooms/${roomId}/send`, { message, msg_type: msgType });
+        eventIds.push(single.event_id);
+      }
+      result = { success: true, event_ids: eventIds };
+    }
+    messages.forEach(message => {
+      eventBus.emit(MATRIX_EVENTS.MESSAGE_SENT, { roomId, message, result });
+    });
+    return result;
+  }
+
   async sendTyping(roomId, typing, timeout = 30000) {
     try {
       return await this.put(`/rooms/${roomId}/typing`, {
@@ -608,5 +680,6 @@ export const apiClient = new ApiClient();
 
 export default {
   ApiClient,
-  apiClient
+  apiClient,
+  toRoomDelta
 };
\ No newline at end of file
@@ -165,6 +165,7 @@ export const MATRIX_EVENTS = {
   // Room events
   ROOM_SELECTED: 'room:selected',
   ROOM_LIST_UPDATED: 'room:list:updated',
+  ROOM_LIST_DELTA: 'room:list:delta',
   ROOM_JOINED: 'room:joined',
   ROOM_LEFT: 'room:left',
   ROOM_MEMBER_UPDATED: 'room:member:updated',
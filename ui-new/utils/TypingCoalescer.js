@@ -0,0 +1,124 @@
+// Typing Notification Coalescer
+// Turns a stream of keystrokes into a few typing PUTs per room: one "typing" when
+// a burst starts, one refresh per interval while it lasts and one "stopped" after
+// the user goes idle. Pausing and resuming within the idle delay sends nothing.
+
+import { apiClient } from './ApiClient.js';
+
+export class TypingCoalescer {
+  constructor(client = apiClient, options = {}) {
+    this.client = client;
+    // Refresh well inside the server-side timeout so the indicator never lapses mid-burst
+    this.serverTimeout = options.serverTimeout || 30000;
+    this.refreshInterval = options.refreshInterval || 20000;
+    this.stopDelay = options.stopDelay || 3000;
+
+    // roomId -> { announced, wanted, sentAt, stopTimer, inFlight }
+    this.rooms = new Map();
+  }
+
+  /**
+   * Get per-room state, creating it on first use
+   * @param {string} roomId - Room ID
+   * @returns {object} Room typing state
+   */
+  getRoom(roomId) {
+    let state = this.rooms.get(roomId);
+    if (!state) {
+      state = { announced: false, wanted: false, sentAt: 0, stopTimer: null, inFlight: null };
+      this.rooms.set(roomId, state);
+    }
+    return state;
+  }
+
+  /**
+   * Record a keystroke in a room's composer
+   * @param {string} roomId - Room ID
+   */
+  keystroke(roomId) {
+    const state = this.getRoom(roomId);
+    state.wanted = true;
+
+    if (state.stopTimer) {
+      clearTimeout(state.stopTimer);
+    }
+    state.stopTimer = setTimeout(() => {
+      state.stopTimer = null;
+      state.wanted = false;
+      this.flush(roomId);
+    }, this.stopDelay);
+
+    if (!state.announced || Date.now() - state.sentAt >= this.refreshInterval) {
+      this.flush(roomId);
+    }
+  }
+
+  /**
+   * Stop typing now (message sent, composer cleared or room closed)
+   * @param {string} roomId - Room ID
+   */
+  stop(roomId) {
+    const state = this.rooms.get(roomId);
+    if (!state) {
+      return;
+    }
+    if (state.stopTimer) {
+      clearTimeout(state.stopTimer);
+      state.stopTimer = null;
+    }
+    state.wanted = false;
+    this.flush(roomId);
+  }
+
+  /**
+   * Send the wanted state if the server doesn't have it yet.
+   * Only one request per room is in flight; changes made meanwhile collapse
+   * into whatever is wanted when it completes.
+   * @param {string} roomId - Room ID
+   */
+  flush(roomId) {
+    const state = this.getRoom(roomId);
+    if (state.inFlight) {
+      return state.inFlight;
+    }
+
+    state.inFlight = (async () => {
+      try {
+        for (;;) {
+          const refreshDue = state.wanted && Date.now() - state.sentAt >= this.refreshInterval;
+          if (state.wanted === state.announced && !refreshDue) {
+            break;
+          }
+          const typing = state.wanted;
+          state.announced = typing;
+          state.sentAt = Date.now();
+          // sendTyping() already swallows errors; typing indicators are not critical
+          await this.client.sendTyping(roomId, typing, this.serverTimeout);
+        }
+      } finally {
+        state.inFlight = null;
+        if (!state.wanted && !state.stopTimer) {
+          this.rooms.delete(roomId);
+        }
+      }
+    })();
+    return state.inFlight;
+  }
+
+  /**
+   * Stop typing in every room (e.g. on logout)
+   */
+  stopAll() {
+    for (const roomId of [...this.rooms.keys()]) {
+      this.stop(roomId);
+    }
+  }
+}
+
+// Create and export global instance
+export const typingCoalescer = new TypingCoalescer();
+
+export default {
+  TypingCoalescer,
+  typingCoalescer
+};